@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Benchmark: cold start of the local ENUM index, from scratch vs from a snapshot
+Builds an index with paged name_filter scans against the stand-in daemon
+(with --page-latency per name_filter call to stand in for a busy node),
+exports a snapshot, then adds names and mines blocks. A second index is
+started from the snapshot and caught up. Reports the seconds until each
+index is in sync with the chain tip.
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from enum_backend import EmercoinNVS, ENUM_PREFIX
+from enum_index import ENUMIndex
+from fake_emercoind import start_daemon, write_conf, make_enum_key
+
+logging.disable(logging.WARNING)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark ENUM index cold start with and without a snapshot')
+    parser.add_argument('--records', default=20000, type=int, help='ENUM records on the stand-in chain')
+    parser.add_argument('--page-latency', default=0.2, type=float,
+                        help='Seconds the stand-in daemon takes per name_filter page')
+    parser.add_argument('--new-names', default=100, type=int,
+                        help='Names registered after the snapshot was taken')
+    parser.add_argument('--blocks', default=50, type=int, help='Blocks mined after the snapshot was taken')
+    parser.add_argument('--json', action='store_true', help='Print results as JSON')
+    args = parser.parse_args()
+
+    daemon, nvs = start_daemon(records=args.records, method_latency={'name_filter': args.page_latency})
+    tmp = tempfile.mkdtemp(prefix='bench_bootstrap_')
+    conf = os.path.join(tmp, 'emercoin.conf')
+    write_conf(conf, daemon.server_address[1])
+    EmercoinNVS.configure_rpc(conf)
+
+    try:
+        # The seeded names were registered long before either node starts
+        nvs.mine(1000)
+
+        # Cold start: the whole namespace through name_filter
+        started = time.perf_counter()
+        source = ENUMIndex(os.path.join(tmp, 'source.sqlite'), prefix=ENUM_PREFIX)
+        source.sync(EmercoinNVS.call)
+        cold = time.perf_counter() - started
+
+        snapshot = os.path.join(tmp, 'enum.snap')
+        started = time.perf_counter()
+        exported = source.export_snapshot(snapshot)
+        export_seconds = time.perf_counter() - started
+
+        # The chain moves on before the new node starts
+        nvs.mine(args.blocks)
+        for i in range(args.new_names):
+            nvs.put(make_enum_key(f"+1777{i:07d}"), f'"!^.*$!sip:new{i}@example.com!"')
+        nvs.mine(1)
+
+        started = time.perf_counter()
+        warm = ENUMIndex(os.path.join(tmp, 'warm.sqlite'), prefix=ENUM_PREFIX)
+        warm.load_snapshot(snapshot)
+        loaded = time.perf_counter() - started
+        warm.sync(EmercoinNVS.call)
+        warm_seconds = time.perf_counter() - started
+
+        expected = args.records + args.new_names
+        assert warm.count() == expected, f"snapshot start has {warm.count()} records, expected {expected}"
+        assert warm.is_fresh(), "snapshot start is not in sync"
+    finally:
+        daemon.shutdown()
+
+    results = {
+        'records': args.records,
+        'page_latency': args.page_latency,
+        'cold_start_seconds': round(cold, 3),
+        'snapshot_bytes': exported['bytes'],
+        'export_seconds': round(export_seconds, 3),
+        'snapshot_load_seconds': round(loaded, 3),
+        'snapshot_start_seconds': round(warm_seconds, 3),
+        'speedup': round(cold / warm_seconds, 1),
+    }
+    if args.json:
+        print(json.dumps(results))
+    else:
+        print(f"{args.records} records, {args.page_latency}s per name_filter page")
+        print(f"  cold start (name_filter scan): {results['cold_start_seconds']:>8.3f}s")
+        print(f"  snapshot export:               {results['export_seconds']:>8.3f}s "
+              f"({results['snapshot_bytes']} bytes)")
+        print(f"  snapshot start (load + sync):  {results['snapshot_start_seconds']:>8.3f}s "
+              f"(load {results['snapshot_load_seconds']:.3f}s)")
+        print(f"  speedup: {results['speedup']}x")
+
+
+if __name__ == '__main__':
+    main()
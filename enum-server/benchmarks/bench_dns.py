@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""
+Load test: DNS NAPTR responder (enum_dns.py)
+Starts the stand-in daemon and the responder in its own process (one core),
+warms the lookup cache, then drives NAPTR queries over UDP from several
+client processes, each keeping a window of queries in flight. Reports
+queries per second, latency percentiles and response codes. --target
+benchmarks an already running responder instead.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import socket
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from fake_emercoind import start_daemon, write_conf
+from load_test import percentile
+
+SERVER = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'enum_dns.py')
+RCODES = {0: 'NOERROR', 1: 'FORMERR', 2: 'SERVFAIL', 3: 'NXDOMAIN', 4: 'NOTIMP', 5: 'REFUSED'}
+
+
+def enum_name(number: str) -> str:
+    return '.'.join(number.lstrip('+')[::-1]) + '.e164.arpa'
+
+
+def make_query(query_id: int, name: str, qtype: int = 35, edns: bool = True) -> bytes:
+    question = b''.join(bytes((len(label),)) + label.encode() for label in name.split('.')) + b'\x00'
+    packet = struct.pack('!6H', query_id, 0x0100, 1, 0, 0, 1 if edns else 0)
+    packet += question + struct.pack('!HH', qtype, 1)
+    if edns:
+        packet += b'\x00' + struct.pack('!HHIH', 41, 1232, 0, 0)
+    return packet
+
+
+def parse_naptr_answers(reply: bytes) -> list:
+    """(order, preference, flags, services, regexp, replacement) of each answer"""
+    _, flags, qdcount, ancount, _, _ = struct.unpack_from('!6H', reply)
+    offset = 12
+    for _ in range(qdcount):
+        while reply[offset]:
+            offset += 1 + reply[offset]
+        offset += 5
+    answers = []
+    for _ in range(ancount):
+        offset += 2  # compressed owner name
+        rtype, _, ttl, length = struct.unpack_from('!HHIH', reply, offset)
+        offset += 10
+        rdata, offset = reply[offset:offset + length], offset + length
+        if rtype != 35:
+            continue
+        order, preference = struct.unpack_from('!HH', rdata)
+        pos, strings = 4, []
+        for _ in range(3):
+            size = rdata[pos]
+            strings.append(rdata[pos + 1:pos + 1 + size].decode())
+            pos += 1 + size
+        labels = []
+        while rdata[pos]:
+            labels.append(rdata[pos + 1:pos + 1 + rdata[pos]].decode())
+            pos += 1 + rdata[pos]
+        answers.append((order, preference, *strings, '.'.join(labels) or '.', ttl))
+    return answers
+
+
+def client(args) -> dict:
+    """Keep `window` queries in flight for `duration` seconds"""
+    host, port, names, window, duration, seed = args
+    rng = random.Random(seed)
+    # Prebuilt queries; only the ID changes per send
+    templates = [make_query(0, name)[2:] for name in names]
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.settimeout(1.0)
+    sock.connect((host, port))
+    sent = {}
+    latencies = []
+    rcodes = {}
+    lost = 0
+    next_id = 0
+
+    def send():
+        nonlocal next_id
+        next_id = (next_id + 1) & 0xFFFF
+        sock.send(struct.pack('!H', next_id) + rng.choice(templates))
+        sent[next_id] = time.perf_counter()
+
+    deadline = time.perf_counter() + duration
+    for _ in range(window):
+        send()
+    while time.perf_counter() < deadline:
+        try:
+            reply = sock.recv(4096)
+        except socket.timeout:
+            lost += len(sent)
+            sent.clear()
+            for _ in range(window):
+                send()
+            continue
+        started = sent.pop(struct.unpack_from('!H', reply)[0], None)
+        if started is None:
+            continue
+        latencies.append(time.perf_counter() - started)
+        rcode = RCODES.get(reply[3] & 0x0F, 'OTHER')
+        rcodes[rcode] = rcodes.get(rcode, 0) + 1
+        send()
+    sock.close()
+    # Queries still in flight at the deadline are not counted as lost
+    return {'latencies': latencies, 'rcodes': rcodes, 'lost': lost}
+
+
+def wait_ready(host: str, port: int, name: str, timeout: float = 30.0):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.settimeout(0.5)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            sock.sendto(make_query(1, name), (host, port))
+            return sock.recv(4096)
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"DNS responder on {host}:{port} did not answer")
+
+
+def cpu_seconds(pid: int):
+    """User + system CPU time of a process (Linux), or None"""
+    try:
+        with open(f'/proc/{pid}/stat') as f:
+            fields = f.read().rsplit(')', 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the DNS NAPTR responder')
+    parser.add_argument('--target', help='host:port of a running responder (default: start one)')
+    parser.add_argument('--records', default=1000, type=int, help='Seeded ENUM records')
+    parser.add_argument('--clients', default=4, type=int, help='Client processes')
+    parser.add_argument('--window', default=32, type=int, help='Queries in flight per client')
+    parser.add_argument('--duration', default=5.0, type=float, help='Seconds to run')
+    parser.add_argument('--miss-ratio', default=0.0, type=float,
+                        help='Share of queries for unregistered numbers (cached NXDOMAIN)')
+    parser.add_argument('--json', action='store_true', help='Print results as JSON')
+    args = parser.parse_args()
+
+    numbers = [f"+1415555{i:04d}" for i in range(args.records)]
+    names = [enum_name(n) for n in numbers]
+    misses = int(len(names) * args.miss_ratio / max(1e-9, 1 - args.miss_ratio)) if args.miss_ratio else 0
+    names += [enum_name(f"+1999{i:07d}") for i in range(misses)]
+
+    daemon = server = None
+    cpu_before = cpu_after = None
+    if args.target:
+        host, port = args.target.rsplit(':', 1)
+        port = int(port)
+    else:
+        daemon, _ = start_daemon(records=args.records)
+        workdir = tempfile.mkdtemp(prefix='bench_dns_')
+        conf = os.path.join(workdir, 'emercoin.conf')
+        write_conf(conf, daemon.server_address[1])
+        host, port = '127.0.0.1', free_port()
+        server = subprocess.Popen(
+            [sys.executable, SERVER, '--dns-host', host, '--dns-port', str(port), '--emc-conf', conf,
+             '--no-index', '--no-shared-cache', '--sync-register', '--chain-poll-interval', '0',
+             '--cache-size', str(len(names) * 2)],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    try:
+        sample = wait_ready(host, port, names[0])
+        # Warm the lookup cache so the run measures the responder, not the node
+        warm = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        warm.settimeout(5)
+        for i, name in enumerate(names):
+            warm.sendto(make_query(i & 0xFFFF, name), (host, port))
+            warm.recv(4096)
+        warm.close()
+
+        jobs = [(host, port, names, args.window, args.duration, seed) for seed in range(args.clients)]
+        cpu_before = cpu_seconds(server.pid) if server is not None else None
+        started = time.perf_counter()
+        with multiprocessing.Pool(args.clients) as pool:
+            runs = pool.map(client, jobs)
+        elapsed = time.perf_counter() - started
+        cpu_after = cpu_seconds(server.pid) if server is not None else None
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+        if daemon is not None:
+            daemon.shutdown()
+
+    latencies = [x for run in runs for x in run['latencies']]
+    rcodes = {}
+    for run in runs:
+        for rcode, count in run['rcodes'].items():
+            rcodes[rcode] = rcodes.get(rcode, 0) + count
+    results = {
+        'clients': args.clients,
+        'window': args.window,
+        'queries': len(latencies),
+        'lost': sum(run['lost'] for run in runs),
+        'queries_per_sec': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 3),
+        'rcodes': rcodes,
+        'server_cpu_seconds': None,
+        'queries_per_cpu_sec': None,
+        'sample_answer': parse_naptr_answers(sample),
+    }
+
+    if cpu_before is not None and cpu_after is not None and cpu_after > cpu_before:
+        # Throughput one dedicated core would sustain, independent of how much
+        # CPU the clients took from the server on this machine
+        results['server_cpu_seconds'] = round(cpu_after - cpu_before, 2)
+        results['queries_per_cpu_sec'] = round(len(latencies) / (cpu_after - cpu_before), 1)
+
+    if args.json:
+        print(json.dumps(results))
+    else:
+        print(f"{results['queries']} queries in {elapsed:.1f}s: {results['queries_per_sec']} q/s, "
+              f"p50 {results['p50_ms']} ms, p95 {results['p95_ms']} ms, p99 {results['p99_ms']} ms, "
+              f"lost {results['lost']}")
+        if results['queries_per_cpu_sec']:
+            print(f"server used {results['server_cpu_seconds']} CPU s: "
+                  f"{results['queries_per_cpu_sec']} queries per CPU second")
+        print(f"rcodes: {rcodes}")
+        print(f"sample answer for {names[0]}: {results['sample_answer']}")
+
+
+if __name__ == '__main__':
+    main()
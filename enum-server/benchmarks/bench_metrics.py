@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Benchmark: cost of metrics instrumentation per request
+Serves cached /enum/lookup requests through the Flask test client with
+metrics recording on and off and reports the difference per request. The
+end-to-end difference is within run-to-run noise, so the cost of the metric
+updates a lookup makes is also timed on its own.
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from enum_backend import EmercoinNVS, app
+from enum_metrics import REGISTRY, HTTP_REQUESTS, HTTP_LATENCY, NAPTR_PARSE, SERIALIZE
+from fake_emercoind import start_daemon, write_conf
+
+logging.disable(logging.WARNING)
+
+
+def run(client, requests: int) -> float:
+    """Seconds per lookup over `requests` lookups of 100 cached numbers"""
+    start = time.perf_counter()
+    for i in range(requests):
+        response = client.get(f'/enum/lookup?number=%2B1415555{i % 100:04d}')
+        assert response.status_code == 200, "lookup failed"
+    return (time.perf_counter() - start) / requests
+
+
+def record_cost(requests: int) -> float:
+    """Seconds spent on the metric updates of one cached lookup"""
+    start = time.perf_counter()
+    for _ in range(requests):
+        NAPTR_PARSE.observe(time.perf_counter() - start)
+        SERIALIZE.observe(time.perf_counter() - start, '/enum/lookup')
+        HTTP_LATENCY.observe(time.perf_counter() - start, '/enum/lookup', 'GET')
+        HTTP_REQUESTS.inc('/enum/lookup', 'GET', '200')
+    return (time.perf_counter() - start) / requests
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure metrics instrumentation overhead')
+    parser.add_argument('--requests', default=20000, type=int, help='Lookups per run')
+    parser.add_argument('--rounds', default=3, type=int, help='Alternating on/off rounds (best is kept)')
+    parser.add_argument('--json', action='store_true', help='Print results as JSON')
+    args = parser.parse_args()
+
+    daemon, _ = start_daemon()
+    conf = os.path.join(tempfile.mkdtemp(prefix='bench_metrics_'), 'emercoin.conf')
+    write_conf(conf, daemon.server_address[1])
+    EmercoinNVS.configure_rpc(conf)
+    client = app.test_client()
+    run(client, 200)  # fill the lookup cache
+
+    timings = {True: [], False: []}
+    for _ in range(args.rounds):
+        for enabled in (False, True):
+            REGISTRY.enabled = enabled
+            timings[enabled].append(run(client, args.requests))
+    daemon.shutdown()
+    REGISTRY.enabled = True
+    record = record_cost(args.requests)
+
+    off, on = min(timings[False]), min(timings[True])
+    results = {
+        'requests': args.requests,
+        'us_per_request_metrics_off': round(off * 1e6, 2),
+        'us_per_request_metrics_on': round(on * 1e6, 2),
+        'overhead_us_per_request': round((on - off) * 1e6, 2),
+        'overhead_pct': round((on - off) / off * 100, 2),
+        'metric_updates_us_per_request': round(record * 1e6, 2),
+    }
+    if args.json:
+        print(json.dumps(results))
+    else:
+        print(f"metrics off : {results['us_per_request_metrics_off']:>8} us/request")
+        print(f"metrics on  : {results['us_per_request_metrics_on']:>8} us/request")
+        print(f"overhead    : {results['overhead_us_per_request']:>8} us/request "
+              f"({results['overhead_pct']}%)")
+        print(f"updates     : {results['metric_updates_us_per_request']:>8} us/request (isolated)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Benchmark: emercoin-cli subprocess vs keep-alive JSON-RPC pool
+Runs name_show lookups against the local stand-in daemon through both
+EmercoinNVS transports and reports calls per second.
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import enum_backend
+from enum_backend import EmercoinNVS
+from fake_emercoind import start_daemon, write_conf, write_cli_wrapper, make_enum_key
+
+logging.disable(logging.WARNING)
+
+
+def run(calls: int, concurrency: int) -> float:
+    """Resolve `calls` names with `concurrency` threads, return calls/sec"""
+    names = [make_enum_key(f"+1415555{i % 1000:04d}") for i in range(calls)]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(EmercoinNVS.name_show, names))
+    elapsed = time.perf_counter() - start
+    assert all(results), "lookup failed"
+    return calls / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark EmercoinNVS transports')
+    parser.add_argument('--calls', default=200, type=int, help='name_show calls per run')
+    parser.add_argument('--concurrency', default=4, type=int, help='Client threads')
+    parser.add_argument('--json', action='store_true', help='Print results as JSON')
+    args = parser.parse_args()
+
+    server, _ = start_daemon()
+    port = server.server_address[1]
+    tmp = tempfile.mkdtemp(prefix='bench_rpc_')
+    conf = os.path.join(tmp, 'emercoin.conf')
+    cli = os.path.join(tmp, 'emercoin-cli')
+    write_conf(conf, port)
+    write_cli_wrapper(cli, port)
+    enum_backend.EMC_CLI_PATH = cli
+    enum_backend.EMC_DATADIR = tmp
+
+    EmercoinNVS.rpc_pool = None
+    cli_rate = run(args.calls, args.concurrency)
+
+    EmercoinNVS.configure_rpc(conf, pool_size=args.concurrency)
+    run(50, args.concurrency)  # warm the pool
+    rpc_rate = run(args.calls, args.concurrency)
+    server.shutdown()
+
+    results = {
+        'calls': args.calls,
+        'concurrency': args.concurrency,
+        'cli_calls_per_sec': round(cli_rate, 1),
+        'jsonrpc_calls_per_sec': round(rpc_rate, 1),
+        'speedup': round(rpc_rate / cli_rate, 1),
+    }
+    if args.json:
+        print(json.dumps(results))
+    else:
+        print(f"emercoin-cli subprocess : {results['cli_calls_per_sec']:>10} calls/s")
+        print(f"JSON-RPC keep-alive pool: {results['jsonrpc_calls_per_sec']:>10} calls/s")
+        print(f"speedup                 : {results['speedup']:>10}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Load test: Flask (threaded WSGI) vs asyncio (ASGI) serving modes
+Starts the stand-in daemon with injected per-call latency, serves the
+backend both ways in turn and drives /enum/lookup at a fixed concurrency
+over keep-alive connections. The lookup cache is disabled so every request
+reaches the node. Reports throughput and latency percentiles.
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from werkzeug.serving import make_server
+
+import enum_asgi
+import load_test
+from enum_backend import ENUMResolver, EmercoinNVS, app
+from enum_cache import LookupCache
+from fake_emercoind import start_daemon, write_conf
+
+logging.disable(logging.WARNING)
+
+
+def drive(port: int, requests: int, concurrency: int) -> dict:
+    """Send `requests` lookups from `concurrency` keep-alive clients"""
+    def make(n, i):
+        return 'GET', f"/enum/lookup?number=%2B1415555{(n * 7919 + i) % 1000:04d}", None
+    return load_test.drive('127.0.0.1', port, make, requests, concurrency)
+
+
+def serve_flask():
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server.server_port, server.shutdown
+
+
+def serve_asgi(concurrency: int):
+    import uvicorn
+    enum_asgi.AsyncNVS.concurrency = concurrency
+    config = uvicorn.Config(enum_asgi.app, host='127.0.0.1', port=0, log_level='error',
+                            backlog=4096)
+    server = uvicorn.Server(config)
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    port = server.servers[0].sockets[0].getsockname()[1]
+
+    def stop():
+        server.should_exit = True
+    return port, stop
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare Flask and ASGI serving modes')
+    parser.add_argument('--requests', default=2000, type=int, help='Lookups per run')
+    parser.add_argument('--concurrency', default=100, type=int, help='Concurrent clients')
+    parser.add_argument('--latency', default=0.05, type=float, help='Injected node latency (seconds)')
+    parser.add_argument('--rpc-concurrency', default=enum_asgi.EMC_RPC_CONCURRENCY, type=int,
+                        help='ASGI mode: max concurrent RPC calls')
+    parser.add_argument('--json', action='store_true', help='Print results as JSON')
+    args = parser.parse_args()
+
+    daemon, _ = start_daemon(latency=args.latency)
+    conf = os.path.join(tempfile.mkdtemp(prefix='bench_serving_'), 'emercoin.conf')
+    write_conf(conf, daemon.server_address[1])
+    EmercoinNVS.configure_rpc(conf, pool_size=args.rpc_concurrency)
+    ENUMResolver.cache = LookupCache(max_entries=0)
+    # Configured by hand above; keep the ASGI app from applying defaults
+    enum_asgi.configured = True
+
+    results = {'concurrency': args.concurrency, 'node_latency_ms': args.latency * 1000}
+    for mode, serve in (('flask', serve_flask), ('asgi', lambda: serve_asgi(args.rpc_concurrency))):
+        port, stop = serve()
+        drive(port, args.concurrency, args.concurrency)  # warm up connections
+        results[mode] = drive(port, args.requests, args.concurrency)
+        stop()
+    daemon.shutdown()
+
+    if args.json:
+        print(json.dumps(results))
+    else:
+        print(f"{'mode':<8}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'errors':>8}")
+        for mode in ('flask', 'asgi'):
+            r = results[mode]
+            print(f"{mode:<8}{r['requests_per_sec']:>10}{r['p50_ms']:>10}{r['p99_ms']:>10}{r['errors']:>8}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Benchmark: SMS sends with a fresh connection per message vs a pooled session
+Sends messages to the stand-in provider over HTTPS, first with bare
+requests.post (a TCP and TLS handshake per message), then through a
+TelnyxGateway and its keep-alive session. --rtt emulates the network
+distance to a real provider. Reports per-message latency and the number
+of connections the provider accepted.
+"""
+
+import argparse
+import json
+import logging
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import requests
+
+import sms_gateway
+from sms_gateway import TelnyxGateway
+from fake_sms_provider import start_provider
+
+logging.disable(logging.WARNING)
+
+
+def run(send, messages: int, concurrency: int) -> list:
+    """Send `messages` SMS with `concurrency` threads, return per-message seconds"""
+    def timed(i):
+        start = time.perf_counter()
+        result = send("+15550000000", f"+1415555{i % 10000:04d}", f"Your code is {i:06d}")
+        assert result["success"], result
+        return time.perf_counter() - start
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        return list(pool.map(timed, range(messages)))
+
+
+def summary(latencies: list) -> dict:
+    ordered = sorted(latencies)
+    return {
+        'mean_ms': round(statistics.mean(ordered) * 1000, 2),
+        'p50_ms': round(ordered[len(ordered) // 2] * 1000, 2),
+        'p95_ms': round(ordered[int(len(ordered) * 0.95)] * 1000, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark SMS gateway HTTP sessions')
+    parser.add_argument('--messages', default=200, type=int, help='Messages per run')
+    parser.add_argument('--concurrency', default=4, type=int, help='Sending threads')
+    parser.add_argument('--latency', default=0.0, type=float, help='Provider processing time per send (seconds)')
+    parser.add_argument('--rtt', default=0.02, type=float, help='Emulated round trip to the provider (seconds)')
+    parser.add_argument('--plain', action='store_true', help='Plain HTTP instead of HTTPS')
+    parser.add_argument('--json', action='store_true', help='Print results as JSON')
+    args = parser.parse_args()
+
+    server, state, base_url, cert = start_provider(latency=args.latency, tls=not args.plain, rtt=args.rtt)
+    sms_gateway.TELNYX_API_BASE = f"{base_url}/v2"
+    if cert:
+        # Takes precedence over Session.verify, so set it rather than that
+        os.environ['REQUESTS_CA_BUNDLE'] = cert
+
+    def bare_send(from_number, to_number, message):
+        # What the gateways did before: a new connection for every message
+        response = requests.post(
+            f"{sms_gateway.TELNYX_API_BASE}/messages",
+            headers={"Authorization": "Bearer test", "Content-Type": "application/json"},
+            json={"from": from_number, "to": to_number, "text": message},
+            timeout=10
+        )
+        response.raise_for_status()
+        return {"success": True}
+
+    try:
+        bare = run(bare_send, args.messages, args.concurrency)
+        bare_connections = state.connections
+
+        gateway = TelnyxGateway("test", pool_size=args.concurrency)
+        state.connections = 0
+        pooled = run(gateway.send_sms, args.messages, args.concurrency)
+        pooled_connections = state.connections
+        gateway.close()
+    finally:
+        server.shutdown()
+
+    results = {
+        'messages': args.messages,
+        'concurrency': args.concurrency,
+        'scheme': 'http' if args.plain else 'https',
+        'rtt': args.rtt,
+        'per_connection': dict(summary(bare), connections=bare_connections),
+        'pooled_session': dict(summary(pooled), connections=pooled_connections),
+    }
+    results['speedup'] = round(results['per_connection']['mean_ms'] / results['pooled_session']['mean_ms'], 1)
+    if args.json:
+        print(json.dumps(results))
+    else:
+        print(f"{args.messages} messages over {results['scheme']}, {args.concurrency} threads, "
+              f"{args.rtt * 1000:.0f}ms round trip")
+        for label, key in (("connection per message", 'per_connection'), ("pooled session", 'pooled_session')):
+            r = results[key]
+            print(f"  {label:<24} mean {r['mean_ms']:>7.2f}ms  p50 {r['p50_ms']:>7.2f}ms  "
+                  f"p95 {r['p95_ms']:>7.2f}ms  connections {r['connections']}")
+        print(f"  speedup: {results['speedup']}x")
+
+
+if __name__ == '__main__':
+    main()
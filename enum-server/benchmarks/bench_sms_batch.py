@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Benchmark: /sms/send/batch wall time against the number of gateways
+Starts sms_gateway's Flask app in-process with 1, 2, 4... Android gateways,
+each talking to its own stand-in provider (--rtt per request) and limited
+to --rate sends per second and --concurrency requests at a time. One batch
+of --messages recipients is posted with ?stream=1 and timed until the last
+result line. The baseline is one synchronous send per message in a row, as
+separate /sms/send calls did, measured on a sample and extrapolated.
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import requests
+from werkzeug.serving import make_server
+
+import sms_gateway
+from sms_gateway import AndroidSMSGateway, SMSManager
+from sms_queue import SMSQueue
+from fake_sms_provider import start_provider
+
+logging.disable(logging.WARNING)
+
+
+def run_batch(url: str, messages: int) -> tuple:
+    """Post one streamed batch; returns (seconds until the last result, results per gateway)"""
+    body = {
+        "from": "+15550000000",
+        "message": "Water is off at $site until 18:00",
+        "recipients": [{"to": f"+1415555{i % 10000:04d}", "vars": {"site": f"block {i % 7}"}}
+                       for i in range(messages)],
+    }
+    started = time.perf_counter()
+    providers = Counter()
+    with requests.post(f"{url}/sms/send/batch?stream=1", json=body, stream=True) as response:
+        response.raise_for_status()
+        for line in response.iter_lines():
+            result = json.loads(line)
+            if 'state' in result:
+                assert result['state'] == 'sent', result
+                providers[result['provider']] += 1
+    return time.perf_counter() - started, providers
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark batch SMS fan-out across gateways')
+    parser.add_argument('--messages', default=1000, type=int, help='Recipients in the batch')
+    parser.add_argument('--gateways', default='1,2,4', help='Comma-separated gateway counts to run')
+    parser.add_argument('--rate', default=100.0, type=float, help='Sends per second per gateway')
+    parser.add_argument('--concurrency', default=4, type=int, help='Concurrent requests per gateway')
+    parser.add_argument('--rtt', default=0.05, type=float, help='Emulated round trip to each provider (seconds)')
+    parser.add_argument('--json', action='store_true', help='Print results as JSON')
+    args = parser.parse_args()
+
+    counts = [int(n) for n in args.gateways.split(',')]
+    providers = [start_provider(rtt=args.rtt) for _ in range(max(counts))]
+    server = make_server('127.0.0.1', 0, sms_gateway.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}"
+    tmp = tempfile.mkdtemp(prefix='bench_sms_batch_')
+
+    results = {'messages': args.messages, 'rtt': args.rtt, 'rate': args.rate,
+               'concurrency': args.concurrency, 'runs': []}
+    try:
+        # Baseline: what 1 client making separate synchronous /sms/send calls waits
+        gateway = AndroidSMSGateway(providers[0][2], "test")
+        sample = min(args.messages, 50)
+        started = time.perf_counter()
+        for i in range(sample):
+            assert gateway.send_sms("+15550000000", f"+1415555{i:04d}", "Water is off")["success"]
+        per_message = (time.perf_counter() - started) / sample
+        gateway.close()
+        results['sequential_seconds_estimated'] = round(per_message * args.messages, 2)
+
+        for count in counts:
+            manager = SMSManager()
+            for n in range(count):
+                manager.add_gateway(f"android{n}", AndroidSMSGateway(providers[n][2], "test"),
+                                    rate=args.rate, burst=args.rate, concurrency=args.concurrency)
+            queue = SMSQueue(os.path.join(tmp, f"queue_{count}.sqlite"), manager,
+                             workers=count * args.concurrency)
+            sms_gateway.sms_manager, sms_gateway.sms_queue = manager, queue
+            queue.start()
+            seconds, spread = run_batch(url, args.messages)
+            queue.stop()
+            results['runs'].append({
+                'gateways': count,
+                'seconds': round(seconds, 2),
+                'messages_per_second': round(args.messages / seconds, 1),
+                'per_gateway': dict(sorted(spread.items())),
+            })
+    finally:
+        server.shutdown()
+        for provider, *_ in providers:
+            provider.shutdown()
+
+    if args.json:
+        print(json.dumps(results))
+    else:
+        print(f"{args.messages} recipients, {args.rtt * 1000:.0f}ms round trip, per gateway "
+              f"{args.rate:g}/s and {args.concurrency} concurrent")
+        print(f"  separate synchronous sends (estimated): {results['sequential_seconds_estimated']:>7.2f}s")
+        for run in results['runs']:
+            print(f"  batch over {run['gateways']} gateway(s):            {run['seconds']:>7.2f}s "
+                  f"({run['messages_per_second']}/s, {list(run['per_gateway'].values())})")
+
+
+if __name__ == '__main__':
+    main()
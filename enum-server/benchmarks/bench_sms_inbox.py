@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Benchmark: inbound SMS store (sms_inbox.InboxStore)
+- burst: --writers threads store --messages messages as fast as they can,
+  once with group commit (InboxStore.add) and once committing each message
+  on its own, as a plain INSERT per webhook would
+- read: a page of 100 messages for one of --numbers numbers, by cursor, in
+  a store of --messages messages
+- wait: time from storing a message to a long-polling reader returning it
+- prune: longest add() while a full store's messages expire and are pruned
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from sms_inbox import InboxStore, _Pending, normalize_number
+
+
+def message(i: int, numbers: int) -> dict:
+    return {"to": f"+1555000{i % numbers:04d}", "from": "+14155550100", "message": f"Your code is {i:06d}",
+            "provider": "telnyx", "message_id": f"msg-{i}", "timestamp": "2024-01-15T10:30:00Z"}
+
+
+def burst(store: InboxStore, add, messages: int, writers: int, numbers: int) -> float:
+    """Messages stored per second by `writers` threads"""
+    per_writer = messages // writers
+
+    def write(w):
+        for i in range(w * per_writer, (w + 1) * per_writer):
+            add(message(i, numbers))
+
+    threads = [threading.Thread(target=write, args=(w,)) for w in range(writers)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return per_writer * writers / (time.perf_counter() - started)
+
+
+def single_commit_add(store: InboxStore):
+    """One transaction per message, serialised by a lock"""
+    lock = threading.Lock()
+
+    def add(m):
+        pending = _Pending((normalize_number(m['to']), m['from'], m['message'], m['provider'],
+                            m.get('message_id'), m.get('timestamp')))
+        with lock:
+            store._commit([pending])
+    return add
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the inbound SMS store')
+    parser.add_argument('--messages', default=20000, type=int, help='Messages stored per burst')
+    parser.add_argument('--writers', default=8, type=int, help='Concurrent writers')
+    parser.add_argument('--numbers', default=1000, type=int, help='Distinct destination numbers')
+    parser.add_argument('--synchronous', default='NORMAL', choices=('NORMAL', 'FULL'),
+                        help='SQLite synchronous setting (FULL: fsync every commit)')
+    parser.add_argument('--json', action='store_true', help='Print results as JSON')
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix='bench_sms_inbox_')
+    results = {'messages': args.messages, 'writers': args.writers, 'synchronous': args.synchronous}
+
+    def open_store(name):
+        return InboxStore(os.path.join(tmp, name), synchronous=args.synchronous)
+
+    single = open_store('single.sqlite')
+    results['single_commit_per_second'] = round(
+        burst(single, single_commit_add(single), args.messages, args.writers, args.numbers))
+    store = open_store('inbox.sqlite')
+    results['group_commit_per_second'] = round(
+        burst(store, store.add, args.messages, args.writers, args.numbers))
+    results['messages_per_commit'] = store.stats()['messages_per_commit']
+
+    # Cursor reads: walk one number's messages page by page
+    number = message(0, args.numbers)['to']
+    samples, cursor = [], 0
+    while True:
+        started = time.perf_counter()
+        page = store.messages(number, cursor, 100)
+        samples.append((time.perf_counter() - started) * 1000)
+        if not page:
+            break
+        cursor = page[-1]['seq']
+    results['read_page_ms'] = round(statistics.median(samples), 3)
+
+    # Long-poll wake-up
+    wakes = []
+    for i in range(50):
+        latest = store.messages(number, cursor, 1000)
+        cursor = latest[-1]['seq'] if latest else cursor
+        got = {}
+
+        def read():
+            got['messages'] = store.wait(number, cursor, timeout=5)
+            got['at'] = time.perf_counter()
+        reader = threading.Thread(target=read)
+        reader.start()
+        time.sleep(0.01)
+        stored_at = time.perf_counter()
+        store.add(dict(message(0, args.numbers), message_id=f"wake-{i}"))
+        reader.join()
+        assert got['messages'], 'long-poll timed out'
+        wakes.append((got['at'] - stored_at) * 1000)
+    results['wait_wake_ms'] = round(statistics.median(wakes), 3)
+
+    # Writes while everything stored so far expires and is pruned
+    store.retention = 0
+    pruned = {}
+    pruner = threading.Thread(target=lambda: pruned.update(count=store.prune()))
+    latencies = []
+    pruner.start()
+    i = 0
+    while pruner.is_alive():
+        started = time.perf_counter()
+        store.add(dict(message(i, args.numbers), message_id=f"during-prune-{i}"))
+        latencies.append((time.perf_counter() - started) * 1000)
+        i += 1
+    pruner.join()
+    results['pruned'] = pruned['count']
+    results['add_during_prune_p50_ms'] = round(statistics.median(latencies), 3)
+    results['add_during_prune_max_ms'] = round(max(latencies), 3)
+
+    if args.json:
+        print(json.dumps(results))
+        return
+    print(f"{args.messages} messages, {args.writers} writers, {args.numbers} numbers, "
+          f"synchronous={args.synchronous}")
+    print(f"  burst, one commit per message: {results['single_commit_per_second']:>8}/s")
+    print(f"  burst, group commit:           {results['group_commit_per_second']:>8}/s "
+          f"({results['messages_per_commit']} per commit)")
+    print(f"  read page of 100 by cursor:    {results['read_page_ms']:>8}ms")
+    print(f"  long-poll wake-up:             {results['wait_wake_ms']:>8}ms")
+    print(f"  add() while pruning {results['pruned']}: p50 {results['add_during_prune_p50_ms']}ms, "
+          f"max {results['add_during_prune_max_ms']}ms")
+
+
+if __name__ == '__main__':
+    main()
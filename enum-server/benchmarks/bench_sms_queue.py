@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Benchmark: a burst of /sms/send requests, sent inline vs through the queue
+Starts sms_gateway's Flask app in-process with a TelnyxGateway pointed at
+the stand-in provider, which answers 429 above --provider-rate sends per
+second. The same burst is sent with the queue off (the request waits on
+the provider) and on (202 at once, workers paced by the gateway's token
+bucket). Halfway through draining, the queue is stopped and reopened from
+its file, as on a restart. Reports request latency, messages lost to 429s,
+drain time and duplicates seen by the provider.
+"""
+
+import argparse
+import json
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import requests
+from werkzeug.serving import make_server
+
+import sms_gateway
+from sms_gateway import TelnyxGateway
+from sms_queue import SMSQueue
+from fake_sms_provider import start_provider
+
+# The inline run logs every 429
+logging.disable(logging.CRITICAL)
+
+
+def burst(url: str, messages: int, concurrency: int, tag: str) -> list:
+    """POST `messages` sends from `concurrency` clients; returns (status, seconds) per request"""
+    local = threading.local()
+
+    def post(i):
+        session = getattr(local, 'session', None)
+        if session is None:
+            session = local.session = requests.Session()
+        started = time.perf_counter()
+        response = session.post(f"{url}/sms/send", json={
+            "from": "+15550000000", "to": f"+1415555{i % 10000:04d}", "message": f"{tag} {i}"
+        }, headers={"Idempotency-Key": f"{tag}-{i}"})
+        return response.status_code, time.perf_counter() - started
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        return list(pool.map(post, range(messages)))
+
+
+def latency(results: list) -> dict:
+    ordered = sorted(seconds for _, seconds in results)
+    return {
+        'p50_ms': round(ordered[len(ordered) // 2] * 1000, 2),
+        'p95_ms': round(ordered[int(len(ordered) * 0.95)] * 1000, 2),
+        'mean_ms': round(statistics.mean(ordered) * 1000, 2),
+    }
+
+
+def delivered(state, tag: str) -> Counter:
+    with state.lock:
+        return Counter(m['body']['text'] for m in state.messages.values() if m['body']['text'].startswith(tag))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the outbound SMS queue')
+    parser.add_argument('--messages', default=500, type=int, help='Messages in the burst')
+    parser.add_argument('--concurrency', default=10, type=int, help='Concurrent /sms/send clients')
+    parser.add_argument('--provider-rate', default=50.0, type=float,
+                        help='Sends per second the provider accepts before answering 429')
+    parser.add_argument('--rtt', default=0.1, type=float, help='Emulated round trip to the provider (seconds)')
+    parser.add_argument('--workers', default=8, type=int, help='Queue worker threads')
+    parser.add_argument('--json', action='store_true', help='Print results as JSON')
+    args = parser.parse_args()
+
+    provider, state, base_url, _ = start_provider(rtt=args.rtt, rate_limit=args.provider_rate)
+    sms_gateway.TELNYX_API_BASE = f"{base_url}/v2"
+    gateway = TelnyxGateway("test", pool_size=args.concurrency)
+    sms_gateway.sms_manager.add_gateway("telnyx", gateway, rate=args.provider_rate,
+                                        burst=args.provider_rate, concurrency=args.workers)
+
+    server = make_server('127.0.0.1', 0, sms_gateway.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}"
+    tmp = tempfile.mkdtemp(prefix='bench_sms_queue_')
+    path = os.path.join(tmp, 'sms_queue.sqlite')
+
+    try:
+        # Inline: each request holds its client until the provider answered
+        started = time.perf_counter()
+        inline = burst(url, args.messages, args.concurrency, 'inline')
+        inline_seconds = time.perf_counter() - started
+        inline_delivered = delivered(state, 'inline')
+
+        # Queued, with a restart while draining
+        queue = sms_gateway.sms_queue = SMSQueue(path, sms_gateway.sms_manager, workers=args.workers)
+        queue.start()
+        started = time.perf_counter()
+        queued = burst(url, args.messages, args.concurrency, 'queued')
+        accepted_seconds = time.perf_counter() - started
+        while sum(delivered(state, 'queued').values()) < args.messages // 2:
+            time.sleep(0.01)
+        queue.stop()
+        queue = sms_gateway.sms_queue = SMSQueue(path, sms_gateway.sms_manager, workers=args.workers)
+        queue.start()
+        # Clients retrying after the restart get their original messages back
+        repeated = burst(url, 50, 10, 'queued')
+        while queue.stats()['depth']:
+            time.sleep(0.01)
+        queued_seconds = time.perf_counter() - started
+        stats = queue.stats()
+        queue.stop()
+        queued_delivered = delivered(state, 'queued')
+    finally:
+        server.shutdown()
+        provider.shutdown()
+
+    results = {
+        'messages': args.messages,
+        'concurrency': args.concurrency,
+        'provider_rate': args.provider_rate,
+        'inline': dict(latency(inline),
+                       seconds=round(inline_seconds, 3),
+                       errors=sum(1 for status, _ in inline if status != 200),
+                       delivered=len(inline_delivered)),
+        'queued': dict(latency(queued),
+                       accepted_seconds=round(accepted_seconds, 3),
+                       drained_seconds=round(queued_seconds, 3),
+                       errors=sum(1 for status, _ in queued if status != 202),
+                       repeated_accepted_as_new=sum(1 for status, _ in repeated if status == 202),
+                       delivered=len(queued_delivered),
+                       duplicates=sum(n - 1 for n in queued_delivered.values()),
+                       failed=stats['states']['failed'],
+                       retried=stats['retried'],
+                       throttled=stats['gateways']['telnyx']['throttled']),
+        'provider_429s': state.rejected,
+    }
+    if args.json:
+        print(json.dumps(results))
+    else:
+        i, q = results['inline'], results['queued']
+        print(f"{args.messages} messages from {args.concurrency} clients, provider limit "
+              f"{args.provider_rate:g}/s, {args.rtt * 1000:.0f}ms round trip")
+        print(f"  inline: request p50 {i['p50_ms']:.2f}ms p95 {i['p95_ms']:.2f}ms, "
+              f"{i['errors']} errors, {i['delivered']} delivered in {i['seconds']:.2f}s")
+        print(f"  queued: request p50 {q['p50_ms']:.2f}ms p95 {q['p95_ms']:.2f}ms, "
+              f"{q['errors']} errors, accepted in {q['accepted_seconds']:.2f}s, "
+              f"{q['delivered']} delivered in {q['drained_seconds']:.2f}s across a restart")
+        print(f"          {q['duplicates']} duplicates, {q['failed']} failed, {q['retried']} retried, "
+              f"{q['repeated_accepted_as_new']} repeated requests queued twice")
+        print(f"  provider 429s: {results['provider_429s']}")
+
+
+if __name__ == '__main__':
+    main()
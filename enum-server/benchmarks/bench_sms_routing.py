@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Benchmark: SMSManager routing, first gateway vs health- and latency-weighted
+Three Android gateways talk to their own stand-in providers: "primary"
+(registered first, slow: --slow-rtt), "secondary" (--fast-rtt) and "sim"
+(in between). Sends run from --concurrency threads in phases: primary
+slow; primary failing every send with 503; then secondary, which routing
+prefers, failing (its breaker opens) and recovering (a probe closes it).
+The first two phases also run with the old choice, always the first
+gateway. Reports success ratio, mean latency, where the messages went and
+the breaker transitions.
+"""
+
+import argparse
+import json
+import logging
+import os
+import statistics
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from sms_gateway import AndroidSMSGateway, SMSManager
+from sms_routing import CIRCUIT_TRANSITIONS
+from fake_sms_provider import start_provider
+
+logging.disable(logging.CRITICAL)
+
+
+def run(send, messages: int, concurrency: int) -> dict:
+    def timed(i):
+        started = time.perf_counter()
+        result = send("+15550000000", f"+1415555{i % 10000:04d}", "Your code is 123456")
+        return result, time.perf_counter() - started
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        outcomes = list(pool.map(timed, range(messages)))
+    return {
+        'success_ratio': round(sum(1 for r, _ in outcomes if r['success']) / messages, 3),
+        'mean_ms': round(statistics.mean(s for _, s in outcomes) * 1000, 1),
+        'gateways': dict(Counter(r.get('gateway', 'primary') for r, _ in outcomes if r['success'])),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark SMS gateway routing and circuit breakers')
+    parser.add_argument('--messages', default=200, type=int, help='Messages per phase')
+    parser.add_argument('--concurrency', default=8, type=int, help='Sending threads')
+    parser.add_argument('--slow-rtt', default=0.2, type=float, help='Round trip of the primary provider (seconds)')
+    parser.add_argument('--fast-rtt', default=0.02, type=float, help='Round trip of the secondary provider')
+    parser.add_argument('--open-seconds', default=1.0, type=float, help='Seconds a breaker stays open')
+    parser.add_argument('--json', action='store_true', help='Print results as JSON')
+    args = parser.parse_args()
+
+    rtts = {'primary': args.slow_rtt, 'secondary': args.fast_rtt, 'sim': (args.slow_rtt + args.fast_rtt) / 2}
+    providers = {name: start_provider(rtt=rtt) for name, rtt in rtts.items()}
+    manager = SMSManager()
+    for name, (_, _, url, _) in providers.items():
+        manager.add_gateway(name, AndroidSMSGateway(url, "test"))
+        manager.health[name].open_seconds = manager.health[name].base_open_seconds = args.open_seconds
+    first = manager.gateways['primary']
+
+    # (phase, gateway whose provider fails, also run the old choice)
+    plan = (
+        ('primary_slow', None, True),
+        ('primary_failing', 'primary', True),
+        ('secondary_failing', 'secondary', False),
+        ('secondary_recovered', None, False),
+    )
+    phases = {}
+    try:
+        for phase, failing, compare in plan:
+            for name, (_, state, _, _) in providers.items():
+                state.fail_status = 503 if name == failing else 0
+            if phase == 'secondary_recovered':
+                # Let the breaker's open period pass so the next send probes it
+                time.sleep(args.open_seconds)
+            transitions = dict(CIRCUIT_TRANSITIONS._values)
+            result = phases[phase] = {}
+            if compare:
+                result['first_gateway'] = run(first.send_sms, args.messages, args.concurrency)
+            result['routed'] = run(manager.send_sms, args.messages, args.concurrency)
+            result['transitions'] = {f"{gateway} -> {state}": count - transitions.get((gateway, state), 0)
+                                     for (gateway, state), count in CIRCUIT_TRANSITIONS._values.items()
+                                     if count != transitions.get((gateway, state), 0)}
+    finally:
+        for server, *_ in providers.values():
+            server.shutdown()
+
+    results = {'messages': args.messages, 'concurrency': args.concurrency, 'rtts': rtts, 'phases': phases}
+    if args.json:
+        print(json.dumps(results))
+        return
+    print(f"{args.messages} messages per phase, {args.concurrency} threads, round trips "
+          + ", ".join(f"{name} {rtt * 1000:.0f}ms" for name, rtt in rtts.items()))
+    for phase, result in phases.items():
+        print(f"  {phase}:")
+        for mode in ('first_gateway', 'routed'):
+            if mode in result:
+                r = result[mode]
+                print(f"    {mode:<14} success {r['success_ratio'] * 100:5.1f}%  mean {r['mean_ms']:7.1f}ms  "
+                      f"{r['gateways']}")
+        if result['transitions']:
+            print(f"    breaker: {result['transitions']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Benchmark: /sms/webhook acknowledgement time, inline vs ingest log
+Starts sms_gateway's Flask app in-process and posts --messages Telnyx
+webhooks from --concurrency threads, as a provider would; --duplicates of
+them are delivered twice. Handing a message on takes --forward-delay
+seconds. Inline, the webhook answers after that; with the ingest log it
+answers once the body is stored and workers process it afterwards.
+Reports the webhook view's own time (no HTTP), the acknowledgement latency
+over HTTP, how many messages were processed and how many duplicates were
+dropped, and when all of them were processed.
+"""
+
+import argparse
+import json
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import requests
+from werkzeug.serving import make_server
+
+import sms_gateway
+from sms_ingest import IngestLog
+
+logging.disable(logging.WARNING)
+
+
+def webhook(i: int) -> dict:
+    return {"data": {"event_type": "message.received", "payload": {
+        "id": f"msg-{i}",
+        "from": {"phone_number": f"+1415555{i % 10000:04d}"},
+        "to": [{"phone_number": "+15550000000"}],
+        "text": f"Your code is {i % 1000000:06d}",
+        "received_at": "2024-01-15T10:30:00Z",
+    }}}
+
+
+def percentile(samples: list, p: float) -> float:
+    return sorted(samples)[min(len(samples) - 1, int(len(samples) * p))]
+
+
+def view_micros(count: int, offset: int) -> list:
+    """Time of the webhook view alone, in microseconds"""
+    samples = []
+    for i in range(count):
+        body = json.dumps(webhook(offset + i))
+        with sms_gateway.app.test_request_context('/sms/webhook/telnyx', method='POST', data=body,
+                                                  content_type='application/json'):
+            started = time.perf_counter()
+            sms_gateway.receive_sms_webhook('telnyx')
+            samples.append((time.perf_counter() - started) * 1e6)
+    return samples
+
+
+def deliver(url: str, messages: int, duplicates: float, concurrency: int, offset: int) -> dict:
+    redelivered = int(messages * duplicates)
+    ids = list(range(offset, offset + messages)) + list(range(offset, offset + redelivered))
+    session = requests.Session()
+    session.mount('http://', requests.adapters.HTTPAdapter(pool_maxsize=concurrency))
+
+    def post(i):
+        started = time.perf_counter()
+        response = session.post(f"{url}/sms/webhook/telnyx", json=webhook(i))
+        return response.json().get('status'), time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(post, ids))
+    latencies = [seconds * 1000 for _, seconds in results]
+    return {
+        'deliveries': len(ids),
+        'delivery_seconds': round(time.perf_counter() - started, 2),
+        'ack_p50_ms': round(statistics.median(latencies), 2),
+        'ack_p99_ms': round(percentile(latencies, 0.99), 2),
+        'acknowledged_duplicate': sum(1 for status, _ in results if status == 'duplicate'),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark SMS webhook acknowledgement')
+    parser.add_argument('--messages', default=1000, type=int, help='Distinct webhooks delivered')
+    parser.add_argument('--duplicates', default=0.1, type=float, help='Share of webhooks delivered twice')
+    parser.add_argument('--concurrency', default=4, type=int, help='Concurrent deliveries')
+    parser.add_argument('--forward-delay', default=0.02, type=float, help='Seconds to hand a message on')
+    parser.add_argument('--workers', default=4, type=int, help='Ingest log worker threads')
+    parser.add_argument('--json', action='store_true', help='Print results as JSON')
+    args = parser.parse_args()
+
+    processed = []
+    handle = sms_gateway.handle_inbound_sms
+
+    def slow_handle(provider, payload):
+        time.sleep(args.forward_delay)
+        result = handle(provider, payload)
+        processed.append(result['from'])
+        return result
+
+    sms_gateway.handle_inbound_sms = slow_handle
+    server = make_server('127.0.0.1', 0, sms_gateway.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}"
+    tmp = tempfile.mkdtemp(prefix='bench_sms_webhook_')
+
+    results = {'messages': args.messages, 'duplicates': args.duplicates, 'concurrency': args.concurrency,
+               'forward_delay': args.forward_delay, 'modes': {}}
+    try:
+        for mode in ('inline', 'ingest'):
+            processed.clear()
+            offset = len(results['modes']) * 10 ** 7
+            if mode == 'ingest':
+                sms_gateway.sms_ingest = IngestLog(os.path.join(tmp, 'ingest.sqlite'), slow_handle,
+                                                   workers=args.workers)
+                sms_gateway.sms_ingest.start()
+            sample = min(200, args.messages)
+            view = view_micros(sample, offset + 5 * 10 ** 6)
+            started = time.perf_counter()
+            run = deliver(url, args.messages, args.duplicates, args.concurrency, offset)
+            if mode == 'ingest':
+                while sms_gateway.sms_ingest.pending:
+                    time.sleep(0.01)
+                sms_gateway.sms_ingest.stop()
+                sms_gateway.sms_ingest = None
+            run['view_p50_us'] = round(statistics.median(view), 1)
+            run['view_p99_us'] = round(percentile(view, 0.99), 1)
+            run['processed_seconds'] = round(time.perf_counter() - started, 2)
+            run['processed'] = len(processed) - sample
+            results['modes'][mode] = run
+    finally:
+        server.shutdown()
+
+    if args.json:
+        print(json.dumps(results))
+        return
+    print(f"{args.messages} webhooks (+{args.duplicates:.0%} redelivered), {args.concurrency} concurrent, "
+          f"{args.forward_delay * 1000:.0f}ms to hand each on")
+    for mode, run in results['modes'].items():
+        print(f"  {mode:<7} view p50 {run['view_p50_us']:8.1f}us p99 {run['view_p99_us']:8.1f}us  "
+              f"ack p50 {run['ack_p50_ms']:6.2f}ms p99 {run['ack_p99_ms']:6.2f}ms  "
+              f"processed {run['processed']}/{run['deliveries']} in {run['processed_seconds']}s, "
+              f"duplicates dropped {run['acknowledged_duplicate']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for emercoind / emercoin-cli used by the benchmarks
+Serves name_show, name_filter, name_new, name_pending, gettransaction and
+getinfo over HTTP JSON-RPC from an in-memory NVS, seeded with generated
+records or loaded from a JSON / NDJSON file, with optional injected latency
+(global or per method, plus jitter) and a block every --block-time seconds
+to confirm name_new transactions.
+Invoked with "cli" as first argument it behaves like emercoin-cli: forwards
+one call to the stand-in daemon and prints the result.
+"""
+
+import argparse
+import json
+import os
+import random
+import socket
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+DEFAULT_PORT = 16662
+RPC_USER = "bench"
+RPC_PASSWORD = "bench"
+
+
+def make_enum_key(number: str) -> str:
+    digits = number.lstrip('+')
+    return "enum:" + '.'.join(digits[::-1]) + '.e164.arpa'
+
+
+class FakeNVS:
+    """In-memory name store with just enough Emercoin semantics for benchmarks"""
+
+    def __init__(self, records: int = 1000, height: int = 500000, data: Optional[str] = None):
+        self.lock = threading.Lock()
+        self.height = height
+        self.names: Dict[str, Dict] = {}
+        # name_new txid -> height of the block it was submitted at
+        self.pending: Dict[str, int] = {}
+        if data:
+            self.load(data)
+            return
+        for i in range(records):
+            number = f"+1415555{i:04d}"
+            self.put(make_enum_key(number), f'"!^.*$!sip:user{i}@example.com!"')
+
+    def load(self, path: str):
+        """
+        Seed from a JSON list or NDJSON file of {"name" or "number", "value",
+        optional "days"} objects
+        """
+        with open(path, encoding='utf-8') as f:
+            text = f.read()
+        stripped = text.lstrip()
+        if stripped.startswith('['):
+            entries = json.loads(stripped)
+        else:
+            entries = [json.loads(line) for line in text.splitlines() if line.strip()]
+        for entry in entries:
+            name = entry.get('name') or make_enum_key(entry['number'])
+            self.put(name, entry['value'], int(entry.get('days', 365)))
+
+    def put(self, name: str, value: str, days: int = 365) -> str:
+        with self.lock:
+            txid = f"{len(self.names):064x}"
+            self.names[name] = {
+                "name": name,
+                "value": value,
+                "txid": txid,
+                "address": "EfakeBenchAddress",
+                "expires_in": days * 175,
+                "expires_at": self.height + days * 175,
+                "height": self.height,
+            }
+            return txid
+
+    def mine(self, blocks: int = 1):
+        with self.lock:
+            self.height += blocks
+
+    def call(self, method: str, params: List):
+        if method in ("getinfo", "getblockchaininfo"):
+            return {"version": 1000000, "blocks": self.height, "connections": 8}
+        if method == "getblockcount":
+            return self.height
+        if method == "name_show":
+            record = self.names.get(params[0])
+            if record is None:
+                raise KeyError("failed to read from name DB")
+            return dict(record)
+        if method == "name_filter":
+            # name_filter <regexp> <maxage> <from> <nb>, prefix match is enough here
+            prefix = (params[0] if params else "").lstrip('^')
+            max_age = int(params[1]) if len(params) > 1 else 36000
+            start = int(params[2]) if len(params) > 2 else 0
+            count = int(params[3]) if len(params) > 3 else 0
+            with self.lock:
+                matched = [
+                    {k: r[k] for k in ("name", "value", "expires_in", "expires_at", "address")}
+                    for name, r in sorted(self.names.items())
+                    if name.startswith(prefix) and self.height - r["height"] <= max_age
+                ]
+            return matched[start:start + count] if count else matched[start:]
+        if method == "name_new":
+            days = int(params[2]) if len(params) > 2 else 365
+            if params[0] in self.names:
+                raise KeyError("this name already exists")
+            txid = self.put(params[0], params[1], days)
+            self.pending[txid] = self.height
+            return txid
+        if method == "name_pending":
+            # name_new transactions not yet in a block
+            with self.lock:
+                return [{"name": r["name"], "value": r["value"], "txid": r["txid"], "op": "name_new"}
+                        for r in self.names.values() if self.pending.get(r["txid"]) == self.height]
+        if method == "gettransaction":
+            submitted = self.pending.get(params[0])
+            if submitted is None:
+                raise ValueError("Invalid or non-wallet transaction id")
+            return {"txid": params[0], "confirmations": self.height - submitted}
+        raise NotImplementedError(f"Method not found: {method}")
+
+
+def make_handler(nvs: FakeNVS, latency: float, method_latency: Optional[Dict[str, float]] = None,
+                 jitter: float = 0.0):
+    method_latency = method_latency or {}
+
+    def delay(methods: List[str]) -> float:
+        """Latency for a request: the slowest of its methods, plus jitter"""
+        base = max((method_latency.get(m, latency) for m in methods), default=latency)
+        return max(0.0, base + random.uniform(-jitter, jitter)) if jitter else base
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def setup(self):
+            super().setup()
+            # Headers and body go out in separate writes; don't let Nagle stall them
+            self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+        def log_message(self, fmt, *args):
+            pass
+
+        def _dispatch(self, request: Dict) -> Dict:
+            try:
+                result = nvs.call(request.get("method"), request.get("params") or [])
+                return {"result": result, "error": None, "id": request.get("id")}
+            except NotImplementedError as e:
+                return {"result": None, "error": {"code": -32601, "message": str(e)}, "id": request.get("id")}
+            except (KeyError, ValueError, IndexError) as e:
+                return {"result": None, "error": {"code": -4, "message": str(e).strip("'")}, "id": request.get("id")}
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            request = json.loads(body)
+            calls = request if isinstance(request, list) else [request]
+            pause = delay([c.get("method") for c in calls if isinstance(c, dict)])
+            if pause:
+                time.sleep(pause)
+            if isinstance(request, list):
+                reply = [self._dispatch(r) for r in request]
+                status = 200
+            else:
+                reply = self._dispatch(request)
+                status = 500 if reply["error"] else 200
+            data = json.dumps(reply).encode('utf-8')
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+    return Handler
+
+
+def start_daemon(port: int = 0, records: int = 1000, latency: float = 0.0,
+                 method_latency: Optional[Dict[str, float]] = None, jitter: float = 0.0,
+                 data: Optional[str] = None, block_time: float = 0.0):
+    """Start the stand-in daemon in a background thread; returns (server, nvs)"""
+    nvs = FakeNVS(records=records, data=data)
+    if block_time > 0:
+        def produce_blocks():
+            while True:
+                time.sleep(block_time)
+                nvs.mine()
+        threading.Thread(target=produce_blocks, name="fake-blocks", daemon=True).start()
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(nvs, latency, method_latency, jitter))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, nvs
+
+
+def write_conf(path: str, port: int):
+    """Write an emercoin.conf pointing at the stand-in daemon"""
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(f"rpcuser={RPC_USER}\nrpcpassword={RPC_PASSWORD}\n"
+                f"rpcconnect=127.0.0.1\nrpcport={port}\n")
+
+
+def write_cli_wrapper(path: str, port: int):
+    """Write an executable emercoin-cli stand-in that targets the daemon"""
+    script = os.path.abspath(__file__)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(f"#!/bin/sh\nexec {sys.executable} {script} cli --port {port} \"$@\"\n")
+    os.chmod(path, 0o755)
+
+
+def cli_main(argv: List[str]) -> int:
+    """emercoin-cli emulation: [--port N] [-datadir=...] method [params...]"""
+    port = DEFAULT_PORT
+    if len(argv) >= 2 and argv[0] == "--port":
+        port, argv = int(argv[1]), argv[2:]
+    argv = [a for a in argv if not a.startswith("-datadir=")]
+    if not argv:
+        print("error: no method", file=sys.stderr)
+        return 1
+
+    params = []
+    for p in argv[1:]:
+        try:
+            params.append(json.loads(p))
+        except ValueError:
+            params.append(p)
+    request = urllib.request.Request(
+        f"http://127.0.0.1:{port}/",
+        data=json.dumps({"id": 1, "method": argv[0], "params": params}).encode('utf-8'),
+        headers={"Content-Type": "application/json"},
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=10) as response:
+            reply = json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        reply = json.loads(e.read())
+
+    if reply.get("error"):
+        error = reply["error"]
+        print(f"error code: {error['code']}\nerror message:\n{error['message']}", file=sys.stderr)
+        return 1
+    result = reply["result"]
+    print(result if isinstance(result, str) else json.dumps(result, indent=2))
+    return 0
+
+
+def parse_method_latency(specs: List[str]) -> Dict[str, float]:
+    """["name_show=0.02", ...] -> {"name_show": 0.02}"""
+    latencies = {}
+    for spec in specs:
+        method, _, seconds = spec.partition('=')
+        latencies[method] = float(seconds)
+    return latencies
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == "cli":
+        sys.exit(cli_main(sys.argv[2:]))
+
+    parser = argparse.ArgumentParser(description='Stand-in emercoind for benchmarks')
+    parser.add_argument('--port', default=DEFAULT_PORT, type=int, help='JSON-RPC port')
+    parser.add_argument('--records', default=1000, type=int, help='Number of seeded enum: records')
+    parser.add_argument('--latency', default=0.0, type=float, help='Injected latency per request (seconds)')
+    parser.add_argument('--method-latency', action='append', default=[], metavar='METHOD=SECONDS',
+                        help='Latency for one RPC method, e.g. name_new=0.2 (repeatable)')
+    parser.add_argument('--jitter', default=0.0, type=float, help='Random +/- seconds added to latency')
+    parser.add_argument('--data', help='JSON or NDJSON file of records to serve instead of generated ones')
+    parser.add_argument('--block-time', default=0.0, type=float, help='Seconds between blocks (0 = no new blocks)')
+    args = parser.parse_args()
+
+    server, _ = start_daemon(args.port, args.records, args.latency,
+                             parse_method_latency(args.method_latency), args.jitter, args.data,
+                             args.block_time)
+    print(f"fake emercoind listening on 127.0.0.1:{server.server_address[1]} "
+          f"(user={RPC_USER} password={RPC_PASSWORD})")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
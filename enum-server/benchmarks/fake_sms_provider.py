@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Stand-in SMS provider for benchmarks
+Answers the send and status calls of the Telnyx, Bandwidth and Android SMS
+Gateway APIs used by sms_gateway.py, over HTTP or HTTPS (self-signed
+certificate via the openssl binary), with injectable latency. --rtt
+emulates a distant provider: each request waits one round trip and each
+new connection two more (TCP and TLS handshakes). --rate-limit answers
+sends beyond that many per second with 429 like a real provider; setting
+ProviderState.fail_status makes every send fail with that status, to stand
+in for an outage. Counts requests, rejections and the TCP connections they
+arrived on.
+
+    python3 fake_sms_provider.py --port 8443 --latency 0.05 --tls
+"""
+
+import argparse
+import json
+import os
+import random
+import socket
+import ssl
+import subprocess
+import tempfile
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional, Tuple
+
+
+class ProviderState:
+    """Messages accepted and connection / request counters"""
+
+    def __init__(self, rate_limit: float = 0.0):
+        self.lock = threading.Lock()
+        self.messages: Dict[str, Dict] = {}
+        self.connections = 0
+        self.requests = 0
+        self.rejected = 0
+        # Answer every send with this status while set (0: healthy)
+        self.fail_status = 0
+        # Sends per second before answering 429 (0: unlimited), as a token bucket of one second
+        self.rate_limit = rate_limit
+        self._tokens = rate_limit
+        self._stamp = time.monotonic()
+
+    def allow(self) -> bool:
+        """Take a send from the rate limit"""
+        if not self.rate_limit:
+            return True
+        with self.lock:
+            now = time.monotonic()
+            self._tokens = min(self.rate_limit, self._tokens + (now - self._stamp) * self.rate_limit)
+            self._stamp = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            self.rejected += 1
+            return False
+
+    def accept(self, provider: str, body: Dict) -> str:
+        message_id = uuid.uuid4().hex
+        with self.lock:
+            self.messages[message_id] = {'provider': provider, 'body': body, 'at': time.time()}
+        return message_id
+
+
+def make_handler(state: ProviderState, latency: float, jitter: float = 0.0, rtt: float = 0.0):
+    def delay():
+        return max(0.0, latency + random.uniform(-jitter, jitter)) if jitter else latency
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def setup(self):
+            if isinstance(self.request, ssl.SSLSocket):
+                # In this connection's thread, not the accept loop
+                self.request.do_handshake()
+            super().setup()
+            self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            with state.lock:
+                state.connections += 1
+            if rtt:
+                time.sleep(2 * rtt)
+
+        def log_message(self, fmt, *args):
+            pass
+
+        def _reply(self, status: int, body: Dict, headers: Dict = None):
+            data = json.dumps(body).encode('utf-8')
+            self.send_response(status)
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _read_json(self) -> Dict:
+            length = int(self.headers.get("Content-Length", 0))
+            return json.loads(self.rfile.read(length) or b'{}')
+
+        def do_POST(self):
+            body = self._read_json()
+            with state.lock:
+                state.requests += 1
+            pause = delay() + rtt
+            if pause:
+                time.sleep(pause)
+            if state.fail_status:
+                self._reply(state.fail_status, {"error": "provider outage"})
+            elif not state.allow():
+                self._reply(429, {"error": "rate limited"}, {"Retry-After": "1"})
+            elif self.path.endswith("/v2/messages"):
+                message_id = state.accept('telnyx', body)
+                self._reply(200, {"data": {"id": message_id, "to": [{"phone_number": body.get("to"),
+                                                                       "status": "queued"}]}})
+            elif "/users/" in self.path and self.path.endswith("/messages"):
+                self._reply(202, {"id": state.accept('bandwidth', body)})
+            elif self.path.endswith("/message"):
+                self._reply(202, {"id": state.accept('android', body), "state": "Pending"})
+            else:
+                self._reply(404, {"error": "not found"})
+
+        def do_GET(self):
+            with state.lock:
+                state.requests += 1
+            if rtt:
+                time.sleep(rtt)
+            message_id = self.path.rstrip('/').rsplit('/', 1)[-1]
+            message = state.messages.get(message_id)
+            if message is None:
+                self._reply(404, {"error": "not found"})
+            elif message['provider'] == 'telnyx':
+                self._reply(200, {"data": {"id": message_id, "to": [{"status": "delivered"}]}})
+            else:
+                self._reply(200, {"id": message_id, "state": "Delivered"})
+
+    return Handler
+
+
+def make_certificate(directory: str) -> Tuple[str, str]:
+    """Self-signed certificate and key for 127.0.0.1 / localhost"""
+    cert = os.path.join(directory, 'provider.crt')
+    key = os.path.join(directory, 'provider.key')
+    subprocess.run(
+        ['openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-days', '1',
+         '-keyout', key, '-out', cert, '-subj', '/CN=localhost',
+         '-addext', 'subjectAltName=DNS:localhost,IP:127.0.0.1'],
+        check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    return cert, key
+
+
+def start_provider(port: int = 0, latency: float = 0.0, jitter: float = 0.0,
+                   tls: bool = False, rtt: float = 0.0, rate_limit: float = 0.0) -> Tuple[ThreadingHTTPServer, ProviderState, str, Optional[str]]:
+    """Start the provider in a background thread; returns (server, state, base URL, CA file or None)"""
+    state = ProviderState(rate_limit)
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(state, latency, jitter, rtt))
+    server.daemon_threads = True
+    cert = None
+    if tls:
+        cert, key = make_certificate(tempfile.mkdtemp(prefix='fake_sms_'))
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(cert, key)
+        server.socket = context.wrap_socket(server.socket, server_side=True, do_handshake_on_connect=False)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    scheme = 'https' if tls else 'http'
+    return server, state, f"{scheme}://127.0.0.1:{server.server_address[1]}", cert
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Stand-in SMS provider API')
+    parser.add_argument('--port', default=8443, type=int, help='Port to listen on')
+    parser.add_argument('--latency', default=0.0, type=float, help='Seconds added to every send')
+    parser.add_argument('--jitter', default=0.0, type=float, help='Random +/- seconds added to the latency')
+    parser.add_argument('--tls', action='store_true', help='Serve HTTPS with a self-signed certificate')
+    parser.add_argument('--rtt', default=0.0, type=float, help='Emulated network round trip (seconds)')
+    parser.add_argument('--rate-limit', default=0.0, type=float, help='Sends per second before answering 429')
+    args = parser.parse_args()
+
+    server, _, url, cert = start_provider(args.port, args.latency, args.jitter, args.tls, args.rtt,
+                                          args.rate_limit)
+    print(f"Fake SMS provider on {url}" + (f" (CA file {cert})" if cert else ""))
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
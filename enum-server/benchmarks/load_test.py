@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""
+Load test for the ENUM backend endpoints
+Drives /enum/lookup, /enum/list and /enum/register at a configurable
+concurrency over keep-alive connections and reports throughput and
+p50/p95/p99 latency per scenario. Runs against --url, or by default against a
+backend started in-process on top of the stand-in daemon (fake_emercoind.py)
+with injectable node latency. --output writes the results as JSON and
+--compare prints the change against an earlier results file.
+
+    python3 load_test.py --concurrency 50 --latency 0.02 --output base.json
+    python3 load_test.py --concurrency 50 --latency 0.02 --compare base.json
+"""
+
+import argparse
+import http.client
+import json
+import logging
+import os
+import platform
+import random
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from fake_emercoind import parse_method_latency, start_daemon, write_conf
+
+logging.disable(logging.WARNING)
+
+SCENARIOS = ('lookup', 'list', 'register')
+
+# (method, path, body) for the i-th request of client n
+RequestFactory = Callable[[int, int], Tuple[str, str, Optional[bytes]]]
+
+
+def percentile(samples: List[float], p: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+
+def drive(host: str, port: int, make_request: RequestFactory, requests: int,
+          concurrency: int, ok_status=(200,)) -> Dict:
+    """Send `requests` requests from `concurrency` keep-alive clients"""
+    per_client = max(1, requests // concurrency)
+    headers = {'Content-Type': 'application/json'}
+
+    def client(n):
+        conn = http.client.HTTPConnection(host, port, timeout=60)
+        latencies = []
+        errors = 0
+        for i in range(per_client):
+            method, path, body = make_request(n, i)
+            start = time.perf_counter()
+            try:
+                conn.request(method, path, body=body, headers=headers if body else {})
+                response = conn.getresponse()
+                response.read()
+                if response.status not in ok_status:
+                    errors += 1
+            except (OSError, http.client.HTTPException):
+                errors += 1
+                conn.close()
+                conn = http.client.HTTPConnection(host, port, timeout=60)
+            latencies.append(time.perf_counter() - start)
+        conn.close()
+        return latencies, errors
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(client, range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    latencies = [x for lat, _ in results for x in lat]
+    return {
+        'requests': len(latencies),
+        'errors': sum(err for _, err in results),
+        'seconds': round(elapsed, 3),
+        'requests_per_sec': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+        'max_ms': round(max(latencies) * 1000, 2),
+    }
+
+
+def lookup_requests(records: int, miss_ratio: float, seed: int) -> RequestFactory:
+    """Lookups of seeded numbers; a `miss_ratio` share asks for unregistered ones"""
+    def make(n, i):
+        rng = random.Random(seed * 1000003 + n * 7919 + i)
+        if rng.random() < miss_ratio:
+            number = f"%2B1999{rng.randrange(10 ** 7):07d}"
+        else:
+            number = f"%2B1415555{rng.randrange(records):04d}"
+        return 'GET', f'/enum/lookup?number={number}', None
+    return make
+
+
+def list_requests(limit: int) -> RequestFactory:
+    def make(n, i):
+        return 'GET', f'/enum/list?limit={limit}', None
+    return make
+
+
+def register_requests(run_id: int) -> RequestFactory:
+    """Registrations of numbers unique to this run, client and request"""
+    def make(n, i):
+        body = json.dumps({
+            'phone_number': f"+1888{run_id % 1000:03d}{n:03d}{i:05d}",
+            'sip_uri': f"sip:load{n}-{i}@example.com",
+        }).encode()
+        return 'POST', '/enum/register', body
+    return make
+
+
+def serve_local(args) -> Tuple[str, int, Callable[[], None]]:
+    """Start the stand-in daemon and an in-process backend; returns (host, port, stop)"""
+    from werkzeug.serving import make_server
+
+    from enum_backend import ENUMResolver, EmercoinNVS, app
+    from enum_cache import LookupCache
+
+    daemon, _ = start_daemon(records=args.records, latency=args.latency,
+                             method_latency=parse_method_latency(args.method_latency),
+                             jitter=args.jitter, data=args.data)
+    conf = os.path.join(tempfile.mkdtemp(prefix='load_test_'), 'emercoin.conf')
+    write_conf(conf, daemon.server_address[1])
+    EmercoinNVS.configure_rpc(conf, pool_size=args.rpc_pool_size)
+    ENUMResolver.cache = LookupCache(max_entries=args.cache_size)
+
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    def stop():
+        server.shutdown()
+        daemon.shutdown()
+    return '127.0.0.1', server.server_port, stop
+
+
+def compare(results: Dict, baseline: Dict) -> List[str]:
+    """Per-scenario change in throughput and latency against a baseline run"""
+    lines = [f"{'scenario':<10}{'req/s':>16}{'p50 ms':>16}{'p95 ms':>16}{'p99 ms':>16}"]
+    for name, current in results['scenarios'].items():
+        before = baseline.get('scenarios', {}).get(name)
+        if not before:
+            continue
+        cells = []
+        for key in ('requests_per_sec', 'p50_ms', 'p95_ms', 'p99_ms'):
+            old, new = before[key], current[key]
+            change = f"{(new - old) / old * 100:+.1f}%" if old else "n/a"
+            cells.append(f"{change:>16}")
+        lines.append(f"{name:<10}" + ''.join(cells))
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test /enum/lookup, /enum/list and /enum/register')
+    parser.add_argument('--url', help='Backend to test (default: start one locally on the stand-in daemon)')
+    parser.add_argument('--scenario', action='append', choices=SCENARIOS,
+                        help='Scenario to run (repeatable; default: all)')
+    parser.add_argument('--requests', default=2000, type=int, help='Requests per scenario')
+    parser.add_argument('--concurrency', default=50, type=int, help='Concurrent keep-alive clients')
+    parser.add_argument('--miss-ratio', default=0.0, type=float, help='Share of lookups for unregistered numbers')
+    parser.add_argument('--list-limit', default=100, type=int, help='limit= for /enum/list requests')
+    parser.add_argument('--seed', default=1, type=int, help='Seed for the lookup number sequence')
+    parser.add_argument('--output', help='Write results as JSON to this file')
+    parser.add_argument('--compare', help='Earlier --output file to compare against')
+
+    local = parser.add_argument_group('local backend (without --url)')
+    local.add_argument('--records', default=1000, type=int, help='Generated ENUM records')
+    local.add_argument('--data', help='JSON or NDJSON records file for the stand-in daemon')
+    local.add_argument('--latency', default=0.0, type=float, help='Injected node latency (seconds)')
+    local.add_argument('--method-latency', action='append', default=[], metavar='METHOD=SECONDS',
+                       help='Latency for one RPC method, e.g. name_new=0.2 (repeatable)')
+    local.add_argument('--jitter', default=0.0, type=float, help='Random +/- seconds added to node latency')
+    local.add_argument('--cache-size', default=0, type=int, help='Lookup cache entries (0 disables caching)')
+    local.add_argument('--rpc-pool-size', default=64, type=int, help='Keep-alive RPC connections')
+    args = parser.parse_args()
+
+    if args.url:
+        target = urlsplit(args.url)
+        host, port, stop = target.hostname, target.port or 80, None
+    else:
+        host, port, stop = serve_local(args)
+
+    factories = {
+        'lookup': lookup_requests(args.records, args.miss_ratio, args.seed),
+        'list': list_requests(args.list_limit),
+        'register': register_requests(int(time.time())),
+    }
+    # Missing numbers answer 404 by design
+    ok_status = {'lookup': (200, 404), 'list': (200,), 'register': (201, 202)}
+
+    results = {
+        'started_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'target': args.url or 'local',
+        'python': platform.python_version(),
+        'config': {k: v for k, v in vars(args).items() if k not in ('output', 'compare')},
+        'scenarios': {},
+    }
+    try:
+        drive(host, port, factories['lookup'], args.concurrency, args.concurrency,
+              ok_status['lookup'])  # warm up connections
+        for name in args.scenario or SCENARIOS:
+            results['scenarios'][name] = drive(host, port, factories[name], args.requests,
+                                               args.concurrency, ok_status[name])
+    finally:
+        if stop:
+            stop()
+
+    print(f"{'scenario':<10}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    for name, r in results['scenarios'].items():
+        print(f"{name:<10}{r['requests_per_sec']:>10}{r['p50_ms']:>10}{r['p95_ms']:>10}"
+              f"{r['p99_ms']:>10}{r['errors']:>8}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print(f"\nchange against {args.compare}:")
+        print('\n'.join(compare(results, baseline)))
+
+
+if __name__ == '__main__':
+    main()
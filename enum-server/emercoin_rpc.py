@@ -0,0 +1,364 @@
+#!/usr/bin/env python3
+"""
+Native JSON-RPC transport for emercoind
+Keeps a pool of keep-alive HTTP connections to the node so NVS queries do not
+pay a fork/exec of emercoin-cli per call. AsyncJSONRPCPool is the asyncio
+counterpart used by the ASGI serving mode.
+"""
+
+import asyncio
+import base64
+import http.client
+import json
+import logging
+import queue
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Methods that change wallet/chain state must never be replayed on a
+# recycled connection, even if the first attempt looked like it was dropped.
+NON_IDEMPOTENT_METHODS = frozenset({
+    "name_new", "name_update", "name_delete",
+    "sendtoaddress", "sendmany", "sendrawtransaction",
+})
+
+# Errors raised when a keep-alive connection was closed by the node while idle
+_STALE_CONNECTION_ERRORS = (
+    http.client.RemoteDisconnected,
+    http.client.CannotSendRequest,
+    http.client.ResponseNotReady,
+    BrokenPipeError,
+    ConnectionResetError,
+)
+
+
+class RPCError(Exception):
+    """Error object returned by emercoind for a single call"""
+
+    def __init__(self, code: int, message: str):
+        super().__init__(f"{message} (code {code})")
+        self.code = code
+        self.message = message
+
+
+class RPCTransportError(Exception):
+    """The node could not be reached or sent an unusable HTTP response"""
+
+
+class RPCTimeout(RPCTransportError):
+    """The node did not answer within the RPC timeout"""
+
+
+def cli_fallback_allowed(methods: Iterable[str], error: RPCTransportError) -> bool:
+    """
+    True if calls that failed over JSON-RPC with `error` may be sent again
+    through emercoin-cli. Writes may already have been applied by the node,
+    and after a timeout the node may still be working on the call (and a
+    retry would only double the wait), so only read-only calls that could
+    not be delivered are retried.
+    """
+    return not isinstance(error, RPCTimeout) and not any(method in NON_IDEMPOTENT_METHODS for method in methods)
+
+
+def _auth_headers(user: str, password: str) -> Dict[str, str]:
+    token = base64.b64encode(f"{user}:{password}".encode('utf-8')).decode('ascii')
+    return {
+        "Authorization": f"Basic {token}",
+        "Content-Type": "application/json",
+        "Connection": "keep-alive",
+    }
+
+
+def _request(request_id: int, method: str, params: Optional[List]) -> Dict:
+    return {
+        "jsonrpc": "1.0",
+        "id": request_id,
+        "method": method,
+        "params": list(params or []),
+    }
+
+
+def _decode_reply(data: bytes, status: int) -> Any:
+    # emercoind reports call errors with HTTP 404/500 and a JSON body
+    if status == 401:
+        raise RPCTransportError("RPC authentication failed (check rpcuser/rpcpassword)")
+    try:
+        return json.loads(data)
+    except ValueError as e:
+        raise RPCTransportError(f"Invalid JSON-RPC response (HTTP {status})") from e
+
+
+def _call_result(reply: Any) -> Any:
+    if not isinstance(reply, dict):
+        raise RPCTransportError("Unexpected JSON-RPC response shape")
+    error = reply.get("error")
+    if error:
+        raise RPCError(error.get("code", 0), error.get("message", "unknown error"))
+    return reply.get("result")
+
+
+def _batch_results(ids: List[int], reply: Any) -> List[Tuple[Any, Optional[RPCError]]]:
+    if not isinstance(reply, list):
+        raise RPCTransportError("Node did not answer the JSON-RPC batch with a list")
+
+    by_id = {item.get("id"): item for item in reply if isinstance(item, dict)}
+    results = []
+    for request_id in ids:
+        item = by_id.get(request_id)
+        if item is None:
+            results.append((None, RPCError(0, "missing reply in batch response")))
+        elif item.get("error"):
+            error = item["error"]
+            results.append((None, RPCError(error.get("code", 0), error.get("message", "unknown error"))))
+        else:
+            results.append((item.get("result"), None))
+    return results
+
+
+class JSONRPCPool:
+    """Thread-safe pool of keep-alive HTTP connections to emercoind"""
+
+    def __init__(self, host: str, port: int, user: str, password: str,
+                 pool_size: int = 8, timeout: float = 10.0):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.pool_size = pool_size
+
+        self._credentials = (user, password)
+        self._headers = _auth_headers(user, password)
+
+        # LIFO keeps the most recently used (warmest) connections in play
+        self._idle = queue.LifoQueue(maxsize=pool_size)
+        self._slots = threading.BoundedSemaphore(pool_size)
+        self._id_lock = threading.Lock()
+        self._next_id = 0
+
+    @classmethod
+    def from_conf(cls, conf: Dict, **kwargs) -> Optional['JSONRPCPool']:
+        """
+        Build a pool from emercoin.conf settings as returned by
+        ptool_conf.parse_conf. Returns None when RPC credentials are missing.
+        """
+        if not conf.get('rpcuser') or not conf.get('rpcpassword'):
+            return None
+        return cls(
+            host=conf.get('rpcconnect') or '127.0.0.1',
+            port=int(conf.get('rpcport') or 6662),
+            user=conf['rpcuser'],
+            password=conf['rpcpassword'],
+            **kwargs
+        )
+
+    def _request_id(self) -> int:
+        with self._id_lock:
+            self._next_id += 1
+            return self._next_id
+
+    def _acquire(self) -> Tuple[http.client.HTTPConnection, bool]:
+        """Return (connection, reused) and reserve a pool slot"""
+        if not self._slots.acquire(timeout=self.timeout):
+            raise RPCTimeout("Timed out waiting for a free RPC connection")
+        try:
+            return self._idle.get_nowait(), True
+        except queue.Empty:
+            conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            return conn, False
+
+    def _release(self, conn: Optional[http.client.HTTPConnection]):
+        if conn is not None:
+            try:
+                self._idle.put_nowait(conn)
+            except queue.Full:
+                conn.close()
+        self._slots.release()
+
+    def _post(self, body: bytes, retry: bool) -> Any:
+        """POST a JSON-RPC payload and return the decoded response body"""
+        conn, reused = self._acquire()
+        try:
+            try:
+                conn.request("POST", "/", body=body, headers=self._headers)
+                response = conn.getresponse()
+                data = response.read()
+            except _STALE_CONNECTION_ERRORS:
+                conn.close()
+                if not (reused and retry):
+                    raise
+                # The node dropped an idle keep-alive connection; reconnect once
+                logger.debug("Reconnecting stale RPC connection")
+                conn.request("POST", "/", body=body, headers=self._headers)
+                response = conn.getresponse()
+                data = response.read()
+        except (OSError, http.client.HTTPException) as e:
+            conn.close()
+            self._release(None)
+            error = RPCTimeout if isinstance(e, TimeoutError) else RPCTransportError
+            raise error(f"{self.host}:{self.port}: {e}") from e
+
+        if response.will_close:
+            conn.close()
+            self._release(None)
+        else:
+            self._release(conn)
+
+        return _decode_reply(data, response.status)
+
+    def call(self, method: str, params: Optional[List] = None) -> Any:
+        """Execute a single RPC call and return its result"""
+        body = json.dumps(_request(self._request_id(), method, params)).encode('utf-8')
+        return _call_result(self._post(body, retry=method not in NON_IDEMPOTENT_METHODS))
+
+    def batch(self, calls: List[Tuple[str, List]]) -> List[Tuple[Any, Optional[RPCError]]]:
+        """
+        Execute several calls in one JSON-RPC batch request. Returns a
+        (result, error) pair per call, in call order.
+        """
+        if not calls:
+            return []
+
+        ids = [self._request_id() for _ in calls]
+        payload = [_request(request_id, method, params) for request_id, (method, params) in zip(ids, calls)]
+        retry = not any(method in NON_IDEMPOTENT_METHODS for method, _ in calls)
+        return _batch_results(ids, self._post(json.dumps(payload).encode('utf-8'), retry=retry))
+
+    def close(self):
+        """Close all idle connections"""
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+class AsyncJSONRPCPool:
+    """
+    asyncio pool of keep-alive HTTP/1.1 connections to emercoind. At most
+    pool_size calls are in flight; further callers wait for a connection
+    instead of queueing up on the node. Must be used from one event loop.
+    """
+
+    def __init__(self, host: str, port: int, user: str, password: str,
+                 pool_size: int = 32, timeout: float = 10.0):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.pool_size = pool_size
+
+        headers = _auth_headers(user, password)
+        headers["Host"] = f"{host}:{port}"
+        self._head = "".join(f"{k}: {v}\r\n" for k, v in headers.items())
+
+        self._idle: List[Tuple[asyncio.StreamReader, asyncio.StreamWriter]] = []
+        self._slots = asyncio.Semaphore(pool_size)
+        self._next_id = 0
+
+    @classmethod
+    def from_pool(cls, pool: JSONRPCPool, **kwargs) -> 'AsyncJSONRPCPool':
+        """Async pool talking to the same node, with the same credentials, as a JSONRPCPool"""
+        return cls(pool.host, pool.port, *pool._credentials, timeout=pool.timeout, **kwargs)
+
+    def _request_id(self) -> int:
+        self._next_id += 1
+        return self._next_id
+
+    async def _exchange(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter,
+                        body: bytes) -> Tuple[int, bytes, bool]:
+        """Send one request; returns (status, body, keep_alive)"""
+        writer.write(f"POST / HTTP/1.1\r\n{self._head}Content-Length: {len(body)}\r\n\r\n"
+                     .encode('latin-1') + body)
+        await writer.drain()
+
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionResetError("connection closed by node")
+        parts = status_line.split(None, 2)
+        if len(parts) < 2 or not parts[0].startswith(b"HTTP/"):
+            raise RPCTransportError(f"Malformed HTTP status line: {status_line[:80]!r}")
+        status = int(parts[1])
+
+        length = None
+        connection = ""
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode('latin-1').partition(":")
+            name = name.strip().lower()
+            value = value.strip()
+            if name == "content-length":
+                length = int(value)
+            elif name == "connection":
+                connection = value.lower()
+            elif name == "transfer-encoding" and value.lower() != "identity":
+                raise RPCTransportError(f"Unsupported transfer encoding from node: {value}")
+
+        if parts[0] == b"HTTP/1.1":
+            keep_alive = connection != "close"
+        else:
+            keep_alive = connection == "keep-alive"
+
+        if length is None:
+            data = await reader.read()
+            keep_alive = False
+        else:
+            data = await reader.readexactly(length)
+        return status, data, keep_alive
+
+    async def _post(self, body: bytes, retry: bool) -> Any:
+        """POST a JSON-RPC payload and return the decoded response body"""
+        async with self._slots:
+            reused = bool(self._idle)
+            try:
+                if reused:
+                    reader, writer = self._idle.pop()
+                else:
+                    reader, writer = await asyncio.wait_for(
+                        asyncio.open_connection(self.host, self.port), self.timeout)
+                try:
+                    status, data, keep_alive = await asyncio.wait_for(
+                        self._exchange(reader, writer, body), self.timeout)
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    writer.close()
+                    if not (reused and retry):
+                        raise
+                    # The node dropped an idle keep-alive connection; reconnect once
+                    logger.debug("Reconnecting stale RPC connection")
+                    reader, writer = await asyncio.wait_for(
+                        asyncio.open_connection(self.host, self.port), self.timeout)
+                    status, data, keep_alive = await asyncio.wait_for(
+                        self._exchange(reader, writer, body), self.timeout)
+            except asyncio.TimeoutError as e:
+                raise RPCTimeout(f"{self.host}:{self.port}: timed out") from e
+            except (OSError, asyncio.IncompleteReadError, ValueError) as e:
+                raise RPCTransportError(f"{self.host}:{self.port}: {e}") from e
+
+            if keep_alive and len(self._idle) < self.pool_size:
+                self._idle.append((reader, writer))
+            else:
+                writer.close()
+
+        return _decode_reply(data, status)
+
+    async def call(self, method: str, params: Optional[List] = None) -> Any:
+        """Execute a single RPC call and return its result"""
+        body = json.dumps(_request(self._request_id(), method, params)).encode('utf-8')
+        return _call_result(await self._post(body, retry=method not in NON_IDEMPOTENT_METHODS))
+
+    async def batch(self, calls: List[Tuple[str, List]]) -> List[Tuple[Any, Optional[RPCError]]]:
+        """Execute several calls in one JSON-RPC batch request (see JSONRPCPool.batch)"""
+        if not calls:
+            return []
+
+        ids = [self._request_id() for _ in calls]
+        payload = [_request(request_id, method, params) for request_id, (method, params) in zip(ids, calls)]
+        retry = not any(method in NON_IDEMPOTENT_METHODS for method, _ in calls)
+        return _batch_results(ids, await self._post(json.dumps(payload).encode('utf-8'), retry=retry))
+
+    def close(self):
+        """Close all idle connections"""
+        while self._idle:
+            _, writer = self._idle.pop()
+            writer.close()
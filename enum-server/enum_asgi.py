@@ -0,0 +1,487 @@
+#!/usr/bin/env python3
+"""
+ASGI serving mode for the ENUM backend
+Serves the same routes as enum_backend.py from one asyncio event loop.
+Lookups and /health talk to emercoind through AsyncJSONRPCPool, so a slow
+node call parks a coroutine instead of a thread, and at most
+--rpc-concurrency calls are in flight toward the node. Other routes run the
+Flask views in a worker thread. The lookup cache's shared table (fcntl
+locks) and the local index (SQLite) block, so they are read and written on
+lookup_executor's threads rather than on the event loop.
+
+    python3 enum_asgi.py --host 0.0.0.0 --port 8080
+    uvicorn enum_asgi:app            (enum_backend's default options)
+"""
+
+import asyncio
+import io
+import json
+import logging
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+from urllib.parse import parse_qsl
+
+import enum_backend
+from enum_backend import (
+    ENUMResolver, EmercoinNVS, app as flask_app, rpc_executor,
+    build_arg_parser, configure, parse_lookup_args, parse_batch_body,
+    lookup_body, batch_response, health_response, rpc_error_kind,
+    parse_changes_args, changes_unavailable, CHANGES_HEADERS,
+)
+from emercoin_rpc import AsyncJSONRPCPool, RPCError, RPCTransportError, cli_fallback_allowed
+from enum_cache import AsyncSingleFlight, MISS, etag_matches
+from enum_metrics import HTTP_REQUESTS, HTTP_LATENCY, RPC_LATENCY, RPC_ERRORS, SERIALIZE
+
+logger = logging.getLogger(__name__)
+
+# Max concurrent RPC calls from the event loop to emercoind
+EMC_RPC_CONCURRENCY = 64
+
+# Threads for lookup cache and index reads and writes
+LOOKUP_THREADS = 8
+lookup_executor = ThreadPoolExecutor(max_workers=LOOKUP_THREADS, thread_name_prefix='lookup')
+
+# Set once enum_backend.configure() has run: by main(), or on the first
+# startup when the app is served directly (uvicorn enum_asgi:app)
+configured = False
+
+
+def configure_defaults():
+    """Apply enum_backend's default options unless main() configured the backend"""
+    global configured
+    if not configured:
+        configure(build_arg_parser().parse_args([]))
+        configured = True
+
+
+def startup():
+    configure_defaults()
+    AsyncNVS.start()
+
+
+async def run_local(fn, *args):
+    """Run a lookup cache / index call on lookup_executor"""
+    return await asyncio.get_running_loop().run_in_executor(lookup_executor, fn, *args)
+
+
+class AsyncNVS:
+    """Async interface to Emercoin NVS for the event loop"""
+
+    # Created on startup from EmercoinNVS.rpc_pool; None means emercoin-cli
+    rpc_pool: Optional[AsyncJSONRPCPool] = None
+    limit: Optional[asyncio.Semaphore] = None
+    concurrency = EMC_RPC_CONCURRENCY
+
+    # Concurrent identical read-only calls share one request to the node
+    flights = AsyncSingleFlight()
+
+    @classmethod
+    def start(cls):
+        cls.limit = asyncio.Semaphore(cls.concurrency)
+        if EmercoinNVS.rpc_pool is not None:
+            cls.rpc_pool = AsyncJSONRPCPool.from_pool(EmercoinNVS.rpc_pool, pool_size=cls.concurrency)
+
+    @classmethod
+    def stop(cls):
+        if cls.rpc_pool is not None:
+            cls.rpc_pool.close()
+            cls.rpc_pool = None
+
+    @classmethod
+    async def call(cls, method: str, params: List = None):
+        """Execute an RPC command; raises RPCError / RPCTransportError like EmercoinNVS.call"""
+        async with cls.limit:
+            started = time.perf_counter()
+            try:
+                if cls.rpc_pool is not None:
+                    try:
+                        return await cls.rpc_pool.call(method, params)
+                    except RPCTransportError as e:
+                        if not cli_fallback_allowed([method], e):
+                            raise
+                        logger.warning(f"JSON-RPC transport failed for {method}, falling back to emercoin-cli: {e}")
+
+                loop = asyncio.get_running_loop()
+                return await loop.run_in_executor(rpc_executor, EmercoinNVS.call_cli, method, params)
+            except (RPCError, RPCTransportError) as e:
+                RPC_ERRORS.inc(method, rpc_error_kind(e))
+                raise
+            finally:
+                RPC_LATENCY.observe(time.perf_counter() - started, method)
+
+    @classmethod
+    async def call_shared(cls, method: str, params: List = None):
+        """call() for read-only methods, coalesced with identical in-flight calls"""
+        key = (method, json.dumps(params or []))
+        return await cls.flights.do(key, lambda: cls.call(method, params))
+
+    @classmethod
+    async def call_batch(cls, calls: List[tuple]) -> List[tuple]:
+        """(result, error) per (method, params) call, in order"""
+        if cls.rpc_pool is not None:
+            try:
+                async with cls.limit:
+                    started = time.perf_counter()
+                    results = await cls.rpc_pool.batch(calls)
+                    RPC_LATENCY.observe(time.perf_counter() - started, 'batch')
+                for (method, _), (_, error) in zip(calls, results):
+                    if error is not None:
+                        RPC_ERRORS.inc(method, rpc_error_kind(error))
+                return results
+            except RPCTransportError as e:
+                if not cli_fallback_allowed([method for method, _ in calls], e):
+                    for method, _ in calls:
+                        RPC_ERRORS.inc(method, rpc_error_kind(e))
+                    return [(None, e)] * len(calls)
+                logger.warning(f"JSON-RPC batch failed, falling back to emercoin-cli: {e}")
+
+        async def run_one(call):
+            try:
+                return await cls.call(*call), None
+            except (RPCError, RPCTransportError) as e:
+                return None, e
+
+        return list(await asyncio.gather(*(run_one(call) for call in calls)))
+
+
+async def fetch_record(nvs_key: str) -> Optional[Dict]:
+    """Async ENUMResolver.fetch_record"""
+    nvs_record = await run_local(ENUMResolver.cached_record, nvs_key)
+    if nvs_record is not MISS:
+        return nvs_record
+
+    try:
+        reply, error = await AsyncNVS.call_shared("name_show", [nvs_key]), None
+    except (RPCError, RPCTransportError) as e:
+        reply, error = None, e
+    return await run_local(ENUMResolver.accept_reply, nvs_key, reply, error)
+
+
+async def fetch_records(nvs_keys: List[str]) -> Dict[str, Optional[Dict]]:
+    """Async ENUMResolver.fetch_records"""
+    def cached(keys):
+        return {nvs_key: ENUMResolver.cached_record(nvs_key) for nvs_key in keys}
+
+    def accept(replies):
+        return {nvs_key: ENUMResolver.accept_reply(nvs_key, nvs_record, error)
+                for nvs_key, (nvs_record, error) in replies}
+
+    records = await run_local(cached, list(dict.fromkeys(nvs_keys)))
+    pending = [nvs_key for nvs_key, nvs_record in records.items() if nvs_record is MISS]
+    if pending:
+        replies = await AsyncNVS.call_batch([("name_show", [nvs_key]) for nvs_key in pending])
+        records.update(await run_local(accept, list(zip(pending, replies))))
+
+    return records
+
+
+# Route handlers: (query args, body bytes, request headers) -> (response dict, status),
+# or (body bytes, status, extra headers) for pre-serialized responses
+
+async def health(args: Dict, body: bytes, headers: Dict) -> tuple:
+    chain = ENUMResolver.chain
+    if chain is not None and chain.is_running():
+        body, status = await run_local(lambda: health_response(snapshot=chain.snapshot()))
+        if status == 200:
+            body['rpc_coalescing'] = AsyncNVS.flights.stats()
+        return body, status
+
+    try:
+        info = await AsyncNVS.call_shared("getinfo")
+    except (RPCError, RPCTransportError) as e:
+        logger.error(f"RPC error for getinfo: {e}")
+        info = None
+    body, status = await run_local(health_response, info)
+    if status == 200:
+        body['rpc_coalescing'] = AsyncNVS.flights.stats()
+    return body, status
+
+
+async def enum_lookup(args: Dict, body: bytes, headers: Dict) -> tuple:
+    try:
+        phone_number, longest_prefix, service = parse_lookup_args(args)
+    except ValueError as e:
+        return {'error': str(e)}, 400
+
+    # The prefix trie is in memory, cheap enough for the event loop
+    target = ENUMResolver.target(phone_number, longest_prefix)
+    nvs_record = await fetch_record(target[1])
+    data, status, etag = lookup_body(phone_number, longest_prefix, service, target, nvs_record,
+                                     '/enum/lookup')
+    if etag is None:
+        return data, status, []
+
+    extra = [(b'etag', etag.encode('ascii')), (b'cache-control', b'no-cache')]
+    if etag_matches(headers.get('if-none-match'), etag):
+        return b'', 304, extra
+    return data, status, extra
+
+
+async def enum_lookup_batch(args: Dict, body: bytes, headers: Dict) -> tuple:
+    try:
+        data = json.loads(body) if body else None
+    except ValueError:
+        return {'error': 'Invalid JSON body'}, 400
+    try:
+        numbers, longest_prefix, service = parse_batch_body(data)
+    except ValueError as e:
+        return {'error': str(e)}, 400
+
+    targets = {number: ENUMResolver.target(number, longest_prefix) for number in numbers}
+    records = await fetch_records([nvs_key for _, nvs_key, _ in targets.values()])
+    resolved = {
+        number: ENUMResolver.build_result(number, enum_domain, nvs_key, records.get(nvs_key),
+                                          matched_prefix, service)
+        for number, (enum_domain, nvs_key, matched_prefix) in targets.items()
+    }
+    return batch_response(numbers, resolved), 200
+
+
+ROUTES = {
+    ('GET', '/health'): health,
+    ('GET', '/enum/lookup'): enum_lookup,
+    ('POST', '/enum/lookup/batch'): enum_lookup_batch,
+}
+
+
+async def enum_changes(scope, receive, send):
+    """/enum/changes on the event loop, so a subscriber does not hold a thread"""
+    args = dict(parse_qsl(scope['query_string'].decode('latin-1')))
+    headers = {name.decode('latin-1').lower(): value.decode('latin-1') for name, value in scope['headers']}
+    try:
+        change_filter, last_id = parse_changes_args(args, headers.get('last-event-id'))
+        error = changes_unavailable()
+    except ValueError as e:
+        error = {'error': str(e)}, 400
+    if error is not None:
+        await send_json(send, scope['path'], *error)
+        HTTP_REQUESTS.inc(scope['path'], scope['method'], str(error[1]))
+        return
+
+    HTTP_REQUESTS.inc(scope['path'], scope['method'], '200')
+    feed = ENUMResolver.feed
+
+    async def pump():
+        await send({
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': [(b'content-type', b'text/event-stream')]
+                       + [(k.lower().encode('ascii'), v.encode('ascii')) for k, v in CHANGES_HEADERS.items()]
+                       + CORS_HEADERS,
+        })
+        async for text in feed.stream_async(change_filter, last_id):
+            await send({'type': 'http.response.body', 'body': text.encode('utf-8'), 'more_body': True})
+
+    # Servers may drop sends to a closed connection silently; stop on disconnect
+    streaming = asyncio.ensure_future(pump())
+    disconnected = asyncio.ensure_future(wait_disconnect(receive))
+    try:
+        await asyncio.wait([streaming, disconnected], return_when=asyncio.FIRST_COMPLETED)
+        if streaming.done() and not streaming.cancelled() and streaming.exception() is not None:
+            logger.warning(f"{scope['path']} stream ended: {streaming.exception()}")
+    finally:
+        streaming.cancel()
+        disconnected.cancel()
+        feed.unsubscribe()
+
+
+async def wait_disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+# Long-lived responses handled with the raw ASGI callables
+STREAMS = {
+    ('GET', '/enum/changes'): enum_changes,
+}
+
+# Added to every native response, matching flask_cors defaults
+CORS_HEADERS = [(b'access-control-allow-origin', b'*')]
+
+
+async def read_body(receive) -> bytes:
+    chunks = []
+    while True:
+        message = await receive()
+        chunks.append(message.get('body', b''))
+        if not message.get('more_body'):
+            return b''.join(chunks)
+
+
+async def send_json(send, path: str, body: Dict, status: int):
+    started = time.perf_counter()
+    data = json.dumps(body).encode('utf-8')
+    SERIALIZE.observe(time.perf_counter() - started, path)
+    await send_bytes(send, data, status)
+
+
+async def send_bytes(send, data: bytes, status: int, extra_headers: List[tuple] = ()):
+    """Send an already serialized JSON body"""
+    headers = list(extra_headers) + CORS_HEADERS
+    if status != 304:
+        headers[:0] = [
+            (b'content-type', b'application/json'),
+            (b'content-length', str(len(data)).encode('ascii')),
+        ]
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': headers,
+    })
+    await send({'type': 'http.response.body', 'body': data})
+
+
+async def call_flask(scope, body: bytes, send):
+    """Run a request through the Flask app in a worker thread, streaming its body"""
+    headers = {}
+    for name, value in scope['headers']:
+        key = name.decode('latin-1').upper().replace('-', '_')
+        if key not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            key = 'HTTP_' + key
+        value = value.decode('latin-1')
+        headers[key] = f"{headers[key]},{value}" if key in headers else value
+
+    server = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', ''),
+        'PATH_INFO': scope['path'],
+        'QUERY_STRING': scope['query_string'].decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': (scope.get('client') or ('', 0))[0],
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+        **headers,
+    }
+    environ['CONTENT_LENGTH'] = str(len(body))
+
+    started = {}
+
+    def start_response(status, response_headers, exc_info=None):
+        started['status'] = int(status.split(' ', 1)[0])
+        started['headers'] = [(k.lower().encode('latin-1'), v.encode('latin-1'))
+                              for k, v in response_headers]
+
+    # The WSGI body is iterated on one worker thread (Flask's streamed
+    # responses are bound to it); the bounded queue applies backpressure
+    loop = asyncio.get_running_loop()
+    chunks: asyncio.Queue = asyncio.Queue(maxsize=16)
+
+    def produce():
+        def put(item):
+            asyncio.run_coroutine_threadsafe(chunks.put(item), loop).result()
+        try:
+            iterable = flask_app(environ, start_response)
+            try:
+                for chunk in iterable:
+                    put(chunk)
+            finally:
+                if hasattr(iterable, 'close'):
+                    iterable.close()
+        except Exception as e:
+            put(e)
+        finally:
+            put(None)
+
+    producer = loop.run_in_executor(None, produce)
+    chunk = await chunks.get()
+    if isinstance(chunk, Exception):
+        await producer
+        raise chunk
+
+    await send({
+        'type': 'http.response.start',
+        'status': started['status'],
+        'headers': started['headers'],
+    })
+    while chunk is not None and not isinstance(chunk, Exception):
+        if chunk:
+            await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+        chunk = await chunks.get()
+    await send({'type': 'http.response.body', 'body': b''})
+    await producer
+
+
+async def app(scope, receive, send):
+    """ASGI entry point"""
+    if scope['type'] == 'lifespan':
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                startup()
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                AsyncNVS.stop()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    if scope['type'] != 'http':
+        return
+
+    if AsyncNVS.limit is None:
+        # Server without lifespan support
+        startup()
+
+    stream = STREAMS.get((scope['method'], scope['path']))
+    if stream is not None:
+        await stream(scope, receive, send)
+        return
+
+    body = await read_body(receive)
+    handler = ROUTES.get((scope['method'], scope['path']))
+    if handler is None:
+        await call_flask(scope, body, send)
+        return
+
+    started = time.perf_counter()
+    args = dict(parse_qsl(scope['query_string'].decode('latin-1')))
+    headers = {name.decode('latin-1').lower(): value.decode('latin-1') for name, value in scope['headers']}
+    try:
+        response = await handler(args, body, headers)
+    except Exception as e:
+        logger.error(f"{scope['path']} error: {e}")
+        response = {'status': 'error', 'error': str(e)}, 500
+    status = response[1]
+    if isinstance(response[0], bytes):
+        await send_bytes(send, *response)
+    else:
+        await send_json(send, scope['path'], *response)
+    HTTP_LATENCY.observe(time.perf_counter() - started, scope['path'], scope['method'])
+    HTTP_REQUESTS.inc(scope['path'], scope['method'], str(status))
+
+
+def main():
+    global configured
+    parser = build_arg_parser('ENUM Backend Server (asyncio)')
+    parser.add_argument('--rpc-concurrency', default=EMC_RPC_CONCURRENCY, type=int,
+                        help='Max concurrent RPC calls to emercoind')
+    args = parser.parse_args()
+
+    try:
+        import uvicorn
+    except ImportError:
+        logger.error("The ASGI serving mode needs uvicorn: pip3 install uvicorn")
+        sys.exit(1)
+
+    configure(args)
+    configured = True
+    AsyncNVS.concurrency = args.rpc_concurrency
+
+    logger.info(f"Starting ENUM Backend Server (asyncio) on {args.host}:{args.port}")
+    logger.info(f"Emercoin CLI: {enum_backend.EMC_CLI_PATH}")
+    logger.info(f"Emercoin Datadir: {enum_backend.EMC_DATADIR}")
+
+    uvicorn.run(app, host=args.host, port=args.port, log_level='debug' if args.debug else 'warning')
+
+
+if __name__ == '__main__':
+    main()
@@ -4,13 +4,46 @@ ENUM Backend for Antisip using Emercoin NVS
 RFC 6116-based ENUM implementation with simplified NAPTR format for Emercoin NVS
 """
 
+import argparse
+import io
+import os
+import sys
 import subprocess
 import json
 import re
-from flask import Flask, jsonify, request, Response
+import itertools
+import threading
+import time
+from flask import Flask, g, jsonify, request, Response, stream_with_context
 from flask_cors import CORS
 import logging
-from typing import Optional, Dict, List
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Optional, Dict, Iterator, List
+
+from emercoin_rpc import JSONRPCPool, RPCError, RPCTimeout, RPCTransportError, cli_fallback_allowed
+from enum_cache import LookupCache, ResponseCache, SingleFlight, MISS, etag_matches
+from enum_index import ENUMIndex, ALL_BLOCKS, SnapshotError, read_snapshot_header
+from enum_feed import ChangeFeed, ChangeFilter
+from enum_shm import SharedRecordTable
+from enum_trie import DigitTrie
+from enum_chain import ChainMonitor
+from enum_jobs import RegistrationQueue, DuplicateJob
+from enum_import import BulkImporter, naptr_value, read_rows, DEFAULT_DAYS
+import enum_dns
+from enum_naptr import resolve_naptr, cache_stats as naptr_cache_stats
+from enum_metrics import (
+    REGISTRY, CONTENT_TYPE as METRICS_CONTENT_TYPE,
+    HTTP_REQUESTS, HTTP_LATENCY, RPC_LATENCY, RPC_ERRORS, NAPTR_PARSE, SERIALIZE,
+)
+
+# ptool_conf ships in ../tools in the repository and next to this file on
+# deployed nodes; without it the backend falls back to emercoin-cli.
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tools'))
+try:
+    from ptool_conf import parse_conf
+except ImportError:
+    parse_conf = None
 
 # Configure logging
 logging.basicConfig(
@@ -25,14 +58,193 @@ CORS(app)  # Enable CORS for Antisip requests
 # Emercoin Configuration
 EMC_CLI_PATH = "/usr/local/bin/emercoin-cli"
 EMC_DATADIR = "/home/pi/.emercoin"
+EMC_RPC_POOL_SIZE = 8
+EMC_RPC_BATCH_CHUNK = 25
 ENUM_PREFIX = "enum:"
+ENUM_BATCH_MAX = 100
+ENUM_LIST_PAGE_SIZE = 1000
+ENUM_LIST_MAX_PAGE = 10000
+
+# emercoind error code for a name that is not in the NVS database
+NAME_NOT_FOUND = -4
+
+# Lookup cache configuration
+LOOKUP_CACHE_SIZE = 10000
+LOOKUP_CACHE_MAX_TTL = 600
+LOOKUP_CACHE_NEGATIVE_TTL = 30
+
+# Lookup cache shared by the worker processes of a host (memory-mapped;
+# /dev/shm keeps it in RAM and across worker restarts)
+SHARED_CACHE_PATH = "/dev/shm/enum_lookup_cache"
+SHARED_CACHE_SLOTS = 32768
+SHARED_CACHE_SLOT_SIZE = 1024
+
+# Local ENUM index configuration
+ENUM_INDEX_PATH = "/home/pi/enum-server/data/enum_index.sqlite"
+ENUM_INDEX_SYNC_INTERVAL = 30
+
+# Seconds between background getinfo polls backing /health
+CHAIN_POLL_INTERVAL = 5
+
+# Registration queue: name_new submissions per second and confirmations
+# after which a job is done
+REGISTER_QUEUE_PATH = "/home/pi/enum-server/data/registrations.sqlite"
+REGISTER_RATE = 1.0
+REGISTER_CONFIRMATIONS = 1
+REGISTER_POLL_INTERVAL = 30
+
+# Rows of a bulk import processed in parallel
+ENUM_IMPORT_CONCURRENCY = 8
+
+# DNS NAPTR responder: cap for answer TTLs (seconds) and threads for
+# lookups that miss the cache
+DNS_MAX_TTL = 300
+DNS_WORKERS = 16
+
+# Change feed: events held for reconnecting subscribers, max concurrent
+# /enum/changes streams and seconds between keep-alive comments
+FEED_HISTORY = 10000
+FEED_MAX_SUBSCRIBERS = 100
+FEED_HEARTBEAT = 15
+# Index meta key holding the last change feed event id handed out
+FEED_ID_META = 'feed_last_id'
+
+# Runs batch chunks / parallel emercoin-cli calls
+rpc_executor = ThreadPoolExecutor(max_workers=EMC_RPC_POOL_SIZE, thread_name_prefix='rpc')
+
+
+def rpc_error_kind(error: Exception) -> str:
+    """Label for enum_rpc_errors_total"""
+    if isinstance(error, RPCTimeout):
+        return 'timeout'
+    if isinstance(error, RPCTransportError):
+        return 'transport'
+    if isinstance(error, RPCError) and error.code == NAME_NOT_FOUND:
+        return 'not_found'
+    return 'rpc_error'
+
 
 class EmercoinNVS:
     """Interface to Emercoin Name-Value Storage"""
     
+    # Keep-alive JSON-RPC transport; None means every call forks emercoin-cli
+    rpc_pool: Optional[JSONRPCPool] = None
+    
+    # Concurrent identical read-only calls share one request to the node
+    flights = SingleFlight()
+    
+    @classmethod
+    def configure_rpc(cls, conf_path: str, pool_size: int = EMC_RPC_POOL_SIZE) -> bool:
+        """
+        Enable the JSON-RPC transport using rpcuser/rpcpassword/rpcconnect/rpcport
+        from emercoin.conf. Returns False (CLI fallback stays active) if the
+        config cannot be used.
+        """
+        if parse_conf is None:
+            logger.warning("ptool_conf not found, using emercoin-cli for RPC")
+            return False
+        
+        conf = parse_conf(Path(conf_path))
+        pool = JSONRPCPool.from_conf(conf, pool_size=pool_size)
+        if pool is None:
+            logger.warning(f"No rpcuser/rpcpassword in {conf_path}, using emercoin-cli for RPC")
+            return False
+        
+        if cls.rpc_pool is not None:
+            cls.rpc_pool.close()
+        cls.rpc_pool = pool
+        logger.info(f"JSON-RPC transport: {pool.host}:{pool.port} (pool size {pool_size})")
+        return True
+    
+    @classmethod
+    def call(cls, method: str, params: List = None):
+        """
+        Execute Emercoin RPC command, raising RPCError for errors reported by
+        the node and RPCTransportError if it could not be reached. Read-only
+        calls that JSON-RPC could not deliver are retried with emercoin-cli.
+        """
+        started = time.perf_counter()
+        try:
+            if cls.rpc_pool is not None:
+                try:
+                    return cls.rpc_pool.call(method, params)
+                except RPCTransportError as e:
+                    if not cli_fallback_allowed([method], e):
+                        raise
+                    logger.warning(f"JSON-RPC transport failed for {method}, falling back to emercoin-cli: {e}")
+            
+            return cls.call_cli(method, params)
+        except (RPCError, RPCTransportError) as e:
+            RPC_ERRORS.inc(method, rpc_error_kind(e))
+            raise
+        finally:
+            RPC_LATENCY.observe(time.perf_counter() - started, method)
+    
+    @classmethod
+    def call_shared(cls, method: str, params: List = None):
+        """
+        call() for read-only methods; threads making the same call while it
+        is in flight wait for it and share its result (or error)
+        """
+        key = (method, json.dumps(params or []))
+        return cls.flights.do(key, lambda: cls.call(method, params))
+    
+    @classmethod
+    def call_batch(cls, calls: List[tuple]) -> List[tuple]:
+        """
+        Execute several (method, params) RPC commands concurrently and return
+        a (result, error) pair per call, in order. Over JSON-RPC each chunk
+        of calls is one batch request; otherwise emercoin-cli runs in parallel.
+        """
+        started = time.perf_counter()
+        results = cls.send_batch(calls)
+        RPC_LATENCY.observe(time.perf_counter() - started, 'batch')
+        for (method, _), (_, error) in zip(calls, results):
+            if error is not None:
+                RPC_ERRORS.inc(method, rpc_error_kind(error))
+        return results
+    
+    @classmethod
+    def send_batch(cls, calls: List[tuple]) -> List[tuple]:
+        """call_batch() without metrics"""
+        if cls.rpc_pool is not None:
+            chunks = [calls[i:i + EMC_RPC_BATCH_CHUNK] for i in range(0, len(calls), EMC_RPC_BATCH_CHUNK)]
+            try:
+                results = []
+                for chunk_results in rpc_executor.map(cls.rpc_pool.batch, chunks):
+                    results.extend(chunk_results)
+                return results
+            except RPCTransportError as e:
+                if not cli_fallback_allowed([method for method, _ in calls], e):
+                    return [(None, e)] * len(calls)
+                logger.warning(f"JSON-RPC batch failed, falling back to emercoin-cli: {e}")
+        
+        def run_one(call):
+            try:
+                return cls.call_cli(*call), None
+            except (RPCError, RPCTransportError) as e:
+                return None, e
+        
+        return list(rpc_executor.map(run_one, calls))
+    
+    @classmethod
+    def execute_rpc(cls, method: str, params: List = None, shared: bool = False) -> Optional[Dict]:
+        """Execute Emercoin RPC command (coalesced with identical in-flight calls if shared)"""
+        try:
+            return cls.call_shared(method, params) if shared else cls.call(method, params)
+        except RPCError as e:
+            logger.error(f"RPC error: {e}")
+            return None
+        except RPCTransportError as e:
+            logger.error(f"RPC transport error for method {method}: {e}")
+            return None
+        except Exception as e:
+            logger.error(f"Unexpected error: {e}")
+            return None
+    
     @staticmethod
-    def execute_rpc(method: str, params: List = None) -> Optional[Dict]:
-        """Execute Emercoin RPC command"""
+    def call_cli(method: str, params: List = None):
+        """Execute Emercoin RPC command through emercoin-cli"""
         try:
             cmd = [EMC_CLI_PATH, f"-datadir={EMC_DATADIR}", method]
             if params:
@@ -48,17 +260,17 @@ class EmercoinNVS:
             return None
             
         except subprocess.CalledProcessError as e:
-            logger.error(f"RPC error: {e.stderr.decode('utf-8')}")
-            return None
+            # emercoin-cli prints "error code: -4\nerror message:\n..." on stderr
+            stderr = e.stderr.decode('utf-8').strip()
+            match = re.search(r'error code: (-?\d+)', stderr)
+            message = stderr.split('error message:', 1)[-1].strip()
+            raise RPCError(int(match.group(1)) if match else 0, message or stderr)
         except subprocess.TimeoutExpired:
-            logger.error(f"RPC timeout for method {method}")
-            return None
+            raise RPCTimeout(f"RPC timeout for method {method}")
         except json.JSONDecodeError as e:
-            logger.error(f"JSON decode error: {e}")
-            return None
-        except Exception as e:
-            logger.error(f"Unexpected error: {e}")
-            return None
+            raise RPCTransportError(f"JSON decode error: {e}")
+        except OSError as e:
+            raise RPCTransportError(f"Cannot run {EMC_CLI_PATH}: {e}")
     
     @classmethod
     def name_show(cls, name: str) -> Optional[Dict]:
@@ -67,15 +279,70 @@ class EmercoinNVS:
         return result
     
     @classmethod
-    def name_filter(cls, prefix: str, max_results: int = 100) -> Optional[List[Dict]]:
-        """Filter NVS records by prefix"""
-        result = cls.execute_rpc("name_filter", [prefix, max_results])
+    def name_filter(cls, prefix: str, max_results: int = 100, offset: int = 0,
+                    max_age: int = ALL_BLOCKS) -> Optional[List[Dict]]:
+        """Filter NVS records by prefix (name_filter <regexp> <maxage> <from> <nb>)"""
+        result = cls.execute_rpc("name_filter", [f"^{prefix}", max_age, offset, max_results])
         return result
+    
+    @classmethod
+    def iter_name_filter(cls, prefix: str, after: str = "", page_size: int = 500,
+                         offset: int = 0) -> Iterator[Dict]:
+        """
+        Yield every NVS record with the prefix, one name_filter page at a
+        time, skipping names up to and including `after`. `offset` is where
+        `after` was last seen in the scan (a record's "_offset"), so a
+        cursor page does not re-read the namespace from the start. Raises
+        RPCError / RPCTransportError if a page cannot be read.
+        """
+        resuming = bool(after and offset)
+        while True:
+            page = cls.call("name_filter", [f"^{prefix}", ALL_BLOCKS, offset, page_size]) or []
+            if resuming and (not page or page[0].get('name', '') > after):
+                # Names before `after` were removed since the offset was
+                # handed out: back up until the page starts at or before it
+                offset = max(0, offset - page_size)
+                resuming = offset > 0
+                continue
+            resuming = False
+            for i, record in enumerate(page):
+                if record.get('name', '') > after:
+                    record['_offset'] = offset + i
+                    yield record
+            if len(page) < page_size:
+                return
+            offset += len(page)
 
 
 class ENUMResolver:
     """ENUM resolution logic"""
     
+    # NVS records by key, including short-lived "not found" entries
+    cache = LookupCache(
+        max_entries=LOOKUP_CACHE_SIZE,
+        max_ttl=LOOKUP_CACHE_MAX_TTL,
+        negative_ttl=LOOKUP_CACHE_NEGATIVE_TTL,
+        shared=SharedRecordTable(SHARED_CACHE_PATH, SHARED_CACHE_SLOTS, SHARED_CACHE_SLOT_SIZE)
+    )
+    
+    # Serialized /enum/lookup bodies and ETags, reused while the record is unchanged
+    responses = ResponseCache(max_entries=LOOKUP_CACHE_SIZE)
+    
+    # Local mirror of the enum: namespace, consulted before the node when fresh
+    index: Optional[ENUMIndex] = None
+    
+    # Registered numbers for longest-prefix resolution; None until built
+    trie: Optional[DigitTrie] = None
+    
+    # Background getinfo poller; None means /health queries the node itself
+    chain: Optional[ChainMonitor] = None
+    
+    # Queued name_new jobs; None means /enum/register submits synchronously
+    registrations: Optional[RegistrationQueue] = None
+    
+    # Record changes found by index syncs, pushed to /enum/changes subscribers
+    feed = ChangeFeed(history=FEED_HISTORY, max_subscribers=FEED_MAX_SUBSCRIBERS, heartbeat=FEED_HEARTBEAT)
+    
     @staticmethod
     def e164_to_enum(phone_number: str) -> str:
         """
@@ -92,54 +359,317 @@ class ENUMResolver:
         return enum_domain
     
     @staticmethod
-    def parse_naptr_record(naptr_value: str) -> List[Dict]:
+    def parse_naptr_record(naptr_value: str, aus: Optional[str] = None,
+                           service: Optional[str] = None) -> List[Dict]:
         """
-        Parse NAPTR record format
+        Parse NAPTR records in simplified or RFC 3403 form, sorted by order
+        and preference, keeping only those offering the service and applying
+        their substitution regexp to the AUS (E.164 number)
         Example: "!^.*$!sip:user@domain.com!"|"!^.*$!sip:backup@domain.com!"
+        Example: NAPTR 100 10 "u" "E2U+sip" "!^.*$!sip:user@domain.com!" .
         """
-        records = []
+        return resolve_naptr(naptr_value, aus, service)
+    
+    @staticmethod
+    def primary_uri(naptr_records: List[Dict]) -> Optional[str]:
+        """URI of the first E2U+sip record, else of the first record"""
+        for record in naptr_records:
+            if record['service'].lower() == 'e2u+sip':
+                return record['replacement']
+        return naptr_records[0]['replacement'] if naptr_records else None
+    
+    @classmethod
+    def cached_record(cls, nvs_key: str):
+        """NVS record from the lookup cache or the in-sync local index, else MISS"""
+        nvs_record = cls.cache.get(nvs_key)
+        if nvs_record is not MISS:
+            return nvs_record
         
-        # Split by pipe for multiple entries
-        entries = naptr_value.split('|')
+        if cls.index is not None and cls.index.is_fresh():
+            return cls.index.get(nvs_key)
         
-        for entry in entries:
-            entry = entry.strip().strip('"')
-            
-            # Parse NAPTR format: !pattern!replacement!flags
-            match = re.match(r'!([^!]*)!([^!]*)!([^!]*)?', entry)
-            if match:
-                pattern, replacement, flags = match.groups()
-                records.append({
-                    'pattern': pattern or '^.*$',
-                    'replacement': replacement,
-                    'flags': flags or 'u',
-                    'order': len(records),  # Priority based on order
-                    'preference': 10
-                })
+        return MISS
+    
+    @classmethod
+    def accept_reply(cls, nvs_key: str, nvs_record: Optional[Dict],
+                     error: Optional[Exception]) -> Optional[Dict]:
+        """
+        Cache a name_show reply. Only definitive "name not found" errors are
+        negatively cached; other RPC failures are logged and not cached.
+        """
+        if error is not None:
+            if not (isinstance(error, RPCError) and error.code == NAME_NOT_FOUND):
+                logger.error(f"name_show failed for {nvs_key}: {error}")
+                return None
+            nvs_record = None
+        
+        cls.cache.put(nvs_key, nvs_record)
+        return nvs_record
+    
+    @classmethod
+    def fetch_record(cls, nvs_key: str) -> Optional[Dict]:
+        """
+        Return the NVS record for a key from the lookup cache, the local
+        index (while it is in sync) or the node
+        """
+        nvs_record = cls.cached_record(nvs_key)
+        if nvs_record is not MISS:
+            return nvs_record
+        
+        try:
+            return cls.accept_reply(nvs_key, EmercoinNVS.call_shared("name_show", [nvs_key]), None)
+        except (RPCError, RPCTransportError) as e:
+            return cls.accept_reply(nvs_key, None, e)
+    
+    @classmethod
+    def fetch_records(cls, nvs_keys: List[str]) -> Dict[str, Optional[Dict]]:
+        """Fetch several NVS records, sending all cache misses to the node at once"""
+        records = {}
+        pending = []
+        for nvs_key in dict.fromkeys(nvs_keys):
+            nvs_record = cls.cached_record(nvs_key)
+            if nvs_record is MISS:
+                pending.append(nvs_key)
+            else:
+                records[nvs_key] = nvs_record
+        
+        if pending:
+            replies = EmercoinNVS.call_batch([("name_show", [nvs_key]) for nvs_key in pending])
+            for nvs_key, (nvs_record, error) in zip(pending, replies):
+                records[nvs_key] = cls.accept_reply(nvs_key, nvs_record, error)
         
         return records
     
     @classmethod
-    def resolve_enum(cls, phone_number: str) -> Optional[Dict]:
+    def invalidate(cls, *nvs_keys: str):
+        """Purge cached lookups for NVS keys that were just changed"""
+        cls.cache.invalidate(*nvs_keys)
+    
+    @classmethod
+    def start_index(cls, path: str, interval: float = ENUM_INDEX_SYNC_INTERVAL,
+                    snapshot: Optional[str] = None):
         """
-        Resolve phone number to SIP URI via Emercoin NVS
+        Open the local ENUM index and keep it synced in the background. A
+        snapshot newer than the index is loaded first, so a new node only
+        scans the blocks added since it was taken.
         """
-        # Convert to ENUM format
+        cls.index = ENUMIndex(path, prefix=ENUM_PREFIX)
+        if snapshot and os.path.exists(snapshot):
+            try:
+                if read_snapshot_header(snapshot)['height'] > (cls.index.height or -1):
+                    cls.index.load_snapshot(snapshot)
+            except (OSError, SnapshotError) as e:
+                logger.error(f"ENUM index snapshot {snapshot} not loaded: {e}")
+        cls.rebuild_trie(cls.index.iter_records())
+        cls.feed.resume(cls.index.get_meta(FEED_ID_META))
+        
+        def on_change(changed: Dict[str, str]):
+            # Record the ids about to be published first, so that a restart
+            # never hands out an id clients have already seen
+            cls.index.set_meta(FEED_ID_META, cls.feed.last_id + len(changed))
+            cls.cache.observe_height(cls.index.chain_height)
+            cls.invalidate(*changed)
+            for name in changed:
+                if cls.index.get(name) is not None:
+                    cls.trie.add_name(name)
+                else:
+                    cls.trie.remove_name(name)
+            cls.feed.publish(changed, cls.index.height, prefix=ENUM_PREFIX)
+        
+        cls.index.start(EmercoinNVS.call, interval=interval, on_change=on_change)
+    
+    @classmethod
+    def start_chain_monitor(cls, interval: float = CHAIN_POLL_INTERVAL):
+        """Poll chain state in the background and feed new block heights to the cache and index"""
+        cls.chain = ChainMonitor(EmercoinNVS.call, interval=interval)
+        
+        def on_height(height: int):
+            cls.cache.observe_height(height)
+            # The index is stale from the moment a block lands until it syncs
+            if cls.index is not None and (cls.index.chain_height or 0) < height:
+                cls.index.chain_height = height
+                cls.index.request_sync()
+            if cls.registrations is not None:
+                cls.registrations.request_check()
+        
+        cls.chain.add_listener(on_height)
+        cls.chain.start()
+    
+    @classmethod
+    def start_registrations(cls, path: str, rate: float = REGISTER_RATE,
+                            confirmations: int = REGISTER_CONFIRMATIONS,
+                            poll_interval: float = REGISTER_POLL_INTERVAL):
+        """Open the registration queue and submit / track its jobs in the background"""
+        cls.registrations = RegistrationQueue(path, rate=rate, confirmations=confirmations,
+                                              poll_interval=poll_interval)
+        
+        def on_confirm(job: Dict):
+            # The record is on chain: stop serving a cached "not found" for it
+            cls.invalidate(job['nvs_key'])
+            if cls.trie is not None:
+                cls.trie.add_name(job['nvs_key'])
+            if cls.index is not None:
+                cls.index.request_sync()
+        
+        cls.registrations.start(EmercoinNVS.call, on_confirm=on_confirm)
+    
+    @classmethod
+    def dns_responder(cls, max_ttl: int = DNS_MAX_TTL) -> 'enum_dns.DNSResponder':
+        """
+        DNS NAPTR responder answering from the lookup cache on its event
+        loop; misses are read from the index (SQLite) or the node on the
+        responder's thread pool
+        """
+        def fetch(nvs_key: str) -> Optional[Dict]:
+            if cls.index is not None and cls.index.is_fresh():
+                # Cached so repeat queries are answered on the event loop;
+                # index syncs invalidate changed keys
+                nvs_record = cls.index.get(nvs_key)
+                cls.cache.put(nvs_key, nvs_record)
+                return nvs_record
+            # Unlike fetch_record, failures other than "not found" are raised
+            # so the DNS client gets SERVFAIL instead of NXDOMAIN
+            try:
+                return cls.accept_reply(nvs_key, EmercoinNVS.call_shared("name_show", [nvs_key]), None)
+            except RPCError as e:
+                if e.code != NAME_NOT_FOUND:
+                    raise
+                return cls.accept_reply(nvs_key, None, e)
+        
+        return enum_dns.DNSResponder(
+            cached=cls.cache.get,
+            fetch=fetch,
+            miss=MISS,
+            prefix=ENUM_PREFIX,
+            max_ttl=max_ttl,
+            negative_ttl=int(cls.cache.negative_ttl),
+            block_seconds=cls.cache.block_seconds,
+            serial=lambda: cls.cache.height,
+            workers=DNS_WORKERS
+        )
+    
+    @classmethod
+    def start_dns(cls, host: str, port: int, max_ttl: int = DNS_MAX_TTL):
+        """Serve DNS NAPTR queries from a background event loop"""
+        enum_dns.start_thread(cls.dns_responder(max_ttl), host, port)
+    
+    @classmethod
+    def existing_record(cls, nvs_key: str) -> Optional[Dict]:
+        """
+        Current NVS record for a key from the in-sync index or the node,
+        bypassing the lookup cache; None if the name is not registered
+        """
+        if cls.index is not None and cls.index.is_fresh():
+            return cls.index.get(nvs_key)
+        try:
+            return EmercoinNVS.call("name_show", [nvs_key])
+        except RPCError as e:
+            if e.code == NAME_NOT_FOUND:
+                return None
+            raise
+    
+    @classmethod
+    def submit_registration(cls, nvs_key: str, value: str, days: int, phone_number: str) -> Dict:
+        """
+        Queue (or, without the queue, send) a name_new and return its import
+        outcome. Transport failures are raised so the row can be retried.
+        """
+        if cls.registrations is not None:
+            try:
+                job = cls.registrations.submit(nvs_key, value, days, phone_number)
+            except DuplicateJob as e:
+                return {'status': 'in_progress', 'job_id': e.job['id']}
+            return {'status': 'queued', 'job_id': job['id']}
+        
+        try:
+            result = EmercoinNVS.call("name_new", [nvs_key, value, days])
+        except RPCError as e:
+            return {'status': 'failed', 'error': str(e)}
+        cls.invalidate(nvs_key)
+        txid = result.get('txid', '') if isinstance(result, dict) else str(result)
+        return {'status': 'registered', 'txid': txid}
+    
+    @classmethod
+    def rebuild_trie(cls, records=None):
+        """
+        Rebuild the prefix trie from index or name_filter records (read from
+        the node when none are given) and swap it in
+        """
+        if records is None:
+            records = EmercoinNVS.iter_name_filter(ENUM_PREFIX)
+        trie = DigitTrie.build(records, prefix=ENUM_PREFIX)
+        cls.trie = trie
+        logger.info(f"Prefix trie: {trie.count} numbers, {trie.memory_bytes()} bytes")
+    
+    @classmethod
+    def target(cls, phone_number: str, longest_prefix: bool = False) -> tuple:
+        """
+        (enum_domain, nvs_key, matched_prefix) to resolve a number with. In
+        longest-prefix mode this is the longest registered prefix of the
+        number, falling back to the exact key when the trie has no match.
+        """
+        if longest_prefix and cls.trie is not None:
+            match = cls.trie.longest_prefix(re.sub(r'\D', '', phone_number))
+            if match is not None:
+                enum_domain = cls.e164_to_enum(match)
+                return enum_domain, f"{ENUM_PREFIX}{enum_domain}", '+' + match
+        
         enum_domain = cls.e164_to_enum(phone_number)
-        nvs_key = f"{ENUM_PREFIX}{enum_domain}"
+        return enum_domain, f"{ENUM_PREFIX}{enum_domain}", None
+    
+    @classmethod
+    def resolve_enum(cls, phone_number: str, longest_prefix: bool = False,
+                     service: Optional[str] = None) -> Optional[Dict]:
+        """
+        Resolve phone number to SIP URI via Emercoin NVS. With longest_prefix
+        the record of the longest registered prefix (e.g. a delegated
+        number block) answers for the number. service (e.g. "E2U+sip")
+        restricts the NAPTR records returned.
+        """
+        # Convert to ENUM format
+        enum_domain, nvs_key, matched_prefix = cls.target(phone_number, longest_prefix)
         
         logger.info(f"Resolving {phone_number} -> {nvs_key}")
         
-        # Query Emercoin NVS
-        nvs_record = EmercoinNVS.name_show(nvs_key)
+        return cls.build_result(phone_number, enum_domain, nvs_key, cls.fetch_record(nvs_key),
+                                matched_prefix, service)
+    
+    @classmethod
+    def resolve_many(cls, phone_numbers: List[str], longest_prefix: bool = False,
+                     service: Optional[str] = None) -> Dict[str, Optional[Dict]]:
+        """
+        Resolve several phone numbers; numbers that map to the same NVS key
+        are fetched once
+        """
+        targets = {
+            phone_number: cls.target(phone_number, longest_prefix)
+            for phone_number in phone_numbers
+        }
         
+        logger.info(f"Resolving batch of {len(targets)} numbers")
+        records = cls.fetch_records([nvs_key for _, nvs_key, _ in targets.values()])
+        
+        return {
+            phone_number: cls.build_result(phone_number, enum_domain, nvs_key, records.get(nvs_key),
+                                           matched_prefix, service)
+            for phone_number, (enum_domain, nvs_key, matched_prefix) in targets.items()
+        }
+    
+    @classmethod
+    def build_result(cls, phone_number: str, enum_domain: str, nvs_key: str,
+                     nvs_record: Optional[Dict], matched_prefix: Optional[str] = None,
+                     service: Optional[str] = None) -> Optional[Dict]:
+        """Turn an NVS record into a resolution result"""
         if not nvs_record:
             logger.warning(f"No NVS record found for {nvs_key}")
             return None
         
         # Parse NAPTR records
         naptr_value = nvs_record.get('value', '')
-        naptr_records = cls.parse_naptr_record(naptr_value)
+        aus = '+' + re.sub(r'\D', '', phone_number)
+        started = time.perf_counter()
+        naptr_records = cls.parse_naptr_record(naptr_value, aus, service)
+        NAPTR_PARSE.observe(time.perf_counter() - started)
         
         if not naptr_records:
             logger.warning(f"No valid NAPTR records in {naptr_value}")
@@ -151,30 +681,53 @@ class ENUMResolver:
             'naptr_records': naptr_records,
             'expires_in': nvs_record.get('expires_in', 0),
             'address': nvs_record.get('address', ''),
-            'nvs_key': nvs_key
+            'nvs_key': nvs_key,
+            'matched_prefix': matched_prefix
         }
 
 
 # API Endpoints
 
+@app.before_request
+def start_timer():
+    g.started = time.perf_counter()
+
+
+@app.after_request
+def record_request(response):
+    started = g.get('started')
+    if started is not None:
+        endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+        HTTP_LATENCY.observe(time.perf_counter() - started, endpoint, request.method)
+        HTTP_REQUESTS.inc(endpoint, request.method, str(response.status_code))
+    return response
+
+
+def json_response(body: Dict, status: int) -> tuple:
+    """jsonify a response body, recording serialization time per endpoint"""
+    started = time.perf_counter()
+    response = jsonify(body)
+    SERIALIZE.observe(time.perf_counter() - started, request.url_rule.rule)
+    return response, status
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus metrics"""
+    return Response(REGISTRY.render(), content_type=METRICS_CONTENT_TYPE)
+
+
 @app.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
     try:
-        # Test Emercoin connection
-        info = EmercoinNVS.execute_rpc("getinfo")
-        if info:
-            return jsonify({
-                'status': 'healthy',
-                'emercoin_connected': True,
-                'blocks': info.get('blocks', 0),
-                'version': info.get('version', 'unknown')
-            }), 200
+        chain = ENUMResolver.chain
+        if chain is not None and chain.is_running():
+            body, status = health_response(snapshot=chain.snapshot())
         else:
-            return jsonify({
-                'status': 'degraded',
-                'emercoin_connected': False
-            }), 503
+            # Test Emercoin connection
+            body, status = health_response(EmercoinNVS.execute_rpc("getinfo", shared=True))
+        return json_response(body, status)
     except Exception as e:
         return jsonify({
             'status': 'error',
@@ -182,32 +735,179 @@ def health_check():
         }), 500
 
 
+def health_response(info: Optional[Dict] = None, snapshot: Optional[Dict] = None) -> tuple:
+    """
+    Build the /health response body and status code from a getinfo reply
+    or a ChainMonitor snapshot
+    """
+    if snapshot is not None:
+        info = snapshot['info']
+    
+    if not info:
+        body = {
+            'status': 'degraded',
+            'emercoin_connected': False
+        }
+        if snapshot is not None:
+            body['error'] = snapshot['error']
+            body['snapshot_age'] = snapshot['age']
+        return body, 503
+    
+    ENUMResolver.cache.observe_height(info.get('blocks'))
+    body = {
+        'status': 'healthy',
+        'emercoin_connected': True,
+        'blocks': info.get('blocks', 0),
+        'version': info.get('version', 'unknown'),
+        'lookup_cache': ENUMResolver.cache.stats(),
+        'response_cache': ENUMResolver.responses.stats(),
+        'enum_index': ENUMResolver.index.stats() if ENUMResolver.index else None,
+        'prefix_trie': ENUMResolver.trie.stats() if ENUMResolver.trie else None,
+        'naptr_cache': naptr_cache_stats(),
+        'rpc_coalescing': EmercoinNVS.flights.stats(),
+        'registrations': ENUMResolver.registrations.counts() if ENUMResolver.registrations else None,
+        'change_feed': ENUMResolver.feed.stats()
+    }
+    if snapshot is not None:
+        body['snapshot_age'] = snapshot['age']
+    return body, 200
+
+
 @app.route('/enum/lookup', methods=['GET'])
 def enum_lookup():
     """
     ENUM lookup endpoint for Antisip
-    Query parameter: number (E.164 format, e.g., +1234567890)
+    Query parameters:
+        number: E.164 format, e.g., +1234567890
+        match: "exact" (default) or "prefix" for the longest registered prefix
+        service: optional ENUM service filter, e.g. E2U+sip or E2U+sms
     """
-    phone_number = request.args.get('number')
-    
-    if not phone_number:
+    try:
+        phone_number, longest_prefix, service = parse_lookup_args(request.args)
+    except ValueError as e:
         return jsonify({
-            'error': 'Missing required parameter: number'
+            'error': str(e)
         }), 400
     
     # Resolve ENUM
-    result = ENUMResolver.resolve_enum(phone_number)
+    target = ENUMResolver.target(phone_number, longest_prefix)
+    logger.info(f"Resolving {phone_number} -> {target[1]}")
+    data, status, etag = lookup_body(phone_number, longest_prefix, service, target,
+                                     ENUMResolver.fetch_record(target[1]), request.url_rule.rule)
+    if etag is None:
+        return Response(data, status, mimetype='application/json')
     
-    if not result:
+    headers = {'ETag': etag, 'Cache-Control': 'no-cache'}
+    if etag_matches(request.headers.get('If-None-Match'), etag):
+        return Response(status=304, headers=headers)
+    return Response(data, status, headers=headers, mimetype='application/json')
+
+
+@app.route('/enum/lookup/batch', methods=['POST'])
+def enum_lookup_batch():
+    """
+    Resolve several numbers in one request
+    Body: {
+        "numbers": ["+1234567890", "+1987654321"],
+        "match": "exact",  # optional, or "prefix"
+        "service": "E2U+sip"  # optional
+    }
+    Each entry of "results" is the body /enum/lookup returns for that number
+    """
+    try:
+        numbers, longest_prefix, service = parse_batch_body(request.get_json())
+    except ValueError as e:
         return jsonify({
+            'error': str(e)
+        }), 400
+    
+    resolved = ENUMResolver.resolve_many(numbers, longest_prefix=longest_prefix, service=service)
+    return json_response(batch_response(numbers, resolved), 200)
+
+
+def parse_lookup_args(args) -> tuple:
+    """(phone_number, longest_prefix, service) from /enum/lookup query args; ValueError if invalid"""
+    phone_number = args.get('number')
+    match = args.get('match', 'exact')
+    
+    if not phone_number:
+        raise ValueError('Missing required parameter: number')
+    if match not in ('exact', 'prefix'):
+        raise ValueError('Invalid match (expected exact or prefix)')
+    
+    return phone_number, match == 'prefix', args.get('service')
+
+
+def parse_batch_body(data) -> tuple:
+    """(numbers, longest_prefix, service) from a /enum/lookup/batch body; ValueError if invalid"""
+    data = data if isinstance(data, dict) else {}
+    numbers = data.get('numbers')
+    match = data.get('match', 'exact')
+    
+    if not isinstance(numbers, list) or not numbers or \
+            not all(isinstance(n, str) and n for n in numbers):
+        raise ValueError('Missing required field: numbers (non-empty list of strings)')
+    if match not in ('exact', 'prefix'):
+        raise ValueError('Invalid match (expected exact or prefix)')
+    
+    numbers = list(dict.fromkeys(numbers))
+    if len(numbers) > ENUM_BATCH_MAX:
+        raise ValueError(f'Too many numbers: {len(numbers)} (max {ENUM_BATCH_MAX})')
+    
+    return numbers, match == 'prefix', data.get('service')
+
+
+def batch_response(numbers: List[str], resolved: Dict[str, Optional[Dict]]) -> Dict:
+    """Build the /enum/lookup/batch response body"""
+    results = [lookup_response(number, resolved[number])[0] for number in numbers]
+    return {
+        'status': 'success',
+        'count': len(results),
+        'results': results
+    }
+
+
+def lookup_body(phone_number: str, longest_prefix: bool, service: Optional[str], target: tuple,
+                nvs_record: Optional[Dict], endpoint: str) -> tuple:
+    """
+    (body bytes, status, ETag) of /enum/lookup for a fetched record. Bodies of
+    found records are reused from ENUMResolver.responses until the record
+    changes; error bodies are serialized each time and have no ETag.
+    """
+    enum_domain, nvs_key, matched_prefix = target
+    key = (phone_number, longest_prefix, service)
+    version = None
+    if nvs_record:
+        # txid changes on every name_update; expires_in is part of the body
+        version = (nvs_key, nvs_record.get('txid') or nvs_record.get('value'),
+                   nvs_record.get('address'), nvs_record.get('expires_in'))
+        cached = ENUMResolver.responses.get(key, version)
+        if cached is not None:
+            return cached[0], 200, cached[1]
+    
+    result = ENUMResolver.build_result(phone_number, enum_domain, nvs_key, nvs_record,
+                                       matched_prefix, service)
+    body, status = lookup_response(phone_number, result)
+    started = time.perf_counter()
+    data = json.dumps(body).encode('utf-8')
+    SERIALIZE.observe(time.perf_counter() - started, endpoint)
+    if status != 200:
+        return data, status, None
+    return data, status, ENUMResolver.responses.put(key, version, data)
+
+
+def lookup_response(phone_number: str, result: Optional[Dict]) -> tuple:
+    """Build the /enum/lookup response body and status code for a resolution"""
+    if not result:
+        return {
             'status': 'not_found',
             'phone_number': phone_number
-        }), 404
+        }, 404
     
     # Extract primary SIP URI
-    primary_uri = result['naptr_records'][0]['replacement'] if result['naptr_records'] else None
+    primary_uri = ENUMResolver.primary_uri(result['naptr_records'])
     
-    return jsonify({
+    body = {
         'status': 'success',
         'phone_number': result['phone_number'],
         'sip_uri': primary_uri,
@@ -215,7 +915,79 @@ def enum_lookup():
         'enum_domain': result['enum_domain'],
         'expires_in': result['expires_in'],
         'owner_address': result['address']
-    }), 200
+    }
+    if result.get('matched_prefix'):
+        body['matched_prefix'] = result['matched_prefix']
+    return body, 200
+
+
+@app.route('/enum/changes', methods=['GET'])
+def enum_changes():
+    """
+    Server-Sent Events stream of enum: record changes seen in new blocks
+    Query parameters:
+        number: comma-separated E.164 numbers to watch (optional)
+        prefix: comma-separated number prefixes to watch (optional)
+        last_event_id: resume after this event id (or the Last-Event-ID header)
+    Events are "created", "updated", "deleted" and "expired" with data
+    {"id", "type", "number", "name", "height"}; "reset" means events were
+    missed and cached lookups should be dropped. Without number or prefix
+    every change is sent.
+    """
+    try:
+        change_filter, last_id = parse_changes_args(request.args, request.headers.get('Last-Event-ID'))
+    except ValueError as e:
+        return jsonify({
+            'error': str(e)
+        }), 400
+    
+    status = changes_unavailable()
+    if status is not None:
+        return jsonify(status[0]), status[1]
+    
+    feed = ENUMResolver.feed
+    
+    def generate():
+        try:
+            yield from feed.stream(change_filter, last_id)
+        finally:
+            feed.unsubscribe()
+    
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers=CHANGES_HEADERS)
+
+
+# Keep proxies from caching or buffering the event stream
+CHANGES_HEADERS = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+
+
+def parse_changes_args(args, last_event_id: Optional[str]) -> tuple:
+    """(ChangeFilter, last event id or None) from /enum/changes query args; ValueError if invalid"""
+    numbers = [n for n in (args.get('number') or '').split(',') if n.strip()]
+    prefixes = [p for p in (args.get('prefix') or '').split(',') if p.strip()]
+    for value in numbers + prefixes:
+        if not re.fullmatch(r'\s*\+?\d{1,15}\s*', value):
+            raise ValueError(f'Invalid number or prefix: {value}')
+    
+    last_event_id = args.get('last_event_id') or last_event_id
+    if last_event_id is not None:
+        try:
+            last_event_id = int(last_event_id)
+        except ValueError:
+            raise ValueError('Invalid last event id')
+    return ChangeFilter(numbers, prefixes), last_event_id
+
+
+def changes_unavailable() -> Optional[tuple]:
+    """
+    Take a /enum/changes subscriber slot; returns the (body, status) error
+    response if the feed cannot serve one
+    """
+    if ENUMResolver.index is None:
+        return {'error': 'The change feed needs the local ENUM index'}, 503
+    if not ENUMResolver.feed.subscribe():
+        return {'error': 'Too many change feed subscribers'}, 503
+    return None
 
 
 @app.route('/enum/register', methods=['POST'])
@@ -225,8 +997,11 @@ def enum_register():
     Body: {
         "phone_number": "+1234567890",
         "sip_uri": "sip:user@domain.com",
-        "fallback_uris": ["sip:backup@domain.com"]  # optional
+        "fallback_uris": ["sip:backup@domain.com"],  # optional
+        "days": 365  # optional
     }
+    With the registration queue enabled the request is queued and answered
+    with 202 and a job id; GET /enum/register/<job_id> reports its progress.
     """
     data = request.get_json()
     
@@ -238,31 +1013,40 @@ def enum_register():
     phone_number = data['phone_number']
     sip_uri = data['sip_uri']
     fallback_uris = data.get('fallback_uris', [])
+    days = data.get('days', DEFAULT_DAYS)
     
-    # Build NAPTR value
-    naptr_entries = [f'"!^.*$!{sip_uri}!"']
-    for uri in fallback_uris:
-        naptr_entries.append(f'"!^.*$!{uri}!"')
+    if not isinstance(days, int) or days <= 0:
+        return jsonify({
+            'error': 'days must be a positive integer'
+        }), 400
     
-    naptr_value = '|'.join(naptr_entries)
+    # Build NAPTR value
+    value = naptr_value(sip_uri, fallback_uris)
     
     # Generate NVS key
     enum_domain = ENUMResolver.e164_to_enum(phone_number)
     nvs_key = f"{ENUM_PREFIX}{enum_domain}"
     
-    logger.info(f"Registering {nvs_key} = {naptr_value}")
+    if ENUMResolver.registrations is not None:
+        return queue_registration(nvs_key, value, days, phone_number, enum_domain)
+    
+    logger.info(f"Registering {nvs_key} = {value}")
     
     # Register in NVS (requires wallet to be unlocked)
     try:
-        result = EmercoinNVS.execute_rpc("name_new", [nvs_key, naptr_value, 365])
+        result = EmercoinNVS.execute_rpc("name_new", [nvs_key, value, days])
         
         if result:
+            ENUMResolver.invalidate(nvs_key)
+            
+            # JSON-RPC returns the bare txid, older CLI output wraps it in an object
+            txid = result.get('txid', '') if isinstance(result, dict) else str(result)
             return jsonify({
                 'status': 'success',
                 'nvs_key': nvs_key,
                 'phone_number': phone_number,
                 'enum_domain': enum_domain,
-                'txid': result.get('txid', ''),
+                'txid': txid,
                 'message': 'ENUM record registered (requires confirmation)'
             }), 201
         else:
@@ -277,70 +1061,355 @@ def enum_register():
         }), 500
 
 
+def queue_registration(nvs_key: str, value: str, days: int, phone_number: str, enum_domain: str) -> tuple:
+    """Queue a name_new job and answer 202 (409 if the number already has one pending)"""
+    try:
+        job = ENUMResolver.registrations.submit(nvs_key, value, days, phone_number)
+    except DuplicateJob as e:
+        body = job_response(e.job)
+        body['error'] = 'A registration for this number is already in progress'
+        return jsonify(body), 409
+    except Exception as e:
+        logger.error(f"Registration queue error: {e}")
+        return jsonify({
+            'error': f'Registration failed: {str(e)}'
+        }), 500
+    
+    logger.info(f"Queued registration {job['id']}: {nvs_key} = {value}")
+    body = job_response(job)
+    body['enum_domain'] = enum_domain
+    body['message'] = 'ENUM registration queued'
+    response = jsonify(body)
+    response.headers['Location'] = body['status_url']
+    return response, 202
+
+
+@app.route('/enum/register/<job_id>', methods=['GET'])
+def enum_register_status(job_id):
+    """Progress of a queued registration"""
+    if ENUMResolver.registrations is None:
+        return jsonify({
+            'error': 'Registration queue is disabled'
+        }), 404
+    
+    job = ENUMResolver.registrations.get(job_id)
+    if job is None:
+        return jsonify({
+            'error': 'Registration job not found',
+            'job_id': job_id
+        }), 404
+    return jsonify(job_response(job)), 200
+
+
+def job_response(job: Dict) -> Dict:
+    """Public view of a registration job"""
+    return {
+        'job_id': job['id'],
+        'status': job['state'],
+        'nvs_key': job['nvs_key'],
+        'phone_number': job['phone_number'],
+        'txid': job['txid'],
+        'confirmations': job['confirmations'],
+        'attempts': job['attempts'],
+        'error': job['error'],
+        'created_at': job['created_at'],
+        'submitted_at': job['submitted_at'],
+        'confirmed_at': job['confirmed_at'],
+        'status_url': f"/enum/register/{job['id']}"
+    }
+
+
+@app.route('/enum/import', methods=['POST'])
+def enum_import():
+    """
+    Bulk register ENUM records
+    Body: CSV (phone_number,sip_uri,fallback_uris[,days]; fallbacks separated
+          by ';') or NDJSON with the same fields, per Content-Type
+          (text/csv or application/x-ndjson) or the format parameter
+    Query parameters:
+        days: registration period for rows without one (default 365)
+        dry_run: "true" to validate and compare without registering
+    Streams one NDJSON outcome per row (queued, registered, unchanged,
+    conflict, in_progress, duplicate, invalid, failed, error), then a
+    {"summary": ...} line with counts and throughput.
+    """
+    output = request.args.get('format')
+    if output is None:
+        output = 'ndjson' if 'ndjson' in (request.content_type or '') else 'csv'
+    days = request.args.get('days', DEFAULT_DAYS, type=int)
+    dry_run = request.args.get('dry_run', 'false').lower() in ('1', 'true', 'yes')
+    
+    if output not in ('csv', 'ndjson'):
+        return jsonify({
+            'error': 'Invalid format (expected csv or ndjson)'
+        }), 400
+    if days <= 0:
+        return jsonify({
+            'error': 'days must be a positive integer'
+        }), 400
+    
+    # Queued jobs are paced by the registration worker; direct name_new by
+    # the import itself
+    rate = 0.0 if ENUMResolver.registrations is not None else REGISTER_RATE
+    importer = bulk_importer(ENUM_IMPORT_CONCURRENCY, rate, days, dry_run=dry_run)
+    rows = read_rows(io.TextIOWrapper(request.stream, encoding='utf-8', newline=''), output)
+    
+    def generate():
+        for outcome in importer.run(rows):
+            yield json.dumps(outcome) + '\n'
+        summary = importer.summary()
+        logger.info(f"Bulk import: {summary}")
+        yield json.dumps({'summary': summary}) + '\n'
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+
+def bulk_importer(concurrency: int, rate: float, days: int = DEFAULT_DAYS,
+                  checkpoint: Optional[str] = None, dry_run: bool = False) -> BulkImporter:
+    """BulkImporter wired to the node, the index and the registration queue"""
+    return BulkImporter(
+        to_nvs_key=lambda phone: f"{ENUM_PREFIX}{ENUMResolver.e164_to_enum(phone)}",
+        lookup=ENUMResolver.existing_record,
+        submit=ENUMResolver.submit_registration,
+        concurrency=concurrency,
+        rate=rate,
+        days=days,
+        checkpoint=checkpoint,
+        dry_run=dry_run
+    )
+
+
 @app.route('/enum/list', methods=['GET'])
 def enum_list():
-    """List all ENUM records in NVS"""
-    try:
-        records = EmercoinNVS.name_filter(ENUM_PREFIX, 1000)
-        
-        if records is None:
-            return jsonify({
-                'error': 'Failed to query NVS'
-            }), 500
-        
-        # Parse records
-        parsed_records = []
-        for record in records:
-            name = record.get('name', '')
-            value = record.get('value', '')
-            
-            # Extract phone number from ENUM domain
-            enum_domain = name.replace(ENUM_PREFIX, '')
-            digits = enum_domain.replace('.e164.arpa', '').replace('.', '')
-            phone_number = '+' + digits[::-1]
-            
-            # Parse NAPTR
-            naptr_records = ENUMResolver.parse_naptr_record(value)
-            primary_uri = naptr_records[0]['replacement'] if naptr_records else None
-            
-            parsed_records.append({
-                'phone_number': phone_number,
-                'sip_uri': primary_uri,
-                'nvs_key': name,
-                'expires_in': record.get('expires_in', 0)
-            })
-        
+    """
+    List ENUM records in NVS, in NVS key order
+    Query parameters:
+        limit: records per page (default 1000)
+        cursor: next_cursor of the previous page (its last nvs_key, plus
+                "@<offset>" when read from the node)
+        format: "json" (default) or "ndjson" (one record per line; the
+                whole namespace unless limit is given)
+    The response is streamed; records are parsed as they are read.
+    """
+    cursor = request.args.get('cursor', '')
+    output = request.args.get('format', 'json')
+    limit = request.args.get('limit', type=int)
+    
+    if output not in ('json', 'ndjson'):
         return jsonify({
-            'status': 'success',
-            'count': len(parsed_records),
-            'records': parsed_records
-        }), 200
-        
+            'error': 'Invalid format (expected json or ndjson)'
+        }), 400
+    if output == 'json' and limit is None:
+        limit = ENUM_LIST_PAGE_SIZE
+    if limit is not None and not 0 < limit <= ENUM_LIST_MAX_PAGE:
+        return jsonify({
+            'error': f'Invalid limit (1-{ENUM_LIST_MAX_PAGE})'
+        }), 400
+    
+    after, offset = parse_list_cursor(cursor)
+    index = ENUMResolver.index
+    if index is not None and index.is_fresh():
+        records = index.iter_records(after=after, limit=limit)
+    else:
+        records = itertools.islice(EmercoinNVS.iter_name_filter(ENUM_PREFIX, after=after, offset=offset), limit)
+    
+    # Read the first record before streaming so node failures still get a 500
+    try:
+        first = next(records, None)
     except Exception as e:
         logger.error(f"List error: {e}")
         return jsonify({
-            'error': str(e)
+            'error': 'Failed to query NVS'
         }), 500
+    
+    records = itertools.chain([first], records) if first is not None else iter(())
+    
+    if output == 'ndjson':
+        return Response(stream_with_context(stream_ndjson(records)), mimetype='application/x-ndjson')
+    return Response(stream_with_context(stream_json_page(records, limit)), mimetype='application/json')
 
 
-if __name__ == '__main__':
-    import argparse
+def list_cursor(record: Dict) -> str:
+    """
+    /enum/list cursor after a record: its name, plus its name_filter offset
+    when it was read from the node
+    """
+    offset = record.get('_offset')
+    name = record.get('name', '')
+    return name if offset is None else f"{name}@{offset}"
+
+
+def parse_list_cursor(cursor: str) -> tuple:
+    """(name, name_filter offset) from an /enum/list cursor; offset 0 when it has none"""
+    name, _, offset = cursor.rpartition('@')
+    if name and offset.isdigit():
+        return name, int(offset)
+    return cursor, 0
+
+
+def list_entry(record: Dict) -> Dict:
+    """Build the /enum/list entry for an NVS record"""
+    name = record.get('name', '')
     
-    parser = argparse.ArgumentParser(description='ENUM Backend Server')
+    # Extract phone number from ENUM domain
+    enum_domain = name.replace(ENUM_PREFIX, '')
+    digits = enum_domain.replace('.e164.arpa', '').replace('.', '')
+    phone_number = '+' + digits[::-1]
+    
+    # Parse NAPTR
+    naptr_records = ENUMResolver.parse_naptr_record(record.get('value', ''), phone_number)
+    primary_uri = ENUMResolver.primary_uri(naptr_records)
+    
+    return {
+        'phone_number': phone_number,
+        'sip_uri': primary_uri,
+        'nvs_key': name,
+        'expires_in': record.get('expires_in', 0)
+    }
+
+
+def stream_ndjson(records: Iterator[Dict]) -> Iterator[str]:
+    """One JSON object per line; a failure mid-stream ends with an error line"""
+    try:
+        for record in records:
+            yield json.dumps(list_entry(record)) + '\n'
+    except Exception as e:
+        logger.error(f"List error: {e}")
+        yield json.dumps({'error': 'Failed to query NVS'}) + '\n'
+
+
+def stream_json_page(records: Iterator[Dict], limit: int) -> Iterator[str]:
+    """
+    One page as a JSON object, written record by record. next_cursor is
+    set when the page is full and more records may follow. A failure
+    mid-stream truncates the body, which clients see as invalid JSON.
+    """
+    yield '{"status": "success", "records": ['
+    count = 0
+    last_cursor = None
+    try:
+        for record in records:
+            entry = list_entry(record)
+            yield (',' if count else '') + json.dumps(entry)
+            count += 1
+            last_cursor = list_cursor(record)
+    except Exception as e:
+        logger.error(f"List error: {e}")
+        return
+    next_cursor = last_cursor if count == limit else None
+    yield f'], "count": {count}, "next_cursor": {json.dumps(next_cursor)}}}'
+
+
+def build_arg_parser(description: str = 'ENUM Backend Server') -> argparse.ArgumentParser:
+    """Command line options shared by the Flask and ASGI entry points"""
+    parser = argparse.ArgumentParser(description=description)
     parser.add_argument('--host', default='0.0.0.0', help='Host to bind to')
     parser.add_argument('--port', default=8080, type=int, help='Port to bind to')
     parser.add_argument('--debug', action='store_true', help='Enable debug mode')
     parser.add_argument('--emc-cli', default=EMC_CLI_PATH, help='Path to emercoin-cli')
     parser.add_argument('--emc-datadir', default=EMC_DATADIR, help='Emercoin data directory')
-    
-    args = parser.parse_args()
+    parser.add_argument('--emc-conf', help='Path to emercoin.conf for JSON-RPC (default: <datadir>/emercoin.conf)')
+    parser.add_argument('--rpc-pool-size', default=EMC_RPC_POOL_SIZE, type=int,
+                        help='Keep-alive JSON-RPC connections to emercoind')
+    parser.add_argument('--cli-only', action='store_true', help='Always use emercoin-cli instead of JSON-RPC')
+    parser.add_argument('--cache-size', default=LOOKUP_CACHE_SIZE, type=int, help='Max cached NVS lookups')
+    parser.add_argument('--cache-ttl', default=LOOKUP_CACHE_MAX_TTL, type=float,
+                        help='Max seconds a found record is cached')
+    parser.add_argument('--negative-ttl', default=LOOKUP_CACHE_NEGATIVE_TTL, type=float,
+                        help='Seconds a "not found" answer is cached')
+    parser.add_argument('--shared-cache', default=SHARED_CACHE_PATH,
+                        help='Memory-mapped lookup cache file shared by worker processes')
+    parser.add_argument('--shared-cache-slots', default=SHARED_CACHE_SLOTS, type=int,
+                        help='Record slots in a new shared cache file')
+    parser.add_argument('--no-shared-cache', action='store_true', help='Keep the lookup cache per process')
+    parser.add_argument('--index', default=ENUM_INDEX_PATH, help='SQLite file for the local ENUM index')
+    parser.add_argument('--index-sync-interval', default=ENUM_INDEX_SYNC_INTERVAL, type=float,
+                        help='Seconds between index syncs with the node')
+    parser.add_argument('--index-snapshot',
+                        help='Snapshot (enum_index.py export) to load at startup when newer than the index')
+    parser.add_argument('--no-index', action='store_true', help='Query the node for every lookup')
+    parser.add_argument('--chain-poll-interval', default=CHAIN_POLL_INTERVAL, type=float,
+                        help='Seconds between background getinfo polls for /health (0 = query per probe)')
+    parser.add_argument('--register-queue', default=REGISTER_QUEUE_PATH,
+                        help='SQLite file for queued registrations')
+    parser.add_argument('--register-rate', default=REGISTER_RATE, type=float,
+                        help='Max name_new submissions per second')
+    parser.add_argument('--register-confirmations', default=REGISTER_CONFIRMATIONS, type=int,
+                        help='Confirmations before a registration is reported confirmed')
+    parser.add_argument('--register-poll-interval', default=REGISTER_POLL_INTERVAL, type=float,
+                        help='Seconds between confirmation checks (new blocks also trigger one)')
+    parser.add_argument('--dns-port', default=0, type=int,
+                        help='Answer e164.arpa NAPTR queries over UDP/TCP on this port (0 = off)')
+    parser.add_argument('--dns-host', default='0.0.0.0', help='Address for the DNS responder')
+    parser.add_argument('--dns-max-ttl', default=DNS_MAX_TTL, type=int, help='Max TTL of DNS answers (seconds)')
+    parser.add_argument('--sync-register', action='store_true',
+                        help='Call name_new inside the /enum/register request instead of queueing')
+    return parser
+
+
+def configure(args: argparse.Namespace, start_dns: bool = True):
+    """
+    Apply command line options: RPC transport, lookup cache, index,
+    registration queue and (unless start_dns is False) the DNS responder
+    """
+    global EMC_CLI_PATH, EMC_DATADIR
     
     # Update configuration
     EMC_CLI_PATH = args.emc_cli
     EMC_DATADIR = args.emc_datadir
     
+    ENUMResolver.cache = LookupCache(
+        max_entries=args.cache_size,
+        max_ttl=args.cache_ttl,
+        negative_ttl=args.negative_ttl,
+        shared=None if args.no_shared_cache else SharedRecordTable(
+            args.shared_cache, args.shared_cache_slots, SHARED_CACHE_SLOT_SIZE
+        )
+    )
+    ENUMResolver.responses = ResponseCache(max_entries=args.cache_size)
+    
+    if not args.cli_only:
+        EmercoinNVS.configure_rpc(
+            args.emc_conf or os.path.join(EMC_DATADIR, 'emercoin.conf'),
+            pool_size=args.rpc_pool_size
+        )
+    
+    if args.chain_poll_interval > 0:
+        ENUMResolver.start_chain_monitor(args.chain_poll_interval)
+    
+    if not args.no_index:
+        os.makedirs(os.path.dirname(os.path.abspath(args.index)), exist_ok=True)
+        ENUMResolver.start_index(args.index, interval=args.index_sync_interval,
+                                 snapshot=args.index_snapshot)
+    else:
+        # Without the index the prefix trie is built once from name_filter
+        def build_trie():
+            try:
+                ENUMResolver.rebuild_trie()
+            except Exception as e:
+                logger.error(f"Prefix trie build failed: {e}")
+        
+        threading.Thread(target=build_trie, name="prefix-trie", daemon=True).start()
+    
+    if not args.sync_register:
+        os.makedirs(os.path.dirname(os.path.abspath(args.register_queue)), exist_ok=True)
+        ENUMResolver.start_registrations(
+            args.register_queue,
+            rate=args.register_rate,
+            confirmations=args.register_confirmations,
+            poll_interval=args.register_poll_interval
+        )
+    
+    if start_dns and args.dns_port:
+        ENUMResolver.start_dns(args.dns_host, args.dns_port, args.dns_max_ttl)
+    
     if args.debug:
         logger.setLevel(logging.DEBUG)
+
+
+if __name__ == '__main__':
+    args = build_arg_parser().parse_args()
+    configure(args)
     
     logger.info(f"Starting ENUM Backend Server on {args.host}:{args.port}")
     logger.info(f"Emercoin CLI: {EMC_CLI_PATH}")
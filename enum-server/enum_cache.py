@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+"""
+Lookup cache for the ENUM backend
+Bounded LRU of NVS records keyed by NVS name. Positive entries live until the
+record expires on chain (from expires_in / expires_at and the current block
+height), capped by a maximum TTL; "not found" answers are cached briefly so
+scans of unknown numbers do not all reach emercoind. With a shared table
+(enum_shm.SharedRecordTable) local misses are looked up in, and replies
+written to, a cache every worker process on the host can read.
+SingleFlight / AsyncSingleFlight coalesce concurrent misses for the same key
+into one backend call. ResponseCache keeps serialized response bodies with
+their ETags so unchanged records are not re-serialized.
+"""
+
+import asyncio
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Hashable, Optional
+
+from enum_shm import SharedRecordTable
+
+# Emercoin targets one block every 10 minutes
+EMC_BLOCK_SECONDS = 600
+
+# Returned by LookupCache.get when the key is not cached (None is a cached miss)
+MISS = object()
+
+
+class LookupCache:
+    """Thread-safe LRU cache of NVS records with expiry-aware TTLs"""
+
+    def __init__(self, max_entries: int = 10000, max_ttl: float = 600.0,
+                 negative_ttl: float = 30.0, block_seconds: int = EMC_BLOCK_SECONDS,
+                 shared: Optional[SharedRecordTable] = None):
+        self.max_entries = max_entries
+        self.max_ttl = max_ttl
+        self.negative_ttl = negative_ttl
+        self.block_seconds = block_seconds
+        self.shared = shared
+
+        self._lock = threading.Lock()
+        # key -> (record or None, deadline (monotonic), expiry height or None,
+        # shared table stamp or None)
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self.height: Optional[int] = None
+
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def observe_height(self, height: Optional[int]):
+        """Record the latest block height seen from the node"""
+        if height is not None and (self.height is None or height > self.height):
+            self.height = height
+
+    def _expired(self, deadline: float, expires_at: Optional[int], now: float) -> bool:
+        return now >= deadline or (expires_at is not None and self.height is not None
+                                   and self.height >= expires_at)
+
+    def get(self, key: str):
+        """Return the cached record, None for a cached "not found", or MISS"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                record, deadline, expires_at, stamp = entry
+                if self._expired(deadline, expires_at, now):
+                    del self._entries[key]
+                    self.expirations += 1
+                elif stamp is not None and not self.shared.is_current(stamp):
+                    # Replaced or invalidated by another worker
+                    del self._entries[key]
+                else:
+                    self._entries.move_to_end(key)
+                    if record is None:
+                        self.negative_hits += 1
+                    else:
+                        self.hits += 1
+                    return record
+
+        if self.shared is not None:
+            found = self.shared.get(key)
+            if found is not None:
+                record, shared_deadline, expires_at, stamp = found
+                deadline = now + min(self.max_ttl, shared_deadline - time.time())
+                if not self._expired(deadline, expires_at, now):
+                    self._store(key, (record, deadline, expires_at, stamp))
+                    with self._lock:
+                        if record is None:
+                            self.negative_hits += 1
+                        else:
+                            self.hits += 1
+                    return record
+
+        with self._lock:
+            self.misses += 1
+        return MISS
+
+    def put(self, key: str, record: Optional[Dict]):
+        """Cache an NVS record, or None for a name the node does not know"""
+        expires_at = None
+        if record is None:
+            ttl = self.negative_ttl
+        else:
+            expires_in = record.get('expires_in') or 0
+            if expires_in <= 0:
+                return
+            if 'expires_at' in record:
+                expires_at = record['expires_at']
+                # name_show reports both, which pins the node's current height
+                self.observe_height(expires_at - expires_in)
+            elif self.height is not None:
+                expires_at = self.height + expires_in
+            ttl = min(self.max_ttl, expires_in * self.block_seconds)
+
+        if ttl <= 0:
+            return
+
+        stamp = None
+        if self.shared is not None:
+            stamp = self.shared.put(key, record, time.time() + ttl, expires_at)
+        self._store(key, (record, time.monotonic() + ttl, expires_at, stamp))
+
+    def _store(self, key: str, entry: tuple):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, *keys: str):
+        """Drop the given keys, e.g. after a registration changes them"""
+        with self._lock:
+            for key in keys:
+                if self._entries.pop(key, None) is not None:
+                    self.invalidations += 1
+        if self.shared is not None:
+            for key in keys:
+                self.shared.invalidate(key)
+
+    def clear(self):
+        """Drop every local entry (the shared table is left alone)"""
+        with self._lock:
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        """Counters for monitoring"""
+        with self._lock:
+            size = len(self._entries)
+        lookups = self.hits + self.negative_hits + self.misses
+        return {
+            'size': size,
+            'max_entries': self.max_entries,
+            'hits': self.hits,
+            'negative_hits': self.negative_hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'invalidations': self.invalidations,
+            'hit_ratio': round((self.hits + self.negative_hits) / lookups, 4) if lookups else 0.0,
+            'block_height': self.height,
+            'shared': self.shared.stats() if self.shared is not None else None,
+        }
+
+
+class ResponseCache:
+    """
+    Bounded LRU of serialized response bodies and their strong ETags. Each
+    entry carries the version of the data it was built from; a lookup with
+    a different version misses and the entry is rebuilt in place.
+    """
+
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        # key -> (version, body, etag)
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, version: Hashable) -> Optional[tuple]:
+        """(body, etag) if cached for this version, else None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != version:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1], entry[2]
+
+    def put(self, key: Hashable, version: Hashable, body: bytes) -> str:
+        """Cache a body and return its ETag"""
+        etag = '"' + hashlib.blake2b(body, digest_size=12).hexdigest() + '"'
+        if self.max_entries <= 0:
+            return etag
+        with self._lock:
+            self._entries[key] = (version, body, etag)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return etag
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            size = len(self._entries)
+            body_bytes = sum(len(entry[1]) for entry in self._entries.values())
+        lookups = self.hits + self.misses
+        return {
+            'size': size,
+            'max_entries': self.max_entries,
+            'body_bytes': body_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """True if an If-None-Match header value matches the ETag (weak comparison)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    for candidate in if_none_match.split(','):
+        candidate = candidate.strip()
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+
+class _Flight:
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """
+    Runs at most one call per key at a time; threads asking for a key that
+    is already being fetched wait for that call and share its result or
+    exception
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights: Dict[Hashable, _Flight] = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    def do(self, key: Hashable, fn: Callable):
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                self.calls += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = fn()
+            return flight.result
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            in_flight = len(self._flights)
+        return {
+            'calls': self.calls,
+            'coalesced': self.coalesced,
+            'in_flight': in_flight,
+        }
+
+
+class AsyncSingleFlight:
+    """
+    SingleFlight for coroutines on one event loop. The shared call runs as
+    its own task, so a caller that is cancelled does not cancel it for the
+    others.
+    """
+
+    def __init__(self):
+        self._flights: Dict[Hashable, asyncio.Future] = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable]):
+        task = self._flights.get(key)
+        if task is None:
+            task = self._flights[key] = asyncio.ensure_future(fn())
+            task.add_done_callback(lambda _: self._flights.pop(key, None))
+            self.calls += 1
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def stats(self) -> Dict:
+        return {
+            'calls': self.calls,
+            'coalesced': self.coalesced,
+            'in_flight': len(self._flights),
+        }
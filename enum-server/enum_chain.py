@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Chain state poller for the ENUM backend
+Polls getinfo on a fixed interval from a background thread and keeps the
+latest snapshot (block height, node version, reachability), so /health
+probes do not each cost an RPC call. Listeners are told about new block
+heights for cache and index invalidation.
+"""
+
+import logging
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# rpc(method, params) -> result, raising on failure (EmercoinNVS.call)
+RPCCall = Callable[[str, List], object]
+
+
+class ChainMonitor:
+    """Latest getinfo snapshot, refreshed every `interval` seconds"""
+
+    def __init__(self, rpc: RPCCall, interval: float = 5.0):
+        self.rpc = rpc
+        self.interval = interval
+
+        self._lock = threading.Lock()
+        self._info: Optional[Dict] = None
+        self._error: Optional[str] = None
+        self._checked_at: Optional[float] = None
+        self._listeners: List[Callable[[int], None]] = []
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        self.height: Optional[int] = None
+        self.polls = 0
+        self.failures = 0
+
+    def add_listener(self, listener: Callable[[int], None]):
+        """Call listener(height) whenever a higher block height is seen"""
+        self._listeners.append(listener)
+
+    def poll(self):
+        """Refresh the snapshot from the node once"""
+        try:
+            info = self.rpc("getinfo", [])
+            error = None
+        except Exception as e:
+            info = None
+            error = str(e)
+
+        with self._lock:
+            self.polls += 1
+            self._checked_at = time.monotonic()
+            if info:
+                self._info = info
+                self._error = None
+            else:
+                self.failures += 1
+                self._error = error or "empty getinfo reply"
+
+        if not info:
+            logger.warning(f"Chain poll failed: {error}")
+            return
+
+        height = info.get('blocks')
+        if height is not None and (self.height is None or height > self.height):
+            self.height = height
+            for listener in self._listeners:
+                try:
+                    listener(height)
+                except Exception as e:
+                    logger.error(f"Block height listener failed: {e}")
+
+    def snapshot(self) -> Dict:
+        """
+        The last successful getinfo reply (None while the node is
+        unreachable), the last error, the snapshot age in seconds and poll
+        counters
+        """
+        with self._lock:
+            checked_at = self._checked_at
+            return {
+                'info': self._info if self._error is None else None,
+                'error': self._error,
+                'age': round(time.monotonic() - checked_at, 3) if checked_at is not None else None,
+                'polls': self.polls,
+                'failures': self.failures,
+            }
+
+    def is_running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """Poll from a background thread; the first poll happens before returning"""
+        self.poll()
+
+        def run():
+            while not self._stop.wait(self.interval):
+                self.poll()
+
+        self._thread = threading.Thread(target=run, name="chain-monitor", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
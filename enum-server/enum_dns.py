@@ -0,0 +1,399 @@
+#!/usr/bin/env python3
+"""
+DNS NAPTR responder for e164.arpa
+Answers ENUM queries from SIP proxies (Kamailio, Asterisk, ...) over UDP and
+TCP straight from NVS records, so call setup needs no HTTP round trip.
+Records come from the backend's lookup cache on the event loop; misses
+are resolved from the index or the node on a small thread pool. Answer TTLs follow the record's
+remaining lifetime (expires_in), capped by max_ttl; unknown numbers get
+NXDOMAIN with an SOA carrying the negative TTL.
+
+Standalone (DNS only, same backend options):
+
+    python3 enum_dns.py --dns-port 5353 --emc-conf /home/pi/.emercoin/emercoin.conf
+"""
+
+import asyncio
+import logging
+import re
+import struct
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Callable, Dict, Optional, Tuple
+
+from enum_naptr import compile_naptr
+from enum_metrics import DNS_QUERIES
+
+logger = logging.getLogger(__name__)
+
+ZONE = "e164.arpa"
+
+TYPE_SOA = 6
+TYPE_NAPTR = 35
+TYPE_OPT = 41
+TYPE_ANY = 255
+CLASS_IN = 1
+
+NOERROR, FORMERR, SERVFAIL, NXDOMAIN, NOTIMP, REFUSED = 0, 1, 2, 3, 4, 5
+RCODE_NAMES = {NOERROR: 'NOERROR', FORMERR: 'FORMERR', SERVFAIL: 'SERVFAIL',
+               NXDOMAIN: 'NXDOMAIN', NOTIMP: 'NOTIMP', REFUSED: 'REFUSED'}
+
+# Payload size advertised in our OPT record and the cap for clients' sizes
+EDNS_PAYLOAD = 1232
+CLASSIC_PAYLOAD = 512
+
+_HEADER = struct.Struct('!6H')
+_RR = struct.Struct('!HHIH')
+# Answer name is a pointer to the question name at offset 12
+_QNAME_POINTER = b'\xc0\x0c'
+_OPT_RR = b'\x00' + struct.pack('!HHIH', TYPE_OPT, EDNS_PAYLOAD, 0, 0)
+
+
+class FormatError(ValueError):
+    """A query could not be parsed"""
+
+
+def encode_name(name: str) -> bytes:
+    """Uncompressed wire form of a domain name"""
+    out = bytearray()
+    for label in name.strip('.').split('.'):
+        if label:
+            data = label.encode('ascii')
+            out.append(len(data))
+            out += data
+    out.append(0)
+    return bytes(out)
+
+
+def _char_string(value: str) -> bytes:
+    data = value.encode('utf-8')[:255]
+    return bytes((len(data),)) + data
+
+
+@lru_cache(maxsize=4096)
+def naptr_rdata(value: str) -> Tuple[bytes, ...]:
+    """NAPTR RDATA for each rule of an NVS value, in order/preference order"""
+    rdatas = []
+    for rule in compile_naptr(value):
+        replacement = '.' if rule.regexp else rule.replacement
+        rdatas.append(
+            struct.pack('!HH', rule.order, rule.preference)
+            + _char_string(rule.flags)
+            + _char_string(rule.services)
+            + _char_string(rule.regexp or '')
+            + encode_name(replacement or '.')
+        )
+    return tuple(rdatas)
+
+
+@lru_cache(maxsize=65536)
+def parse_question(body: bytes, arcount: int) -> Tuple:
+    """
+    (question bytes, lowercase name, qtype, qclass, edns, payload size) from
+    the bytes after the header; cached because resolvers repeat questions
+    """
+    labels = []
+    offset = 0
+    while True:
+        if offset >= len(body):
+            raise FormatError("truncated name")
+        length = body[offset]
+        if length == 0:
+            offset += 1
+            break
+        if length & 0xC0:
+            raise FormatError("compressed question name")
+        labels.append(body[offset + 1:offset + 1 + length])
+        offset += 1 + length
+    if offset + 4 > len(body):
+        raise FormatError("truncated question")
+    qtype, qclass = struct.unpack_from('!HH', body, offset)
+    offset += 4
+    name = b'.'.join(labels).decode('ascii', 'replace').lower()
+
+    # EDNS: an OPT record (root name) in the additional section
+    payload = CLASSIC_PAYLOAD
+    edns = bool(arcount) and body[offset:offset + 3] == b'\x00\x00\x29'
+    if edns:
+        size = struct.unpack_from('!H', body, offset + 3)[0]
+        payload = max(CLASSIC_PAYLOAD, min(size, EDNS_PAYLOAD))
+    return body[:offset], name, qtype, qclass, edns, payload
+
+
+class Query:
+    """The parts of a DNS query needed to answer it"""
+
+    __slots__ = ('id', 'flags', 'name', 'qtype', 'qclass', 'question', 'payload', 'edns')
+
+    def __init__(self, data: bytes):
+        if len(data) < 12:
+            raise FormatError("short header")
+        self.id, self.flags, qdcount, _, _, arcount = _HEADER.unpack_from(data)
+        if qdcount != 1:
+            raise FormatError(f"{qdcount} questions")
+        (self.question, self.name, self.qtype, self.qclass,
+         self.edns, self.payload) = parse_question(data[12:], arcount)
+
+
+class DNSResponder:
+    """
+    Builds answers for e164.arpa NAPTR queries.
+    `cached(nvs_key)` returns the record, None (known missing) or `miss`
+    without blocking; `fetch(nvs_key)` blocks on the node and returns the
+    record or None, raising if the node could not be asked.
+    """
+
+    def __init__(self, cached: Callable[[str], object], fetch: Callable[[str], Optional[Dict]],
+                 miss: object, prefix: str = "enum:", zone: str = ZONE,
+                 max_ttl: int = 300, negative_ttl: int = 30, block_seconds: int = 600,
+                 serial: Callable[[], Optional[int]] = lambda: None,
+                 workers: int = 16, max_pending: int = 1024, max_replies: int = 65536):
+        self.cached = cached
+        self.fetch = fetch
+        self.miss = miss
+        self.prefix = prefix
+        self.zone = zone.lower().strip('.')
+        self.suffix = '.' + self.zone
+        self.max_ttl = max_ttl
+        self.negative_ttl = negative_ttl
+        self.block_seconds = block_seconds
+        self.serial = serial
+        self.max_pending = max_pending
+        self.pending = 0
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='dns')
+        self._zone_wire = encode_name(self.zone)
+        # One digit per label, e.g. 1.0.0.0.5.5.5.5.1.4.1.e164.arpa
+        self._number_name = re.compile(r'(?:[0-9]\.)+' + re.escape(self.zone) + r'$')
+        # (query minus ID, UDP) -> (nvs_key, record, reply minus ID): replayed
+        # while the lookup cache still returns the same record object
+        self._replies: Dict[Tuple[bytes, bool], Tuple] = {}
+        self.max_replies = max_replies
+
+    # Wire format
+
+    def _soa(self) -> bytes:
+        rdata = (encode_name('ns.' + self.zone) + encode_name('hostmaster.' + self.zone)
+                 + struct.pack('!5I', (self.serial() or 1) & 0xFFFFFFFF, 3600, 600, 86400,
+                               self.negative_ttl))
+        return self._zone_wire + _RR.pack(TYPE_SOA, CLASS_IN, self.negative_ttl, len(rdata)) + rdata
+
+    def build(self, query: Query, rcode: int, answers: Tuple[bytes, ...] = (), ttl: int = 0,
+              soa: bool = False, limit: Optional[int] = None) -> bytes:
+        """Response packet; answers are RDATAs of NAPTR records for the query name"""
+        # QR, opcode and RD from the query, AA
+        flags = 0x8400 | (query.flags & 0x7900) | rcode
+        records = [_QNAME_POINTER + _RR.pack(TYPE_NAPTR, CLASS_IN, ttl, len(rdata)) + rdata
+                   for rdata in answers]
+        authority = [self._soa()] if soa else []
+        additional = [_OPT_RR] if query.edns else []
+        packet = b''.join([
+            _HEADER.pack(query.id, flags, 1, len(records), len(authority), len(additional)),
+            query.question, *records, *authority, *additional,
+        ])
+        if limit is not None and len(packet) > limit:
+            # Does not fit: empty truncated answer, the client retries over TCP
+            packet = b''.join([_HEADER.pack(query.id, flags | 0x0200, 1, 0, 0, len(additional)),
+                               query.question, *additional])
+        return packet
+
+    def error(self, data: bytes, rcode: int) -> Optional[bytes]:
+        """Header-only error reply for a query that could not be parsed"""
+        if len(data) < 12:
+            return None
+        query_id, flags = struct.unpack_from('!HH', data)
+        if flags & 0x8000:
+            return None
+        return _HEADER.pack(query_id, 0x8000 | (flags & 0x7900) | rcode, 0, 0, 0, 0)
+
+    def ttl(self, record: Dict) -> int:
+        expires_in = record.get('expires_in')
+        if not expires_in:
+            return self.max_ttl
+        return max(0, min(self.max_ttl, int(expires_in) * self.block_seconds))
+
+    def answer(self, query: Query, record: Optional[Dict], limit: Optional[int]) -> bytes:
+        if record is None:
+            return self.build(query, NXDOMAIN, soa=True, limit=limit)
+        rdatas = naptr_rdata(record.get('value', ''))
+        if query.qtype not in (TYPE_NAPTR, TYPE_ANY) or not rdatas:
+            # Name exists but has nothing of this type (NODATA)
+            return self.build(query, NOERROR, soa=True, limit=limit)
+        return self.build(query, NOERROR, rdatas, self.ttl(record), limit=limit)
+
+    # Resolution
+
+    def resolve(self, data: bytes, limit: bool) -> Tuple[Optional[bytes], Optional[Tuple]]:
+        """
+        Answer a query without blocking: (reply, None), or (None, (query,
+        nvs_key)) when the record has to be fetched from the node first.
+        `limit` applies the UDP payload size.
+        """
+        replay = self._replies.get((data[2:], limit))
+        if replay is not None:
+            nvs_key, record, reply = replay
+            if self.cached(nvs_key) is record:
+                return data[:2] + reply, None
+
+        try:
+            query = Query(data)
+        except FormatError:
+            return self.error(data, FORMERR), None
+
+        size = query.payload if limit else None
+        if query.flags & 0x8000:
+            # A response, not a query: never answer (no reflection loops)
+            return None, None
+        if query.flags & 0x7800:
+            return self.build(query, NOTIMP, limit=size), None
+        name = query.name
+        if query.qclass != CLASS_IN or not (name.endswith(self.suffix) or name == self.zone):
+            return self.build(query, REFUSED, limit=size), None
+        if name == self.zone:
+            if query.qtype in (TYPE_SOA, TYPE_ANY):
+                return self._apex_soa(query), None
+            return self.build(query, NOERROR, soa=True, limit=size), None
+
+        if not self._number_name.match(name):
+            return self.build(query, NXDOMAIN, soa=True, limit=size), None
+
+        nvs_key = self.prefix + name
+        record = self.cached(nvs_key)
+        if record is self.miss:
+            return None, (query, nvs_key)
+        reply = self.answer(query, record, size)
+        self.remember(data, limit, nvs_key, record, reply)
+        return reply, None
+
+    def remember(self, data: bytes, limit: bool, nvs_key: str, record: Optional[Dict], reply: bytes):
+        if len(self._replies) >= self.max_replies:
+            self._replies.clear()
+        self._replies[(data[2:], limit)] = (nvs_key, record, reply[2:])
+
+    def _apex_soa(self, query: Query) -> bytes:
+        """SOA of the zone itself in the answer section"""
+        soa = self._soa()
+        flags = 0x8400 | (query.flags & 0x7900)
+        additional = [_OPT_RR] if query.edns else []
+        return b''.join([_HEADER.pack(query.id, flags, 1, 1, 0, len(additional)),
+                         query.question, _QNAME_POINTER, soa[len(self._zone_wire):], *additional])
+
+    async def resolve_remote(self, query: Query, nvs_key: str, limit: bool) -> bytes:
+        """Fetch a record that was not cached, then answer"""
+        size = query.payload if limit else None
+        if self.pending >= self.max_pending:
+            return self.build(query, SERVFAIL, limit=size)
+        self.pending += 1
+        try:
+            record = await asyncio.get_running_loop().run_in_executor(self.executor, self.fetch, nvs_key)
+        except Exception as e:
+            logger.warning(f"DNS lookup of {nvs_key} failed: {e}")
+            return self.build(query, SERVFAIL, limit=size)
+        finally:
+            self.pending -= 1
+        return self.answer(query, record, size)
+
+    async def handle(self, data: bytes, limit: bool) -> Optional[bytes]:
+        reply, pending = self.resolve(data, limit)
+        if pending is not None:
+            reply = await self.resolve_remote(*pending, limit)
+        return reply
+
+
+def _rcode(reply: bytes) -> str:
+    return RCODE_NAMES.get(reply[3] & 0x0F, 'OTHER') if len(reply) >= 4 else 'OTHER'
+
+
+class UDPProtocol(asyncio.DatagramProtocol):
+    def __init__(self, responder: DNSResponder):
+        self.responder = responder
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        reply, pending = self.responder.resolve(data, limit=True)
+        if pending is None:
+            if reply is not None:
+                self.transport.sendto(reply, addr)
+                DNS_QUERIES.inc('udp', _rcode(reply))
+            return
+        asyncio.ensure_future(self._reply_later(pending, addr))
+
+    async def _reply_later(self, pending: Tuple, addr):
+        reply = await self.responder.resolve_remote(*pending, limit=True)
+        self.transport.sendto(reply, addr)
+        DNS_QUERIES.inc('udp', _rcode(reply))
+
+
+async def serve(responder: DNSResponder, host: str, port: int, tcp_idle: float = 10.0):
+    """Start UDP and TCP listeners on the running loop; returns (udp transport, tcp server)"""
+    loop = asyncio.get_running_loop()
+    udp, _ = await loop.create_datagram_endpoint(lambda: UDPProtocol(responder), local_addr=(host, port))
+
+    async def tcp_client(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                header = await asyncio.wait_for(reader.readexactly(2), tcp_idle)
+                data = await reader.readexactly(struct.unpack('!H', header)[0])
+                reply = await responder.handle(data, limit=False)
+                if reply is None:
+                    break
+                writer.write(struct.pack('!H', len(reply)) + reply)
+                DNS_QUERIES.inc('tcp', _rcode(reply))
+                await writer.drain()
+        except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    tcp = await asyncio.start_server(tcp_client, host, port)
+    logger.info(f"DNS NAPTR responder for {responder.zone} on {host}:{port} (UDP/TCP)")
+    return udp, tcp
+
+
+def start_thread(responder: DNSResponder, host: str, port: int) -> threading.Thread:
+    """Run the listeners on their own event loop in a daemon thread"""
+    started = threading.Event()
+    errors = []
+
+    def run():
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        try:
+            loop.run_until_complete(serve(responder, host, port))
+        except Exception as e:
+            errors.append(e)
+            started.set()
+            return
+        started.set()
+        loop.run_forever()
+
+    thread = threading.Thread(target=run, name="dns-responder", daemon=True)
+    thread.start()
+    started.wait()
+    if errors:
+        raise errors[0]
+    return thread
+
+
+def main():
+    # Imported here so the backend can import this module without a cycle
+    from enum_backend import ENUMResolver, build_arg_parser, configure
+
+    parser = build_arg_parser('ENUM DNS NAPTR responder')
+    args = parser.parse_args()
+    if not args.dns_port:
+        parser.error('--dns-port is required')
+    configure(args, start_dns=False)
+
+    async def run():
+        await serve(ENUMResolver.dns_responder(), args.dns_host, args.dns_port)
+        await asyncio.Event().wait()
+
+    asyncio.run(run())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+Change feed of ENUM records
+Each index sync that finds created, updated, deleted or expired enum: names
+publishes one event per name. Subscribers of /enum/changes receive them as
+Server-Sent Events, filtered to the numbers and prefixes they asked for, so
+downstream caches can keep entries until told they changed instead of
+re-polling /enum/lookup.
+
+Event ids increase across restarts: a run continues after the last id
+handed out before (see resume) or from the wall clock in milliseconds,
+whichever is later. A client that reconnects with Last-Event-ID gets the
+events it missed, or a "reset" event if they are no longer held and it
+should drop everything it cached.
+"""
+
+import asyncio
+import itertools
+import json
+import re
+import threading
+import time
+from collections import deque
+from typing import AsyncIterator, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from enum_trie import name_to_digits
+
+# Tells EventSource clients how long to wait before reconnecting (ms)
+RETRY_MS = 5000
+
+
+class ChangeFilter:
+    """Matches events for a set of numbers and number prefixes; empty matches all"""
+
+    def __init__(self, numbers: Iterable[str] = (), prefixes: Iterable[str] = ()):
+        self.numbers = {re.sub(r'\D', '', n) for n in numbers}
+        self.prefixes = tuple(re.sub(r'\D', '', p) for p in prefixes)
+
+    def matches(self, event: Dict) -> bool:
+        if not self.numbers and not self.prefixes:
+            return True
+        digits = event['number'][1:]
+        return digits in self.numbers or digits.startswith(self.prefixes)
+
+
+def format_event(event: Dict) -> str:
+    """One SSE message"""
+    return f"id: {event['id']}\nevent: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+
+class ChangeFeed:
+    """Bounded history of record changes, and the subscribers waiting on it"""
+
+    def __init__(self, history: int = 10000, max_subscribers: int = 100, heartbeat: float = 15.0):
+        self.max_subscribers = max_subscribers
+        self.heartbeat = heartbeat
+
+        self._cond = threading.Condition()
+        self._events: deque = deque(maxlen=history)
+        # Millisecond start so ids of this run follow those of earlier runs
+        self.last_id = int(time.time() * 1000)
+        self.subscribers = 0
+        self.published = 0
+        # (loop, asyncio.Event) of subscribers on an event loop
+        self._async_waiters = set()
+
+    def resume(self, last_id: Optional[int]):
+        """Continue after an id issued by an earlier run (None: none recorded)"""
+        with self._cond:
+            self.last_id = max(self.last_id, last_id or 0)
+
+    def publish(self, changes: Dict[str, str], height: Optional[int], prefix: str = "enum:"):
+        """Add an event per changed NVS name ({name: kind} from ENUMIndex.sync)"""
+        with self._cond:
+            for name, kind in changes.items():
+                digits = name_to_digits(name, prefix)
+                if digits is None:
+                    continue
+                self.last_id += 1
+                self._events.append({
+                    'id': self.last_id,
+                    'type': kind,
+                    'number': '+' + digits,
+                    'name': name,
+                    'height': height,
+                })
+                self.published += 1
+            self._cond.notify_all()
+            waiters = list(self._async_waiters)
+        for loop, event in waiters:
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                # Loop already closed
+                pass
+
+    def since(self, last_id: int) -> Tuple[List[Dict], bool]:
+        """Events after last_id, and whether some of them are no longer held"""
+        with self._cond:
+            if last_id > self.last_id:
+                # An id from the future: the client talked to another node
+                return [], True
+            if not self._events:
+                return [], False
+            oldest = self._events[0]['id']
+            start = max(0, last_id - oldest + 1)
+            return list(itertools.islice(self._events, start, None)), last_id < oldest - 1
+
+    def subscribe(self) -> bool:
+        """Take a subscriber slot; False if all are in use"""
+        with self._cond:
+            if self.subscribers >= self.max_subscribers:
+                return False
+            self.subscribers += 1
+            return True
+
+    def unsubscribe(self):
+        with self._cond:
+            self.subscribers -= 1
+
+    def _wait(self, last_id: int) -> Tuple[List[Dict], bool]:
+        with self._cond:
+            self._cond.wait_for(lambda: self.last_id != last_id, self.heartbeat)
+        return self.since(last_id)
+
+    async def _wait_async(self, last_id: int) -> Tuple[List[Dict], bool]:
+        waiter = (asyncio.get_running_loop(), asyncio.Event())
+        with self._cond:
+            if self.last_id != last_id:
+                waiter[1].set()
+            self._async_waiters.add(waiter)
+        try:
+            await asyncio.wait_for(waiter[1].wait(), self.heartbeat)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            with self._cond:
+                self._async_waiters.discard(waiter)
+        return self.since(last_id)
+
+    def _chunk(self, events: List[Dict], gap: bool, last_id: int,
+               change_filter: ChangeFilter) -> Tuple[str, int]:
+        """SSE text for one wake-up and the id to continue from"""
+        parts = []
+        if gap:
+            last_id = events[0]['id'] - 1 if events else self.last_id
+            parts.append(f"id: {last_id}\nevent: reset\ndata: {json.dumps({'id': last_id})}\n\n")
+        if events:
+            last_id = events[-1]['id']
+            parts.extend(format_event(e) for e in events if change_filter.matches(e))
+        # A comment line keeps proxies from timing the connection out
+        return ''.join(parts) or ': keep-alive\n\n', last_id
+
+    def stream(self, change_filter: ChangeFilter, last_id: Optional[int] = None) -> Iterator[str]:
+        """SSE text for a subscriber, blocking between events (for WSGI)"""
+        if last_id is None:
+            last_id = self.last_id
+        yield f"retry: {RETRY_MS}\n\n"
+        while True:
+            if last_id != self.last_id:
+                events, gap = self.since(last_id)
+            else:
+                events, gap = self._wait(last_id)
+            text, last_id = self._chunk(events, gap, last_id, change_filter)
+            yield text
+
+    async def stream_async(self, change_filter: ChangeFilter,
+                           last_id: Optional[int] = None) -> AsyncIterator[str]:
+        """SSE text for a subscriber on an event loop"""
+        if last_id is None:
+            last_id = self.last_id
+        yield f"retry: {RETRY_MS}\n\n"
+        while True:
+            if last_id != self.last_id:
+                events, gap = self.since(last_id)
+            else:
+                events, gap = await self._wait_async(last_id)
+            text, last_id = self._chunk(events, gap, last_id, change_filter)
+            yield text
+
+    def stats(self) -> Dict:
+        with self._cond:
+            return {
+                'subscribers': self.subscribers,
+                'max_subscribers': self.max_subscribers,
+                'published': self.published,
+                'held': len(self._events),
+                'last_id': self.last_id,
+            }
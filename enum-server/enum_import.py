@@ -0,0 +1,343 @@
+#!/usr/bin/env python3
+"""
+Bulk ENUM import for the ENUM backend
+Streams phone_number, sip_uri, fallback_uris[, days] rows from CSV or NDJSON,
+validates and normalises them, skips numbers already registered with the
+same value and submits the rest with bounded concurrency and a submission
+rate limit. Every row gets an outcome; final outcomes are appended to an
+optional checkpoint file so an interrupted import can be resumed.
+
+    python3 enum_import.py numbers.csv --checkpoint numbers.ckpt --concurrency 8 --rate 2
+"""
+
+import argparse
+import csv
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from queue import Queue
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, TextIO, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DAYS = 365
+FIELDS = ('phone_number', 'sip_uri', 'fallback_uris', 'days')
+
+# Outcomes that are not retried when an import is resumed
+FINAL = ('queued', 'registered', 'unchanged', 'conflict', 'in_progress', 'failed')
+
+_URI = re.compile(r'^[a-zA-Z][a-zA-Z0-9+.-]*:\S+$')
+
+
+class RowError(ValueError):
+    """An import row is invalid"""
+
+
+def naptr_value(sip_uri: str, fallback_uris: Iterable[str] = ()) -> str:
+    """Simplified NAPTR value for a primary URI and its fallbacks"""
+    return '|'.join(f'"!^.*$!{uri}!"' for uri in [sip_uri, *fallback_uris])
+
+
+def parse_row(row: Dict, default_days: int = DEFAULT_DAYS) -> Tuple[str, str, List[str], int]:
+    """
+    Validate an import row and return (phone_number, sip_uri, fallback_uris,
+    days) with the number normalised to +<digits>. Fallbacks may be a list
+    or a string separated by ';', '|' or spaces.
+    """
+    phone = str(row.get('phone_number') or '').strip()
+    digits = re.sub(r'[\s().-]', '', phone).lstrip('+')
+    if not digits.isdigit() or not 2 <= len(digits) <= 15:
+        raise RowError(f"invalid E.164 number: {phone!r}")
+
+    sip_uri = str(row.get('sip_uri') or '').strip()
+    if not _URI.match(sip_uri):
+        raise RowError(f"invalid URI: {sip_uri!r}")
+
+    fallbacks = row.get('fallback_uris') or []
+    if isinstance(fallbacks, str):
+        fallbacks = re.split(r'[;|\s]+', fallbacks)
+    fallbacks = [uri.strip() for uri in fallbacks if uri and uri.strip()]
+    for uri in fallbacks:
+        if not _URI.match(uri):
+            raise RowError(f"invalid fallback URI: {uri!r}")
+
+    try:
+        days = int(row.get('days') or default_days)
+    except (TypeError, ValueError):
+        raise RowError(f"invalid days: {row.get('days')!r}")
+    if days <= 0:
+        raise RowError(f"invalid days: {days}")
+
+    return '+' + digits, sip_uri, fallbacks, days
+
+
+def read_rows(stream: TextIO, fmt: str = 'csv') -> Iterator[Tuple[int, Dict]]:
+    """
+    Yield (row number, row) from a CSV or NDJSON text stream. CSV files may
+    omit the header if columns are in phone_number, sip_uri, fallback_uris,
+    days order. Unparseable NDJSON lines are yielded as {'_error': ...}.
+    """
+    if fmt == 'ndjson':
+        for number, line in enumerate(stream, 1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+                yield number, row if isinstance(row, dict) else {'_error': 'not a JSON object'}
+            except ValueError as e:
+                yield number, {'_error': f"invalid JSON: {e}"}
+        return
+
+    reader = csv.reader(stream)
+    header = None
+    for number, cells in enumerate(reader, 1):
+        if not cells or not any(c.strip() for c in cells):
+            continue
+        if header is None:
+            if cells[0].strip().lstrip('+').replace(' ', '').isdigit():
+                header = list(FIELDS)
+            else:
+                header = [c.strip().lower() for c in cells]
+                continue
+        yield number, dict(zip(header, cells))
+
+
+def load_checkpoint(path: Optional[str]) -> Set[str]:
+    """NVS keys with a final outcome in an earlier run's checkpoint"""
+    done = set()
+    if not path or not os.path.exists(path):
+        return done
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                outcome = json.loads(line)
+            except ValueError:
+                continue  # torn last line from an interrupted run
+            if outcome.get('status') in FINAL and outcome.get('nvs_key'):
+                done.add(outcome['nvs_key'])
+    return done
+
+
+class RateLimiter:
+    """Spaces calls from any number of threads at most 1/rate seconds apart"""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class BulkImporter:
+    """
+    Runs rows through lookup -> compare -> submit on a bounded thread pool.
+    `lookup(nvs_key)` returns the current record or None; `submit(nvs_key,
+    value, days, phone_number)` returns an outcome dict with a 'status' and
+    raises for retryable failures.
+    """
+
+    def __init__(self, to_nvs_key: Callable[[str], str],
+                 lookup: Callable[[str], Optional[Dict]],
+                 submit: Callable[[str, str, int, str], Dict],
+                 concurrency: int = 8, rate: float = 0.0, days: int = DEFAULT_DAYS,
+                 checkpoint: Optional[str] = None, dry_run: bool = False):
+        self.to_nvs_key = to_nvs_key
+        self.lookup = lookup
+        self.submit = submit
+        self.concurrency = concurrency
+        self.limiter = RateLimiter(rate)
+        self.days = days
+        self.checkpoint = checkpoint
+        self.dry_run = dry_run
+
+        self.counts: Dict[str, int] = {}
+        self.rows = 0
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def process(self, number: int, row: Dict, seen: Set[str]) -> Dict:
+        """Outcome for one row"""
+        outcome = {'row': number, 'phone_number': row.get('phone_number')}
+        if '_error' in row:
+            outcome.update(status='invalid', error=row['_error'])
+            return outcome
+        try:
+            phone, sip_uri, fallbacks, days = parse_row(row, self.days)
+        except RowError as e:
+            outcome.update(status='invalid', error=str(e))
+            return outcome
+
+        nvs_key = self.to_nvs_key(phone)
+        value = naptr_value(sip_uri, fallbacks)
+        outcome.update(phone_number=phone, nvs_key=nvs_key)
+
+        with self._lock:
+            if nvs_key in seen:
+                outcome.update(status='duplicate', error='number repeated in this import')
+                return outcome
+            seen.add(nvs_key)
+
+        try:
+            existing = self.lookup(nvs_key)
+            if existing is not None:
+                if existing.get('value') == value:
+                    outcome['status'] = 'unchanged'
+                else:
+                    outcome.update(status='conflict', error='registered with a different value')
+                return outcome
+            if self.dry_run:
+                outcome['status'] = 'would_register'
+                return outcome
+            self.limiter.wait()
+            outcome.update(self.submit(nvs_key, value, days, phone))
+        except Exception as e:
+            outcome.update(status='error', error=str(e))
+        return outcome
+
+    def run(self, rows: Iterable[Tuple[int, Dict]]) -> Iterator[Dict]:
+        """
+        Process rows, yielding outcomes as they complete. Rows whose number
+        already has a final outcome in the checkpoint are skipped silently.
+        """
+        done = load_checkpoint(self.checkpoint)
+        seen: Set[str] = set()
+        # A slot is held from feeding a row until its outcome is consumed, so
+        # a slow reader of the outcomes also slows down reading the input
+        slots = threading.Semaphore(self.concurrency * 2)
+        results: Queue = Queue()
+        cancelled = threading.Event()
+        self.started = time.monotonic()
+
+        def skip(row: Dict) -> bool:
+            try:
+                return self.to_nvs_key(parse_row(row, self.days)[0]) in done
+            except RowError:
+                return False
+
+        def feed():
+            try:
+                with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='import') as pool:
+                    for number, row in rows:
+                        if done and skip(row):
+                            continue
+                        while not slots.acquire(timeout=0.5):
+                            if cancelled.is_set():
+                                return
+                        pool.submit(lambda n=number, r=row: results.put(self.process(n, r, seen)))
+            except Exception as e:
+                logger.error(f"Import input failed: {e}")
+                results.put({'row': None, 'status': 'error', 'error': f"input: {e}"})
+            finally:
+                results.put(None)
+
+        threading.Thread(target=feed, name='import-feed', daemon=True).start()
+
+        checkpoint = open(self.checkpoint, 'a', encoding='utf-8') if self.checkpoint else None
+        try:
+            while True:
+                outcome = results.get()
+                if outcome is None:
+                    break
+                if outcome.get('row') is not None:
+                    slots.release()
+                self.record(outcome, checkpoint)
+                yield outcome
+        finally:
+            cancelled.set()
+            if checkpoint is not None:
+                checkpoint.close()
+            self.finished = time.monotonic()
+
+    def record(self, outcome: Dict, checkpoint: Optional[TextIO]):
+        self.rows += 1
+        self.counts[outcome['status']] = self.counts.get(outcome['status'], 0) + 1
+        if checkpoint is not None and outcome['status'] in FINAL:
+            checkpoint.write(json.dumps(outcome) + '\n')
+            checkpoint.flush()
+
+    def summary(self) -> Dict:
+        elapsed = ((self.finished or time.monotonic()) - self.started) if self.started else 0.0
+        return {
+            'rows': self.rows,
+            'outcomes': dict(sorted(self.counts.items())),
+            'seconds': round(elapsed, 3),
+            'rows_per_sec': round(self.rows / elapsed, 1) if elapsed else 0.0,
+        }
+
+
+def detect_format(path: str, fmt: Optional[str]) -> str:
+    if fmt:
+        return fmt
+    return 'ndjson' if path.endswith(('.ndjson', '.jsonl')) else 'csv'
+
+
+def main():
+    # Imported here so the backend can import this module without a cycle
+    import enum_backend
+    from enum_backend import ENUMResolver, EmercoinNVS
+    from enum_jobs import RegistrationQueue
+
+    parser = argparse.ArgumentParser(description='Bulk import ENUM records from CSV or NDJSON')
+    parser.add_argument('file', help="Rows to import ('-' for stdin)")
+    parser.add_argument('--format', choices=('csv', 'ndjson'), help='Input format (default: from extension)')
+    parser.add_argument('--checkpoint', help='Append final outcomes here and skip numbers already in it')
+    parser.add_argument('--report', help='Write every row outcome as NDJSON (default: stdout)')
+    parser.add_argument('--concurrency', default=8, type=int, help='Rows processed in parallel')
+    parser.add_argument('--rate', default=enum_backend.REGISTER_RATE, type=float,
+                        help='Max name_new submissions per second (0 = unlimited)')
+    parser.add_argument('--days', default=DEFAULT_DAYS, type=int, help='Registration period for rows without days')
+    parser.add_argument('--register-queue',
+                        help="Add jobs to the backend's registration queue instead of calling name_new")
+    parser.add_argument('--dry-run', action='store_true', help='Validate and compare only')
+    parser.add_argument('--emc-cli', default=enum_backend.EMC_CLI_PATH, help='Path to emercoin-cli')
+    parser.add_argument('--emc-datadir', default=enum_backend.EMC_DATADIR, help='Emercoin data directory')
+    parser.add_argument('--emc-conf', help='Path to emercoin.conf for JSON-RPC (default: <datadir>/emercoin.conf)')
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    enum_backend.EMC_CLI_PATH = args.emc_cli
+    enum_backend.EMC_DATADIR = args.emc_datadir
+    EmercoinNVS.configure_rpc(args.emc_conf or os.path.join(args.emc_datadir, 'emercoin.conf'),
+                              pool_size=max(args.concurrency, 1))
+    if args.register_queue:
+        # The backend's worker paces name_new; queueing needs no rate limit
+        ENUMResolver.registrations = RegistrationQueue(args.register_queue)
+        args.rate = 0.0
+
+    importer = enum_backend.bulk_importer(args.concurrency, args.rate, args.days,
+                                          args.checkpoint, args.dry_run)
+    fmt = detect_format(args.file, args.format)
+    stream = sys.stdin if args.file == '-' else open(args.file, encoding='utf-8', newline='')
+    report = open(args.report, 'w', encoding='utf-8') if args.report else sys.stdout
+    try:
+        for outcome in importer.run(read_rows(stream, fmt)):
+            report.write(json.dumps(outcome) + '\n')
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+        if report is not sys.stdout:
+            report.close()
+
+    summary = importer.summary()
+    print(f"{summary['rows']} rows in {summary['seconds']}s ({summary['rows_per_sec']} rows/s): "
+          + ', '.join(f"{k}={v}" for k, v in summary['outcomes'].items()), file=sys.stderr)
+    sys.exit(1 if summary['outcomes'].get('error') else 0)
+
+
+if __name__ == '__main__':
+    main()
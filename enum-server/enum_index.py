@@ -0,0 +1,437 @@
+#!/usr/bin/env python3
+"""
+Local index of ENUM records in Emercoin NVS
+SQLite mirror of every enum: name. Bootstrapped once with paged name_filter
+scans, then kept current by scanning only the blocks added since the last
+sync. Lookups and listings read from the index; callers fall back to RPC
+while it is stale.
+
+A snapshot (export_snapshot / load_snapshot) copies the records and their
+block height to a new node, which then only scans the blocks added since.
+
+    python3 enum_index.py export --index data/enum_index.sqlite enum.snap
+    python3 enum_index.py load --index data/enum_index.sqlite enum.snap
+"""
+
+import argparse
+import hashlib
+import logging
+import os
+import sqlite3
+import struct
+import sys
+import threading
+import time
+import zlib
+from typing import Callable, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# name_filter "maxage" large enough to cover the whole chain
+ALL_BLOCKS = 99999999
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS records (
+    name TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    address TEXT NOT NULL DEFAULT '',
+    expires_at INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+# Kinds of record change reported by sync()
+CREATED = 'created'
+UPDATED = 'updated'
+DELETED = 'deleted'
+EXPIRED = 'expired'
+
+# rpc(method, params) -> result, raising on failure (EmercoinNVS.call)
+RPCCall = Callable[[str, List], object]
+
+# Snapshot file: header, then the zlib-compressed records
+SNAPSHOT_MAGIC = b'ENUMSNP1'
+# magic, block height, record count, SHA-256 of the compressed body
+SNAPSHOT_HEADER = struct.Struct('<8sQI32s')
+# name, value and address lengths, expiry height; followed by the three strings
+SNAPSHOT_RECORD = struct.Struct('<HIHq')
+
+
+class SnapshotError(ValueError):
+    """A snapshot file is truncated, corrupt or not a snapshot"""
+
+
+def read_snapshot_header(path: str) -> Dict:
+    """Height and record count of a snapshot file, without reading its records"""
+    with open(path, 'rb') as f:
+        header = f.read(SNAPSHOT_HEADER.size)
+    if len(header) < SNAPSHOT_HEADER.size or not header.startswith(SNAPSHOT_MAGIC):
+        raise SnapshotError(f"{path} is not an ENUM index snapshot")
+    _, height, count, checksum = SNAPSHOT_HEADER.unpack(header)
+    return {'height': height, 'records': count, 'checksum': checksum.hex()}
+
+
+class ENUMIndex:
+    """On-disk index of enum: NVS records with the block height it reflects"""
+
+    def __init__(self, path: str, prefix: str = "enum:", page_size: int = 500,
+                 max_lag: int = 1, rescan_blocks: int = 144, stale_after: float = 120.0):
+        self.path = path
+        self.prefix = prefix
+        self.page_size = page_size
+        self.max_lag = max_lag
+        # name_filter only reports live names, so deletions are picked up by
+        # a periodic full rescan (every ~day at 10 min blocks)
+        self.rescan_blocks = rescan_blocks
+        self.stale_after = stale_after
+
+        self.chain_height: Optional[int] = None
+        self.checked_at = 0.0
+        # Set by load_snapshot: catch up incrementally before any full rescan
+        self._defer_rescan = False
+
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        conn = self._conn()
+        conn.executescript(SCHEMA)
+        conn.commit()
+        # Record count as of the last write, for stats() (which /health
+        # calls on every probe) without a table scan each time
+        self.records = self.count()
+
+    def _conn(self) -> sqlite3.Connection:
+        """Per-thread connection; WAL lets readers run alongside the syncer"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get_meta(self, key: str) -> Optional[int]:
+        row = self._conn().execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return int(row[0]) if row else None
+
+    def set_meta(self, key: str, value: int):
+        """Store a number alongside the index (e.g. the change feed's last event id)"""
+        with self._write_lock:
+            conn = self._conn()
+            with conn:
+                conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value)))
+
+    @property
+    def height(self) -> Optional[int]:
+        """Block height the index was last synced against"""
+        return self.get_meta('height')
+
+    def lag(self) -> Optional[int]:
+        """Blocks the index is behind the last observed chain tip"""
+        height = self.height
+        if height is None or self.chain_height is None:
+            return None
+        return max(0, self.chain_height - height)
+
+    def is_fresh(self) -> bool:
+        """True if the index can answer instead of the node"""
+        lag = self.lag()
+        return (lag is not None and lag <= self.max_lag
+                and time.monotonic() - self.checked_at < self.stale_after)
+
+    def count(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM records").fetchone()[0]
+
+    def _to_record(self, row, height: Optional[int]) -> Dict:
+        name, value, address, expires_at = row
+        return {
+            'name': name,
+            'value': value,
+            'address': address,
+            'expires_at': expires_at,
+            'expires_in': expires_at - height if height is not None else 0,
+        }
+
+    def get(self, name: str) -> Optional[Dict]:
+        """Return the indexed record for an NVS name, shaped like name_show"""
+        height = self.height
+        row = self._conn().execute(
+            "SELECT name, value, address, expires_at FROM records WHERE name = ? AND expires_at > ?",
+            (name, height or 0)
+        ).fetchone()
+        return self._to_record(row, height) if row else None
+
+    def iter_records(self, after: str = "", limit: Optional[int] = None) -> Iterator[Dict]:
+        """Yield live records in name order, starting after the given name"""
+        height = self.height
+        sql = ("SELECT name, value, address, expires_at FROM records "
+               "WHERE name > ? AND expires_at > ? ORDER BY name")
+        params = [after, height or 0]
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        for row in self._conn().execute(sql, params):
+            yield self._to_record(row, height)
+
+    def stats(self) -> Dict:
+        return {
+            'records': self.records,
+            'height': self.height,
+            'chain_height': self.chain_height,
+            'lag': self.lag(),
+            'fresh': self.is_fresh(),
+            'snapshot_height': self.get_meta('snapshot_height'),
+        }
+
+    # Snapshots
+
+    def export_snapshot(self, path: str) -> Dict:
+        """Write the live records and the height they reflect to a snapshot file"""
+        started = time.monotonic()
+        compressor = zlib.compressobj(6)
+        digest = hashlib.sha256()
+        tmp = f"{path}.tmp"
+        count = 0
+        # One read transaction, so the records match the height even while
+        # the syncer of a running node writes
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            conn.execute("BEGIN")
+            row = conn.execute("SELECT value FROM meta WHERE key = 'height'").fetchone()
+            if row is None:
+                raise SnapshotError("the index has not been built yet")
+            height = int(row[0])
+            with open(tmp, 'wb') as f:
+                f.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, height, 0, b'\0' * 32))
+
+                def write(data: bytes):
+                    if data:
+                        digest.update(data)
+                        f.write(data)
+
+                for name, value, address, expires_at in conn.execute(
+                        "SELECT name, value, address, expires_at FROM records WHERE expires_at > ? "
+                        "ORDER BY name", (height,)):
+                    name, value, address = name.encode(), value.encode(), address.encode()
+                    write(compressor.compress(
+                        SNAPSHOT_RECORD.pack(len(name), len(value), len(address), expires_at)
+                        + name + value + address))
+                    count += 1
+                write(compressor.flush())
+                f.seek(0)
+                f.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, height, count, digest.digest()))
+            os.replace(tmp, path)
+        finally:
+            conn.close()
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+        logger.info(f"ENUM index snapshot of block {height}: {count} records written to {path} "
+                    f"in {time.monotonic() - started:.2f}s")
+        return {'height': height, 'records': count, 'bytes': os.path.getsize(path)}
+
+    def load_snapshot(self, path: str) -> Dict:
+        """
+        Replace the index with a snapshot's records. The next sync then only
+        scans the blocks added since the snapshot height; the periodic full
+        rescan that drops deleted names follows on a later sync.
+        """
+        started = time.monotonic()
+        with open(path, 'rb') as f:
+            header = f.read(SNAPSHOT_HEADER.size)
+            body = f.read()
+        if len(header) < SNAPSHOT_HEADER.size or not header.startswith(SNAPSHOT_MAGIC):
+            raise SnapshotError(f"{path} is not an ENUM index snapshot")
+        _, height, count, checksum = SNAPSHOT_HEADER.unpack(header)
+        if hashlib.sha256(body).digest() != checksum:
+            raise SnapshotError(f"{path} checksum mismatch")
+        try:
+            data = zlib.decompress(body)
+        except zlib.error as e:
+            raise SnapshotError(f"{path} is corrupt: {e}") from e
+
+        rows = []
+        offset = 0
+        try:
+            for _ in range(count):
+                name_len, value_len, address_len, expires_at = SNAPSHOT_RECORD.unpack_from(data, offset)
+                offset += SNAPSHOT_RECORD.size
+                name_end = offset + name_len
+                value_end = name_end + value_len
+                address_end = value_end + address_len
+                if address_end > len(data):
+                    raise SnapshotError(f"{path} is truncated")
+                rows.append((data[offset:name_end].decode(), data[name_end:value_end].decode(),
+                             data[value_end:address_end].decode(), expires_at))
+                offset = address_end
+        except (struct.error, UnicodeDecodeError) as e:
+            raise SnapshotError(f"{path} is corrupt: {e}") from e
+
+        with self._write_lock:
+            conn = self._conn()
+            with conn:
+                conn.execute("DELETE FROM records")
+                conn.executemany(
+                    "INSERT OR REPLACE INTO records (name, value, address, expires_at) VALUES (?, ?, ?, ?)",
+                    rows
+                )
+                conn.executemany("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                                 [('height', str(height)), ('rescan_height', str(height)),
+                                  ('snapshot_height', str(height))])
+            self._defer_rescan = True
+            self.records = count
+
+        logger.info(f"ENUM index loaded {count} records at block {height} from {path} "
+                    f"in {time.monotonic() - started:.2f}s")
+        return {'height': height, 'records': count}
+
+    # Synchronisation
+
+    def _scan(self, rpc: RPCCall, max_age: int) -> Iterator[Dict]:
+        """Page through name_filter results for names touched in the last max_age blocks"""
+        offset = 0
+        while True:
+            page = rpc("name_filter", [f"^{self.prefix}", max_age, offset, self.page_size]) or []
+            for entry in page:
+                if entry.get('name', '').startswith(self.prefix):
+                    yield entry
+            if len(page) < self.page_size:
+                return
+            offset += len(page)
+
+    def _upsert(self, conn: sqlite3.Connection, entries: Iterator[Dict], height: int) -> Dict[str, str]:
+        """Write scanned entries; returns {name: CREATED or UPDATED} for records that changed"""
+        changed = {}
+        for entry in entries:
+            name = entry['name']
+            expires_at = entry.get('expires_at')
+            if expires_at is None:
+                expires_at = height + int(entry.get('expires_in', 0))
+            row = (entry.get('value', ''), entry.get('address', ''), expires_at)
+            old = conn.execute(
+                "SELECT value, address, expires_at FROM records WHERE name = ?", (name,)
+            ).fetchone()
+            if old != row:
+                conn.execute(
+                    "INSERT OR REPLACE INTO records (name, value, address, expires_at) VALUES (?, ?, ?, ?)",
+                    (name,) + row
+                )
+                changed[name] = CREATED if old is None else UPDATED
+        return changed
+
+    def sync(self, rpc: RPCCall, chain_height: Optional[int] = None) -> Dict[str, str]:
+        """
+        Bring the index up to the chain tip. Returns {name: change} for the
+        NVS names that were created, updated, deleted or expired so callers
+        can invalidate caches.
+        """
+        if chain_height is None:
+            chain_height = int(rpc("getblockcount", []))
+        self.chain_height = chain_height
+
+        with self._write_lock:
+            conn = self._conn()
+            built = self.height
+            last_rescan = self.get_meta('rescan_height')
+            if built is not None and chain_height <= built:
+                self.checked_at = time.monotonic()
+                return {}
+
+            full = built is None or last_rescan is None or (
+                not self._defer_rescan and chain_height - last_rescan >= self.rescan_blocks)
+            self._defer_rescan = False
+            started = time.monotonic()
+            with conn:
+                if full:
+                    conn.execute("CREATE TEMP TABLE IF NOT EXISTS seen (name TEXT PRIMARY KEY)")
+                    conn.execute("DELETE FROM seen")
+                    entries = list(self._scan(rpc, ALL_BLOCKS))
+                    conn.executemany("INSERT OR IGNORE INTO seen (name) VALUES (?)",
+                                     ((e['name'],) for e in entries))
+                    changed = self._upsert(conn, iter(entries), chain_height)
+                    gone = [r[0] for r in conn.execute(
+                        "SELECT name FROM records WHERE name NOT IN (SELECT name FROM seen)")]
+                    conn.execute("DELETE FROM records WHERE name NOT IN (SELECT name FROM seen)")
+                    changed.update(dict.fromkeys(gone, DELETED))
+                    conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('rescan_height', ?)",
+                                 (str(chain_height),))
+                else:
+                    # +1 so a block that landed while we were scanning is not skipped
+                    changed = self._upsert(conn, self._scan(rpc, chain_height - built + 1), chain_height)
+
+                expired = [r[0] for r in conn.execute(
+                    "SELECT name FROM records WHERE expires_at <= ?", (chain_height,))]
+                conn.execute("DELETE FROM records WHERE expires_at <= ?", (chain_height,))
+                changed.update(dict.fromkeys(expired, EXPIRED))
+                conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('height', ?)",
+                             (str(chain_height),))
+                if changed:
+                    self.records = conn.execute("SELECT COUNT(*) FROM records").fetchone()[0]
+
+        self.checked_at = time.monotonic()
+        logger.info(f"ENUM index {'rebuilt' if full else 'synced'} to block {chain_height}: "
+                    f"{len(changed)} changed in {time.monotonic() - started:.2f}s")
+        return changed
+
+    def start(self, rpc: RPCCall, interval: float = 30.0,
+              on_change: Optional[Callable[[Dict[str, str]], None]] = None):
+        """Keep the index synced from a background thread"""
+        def run():
+            while not self._stop.is_set():
+                try:
+                    changed = self.sync(rpc)
+                    if changed and on_change:
+                        on_change(changed)
+                except Exception as e:
+                    logger.error(f"ENUM index sync failed: {e}")
+                self._wake.wait(interval)
+                self._wake.clear()
+
+        self._thread = threading.Thread(target=run, name="enum-index-sync", daemon=True)
+        self._thread.start()
+
+    def request_sync(self):
+        """Run the next background sync now, e.g. when a new block was seen"""
+        self._wake.set()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+
+def main():
+    # Imported here so the backend can import this module without a cycle
+    from enum_backend import ENUM_INDEX_PATH, ENUM_PREFIX
+
+    parser = argparse.ArgumentParser(description='Export or load ENUM index snapshots')
+    parser.add_argument('action', choices=('export', 'load', 'info'))
+    parser.add_argument('snapshot', help='Snapshot file')
+    parser.add_argument('--index', default=ENUM_INDEX_PATH, help='SQLite file of the local ENUM index')
+    args = parser.parse_args()
+
+    try:
+        if args.action == 'info':
+            result = read_snapshot_header(args.snapshot)
+        else:
+            os.makedirs(os.path.dirname(os.path.abspath(args.index)), exist_ok=True)
+            index = ENUMIndex(args.index, prefix=ENUM_PREFIX)
+            if args.action == 'export':
+                result = index.export_snapshot(args.snapshot)
+            else:
+                result = index.load_snapshot(args.snapshot)
+    except (OSError, SnapshotError) as e:
+        logger.error(str(e))
+        sys.exit(1)
+    print(', '.join(f"{k}={v}" for k, v in result.items()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+"""
+Registration queue for the ENUM backend
+/enum/register stores the name_new request in a SQLite job table and
+returns at once. A background worker submits queued jobs to the node at a
+fixed rate and polls their transactions until they have enough
+confirmations, so registrations survive restarts and web workers never
+wait on the wallet.
+
+Job states: queued -> submitted -> confirmed, or failed.
+"""
+
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Callable, Dict, List, Optional
+
+from emercoin_rpc import RPCError, RPCTransportError
+
+logger = logging.getLogger(__name__)
+
+QUEUED = 'queued'
+SUBMITTED = 'submitted'
+CONFIRMED = 'confirmed'
+FAILED = 'failed'
+ACTIVE_STATES = (QUEUED, SUBMITTED)
+
+# Seconds a claimed job is hidden from other workers while name_new runs
+SUBMIT_LEASE = 120
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    nvs_key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    days INTEGER NOT NULL,
+    phone_number TEXT NOT NULL DEFAULT '',
+    state TEXT NOT NULL,
+    txid TEXT,
+    confirmations INTEGER NOT NULL DEFAULT 0,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    submitted_at REAL,
+    confirmed_at REAL,
+    next_try_at REAL NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, next_try_at);
+CREATE INDEX IF NOT EXISTS jobs_key ON jobs (nvs_key, state);
+"""
+
+COLUMNS = ('id', 'nvs_key', 'value', 'days', 'phone_number', 'state', 'txid', 'confirmations',
+           'attempts', 'error', 'created_at', 'updated_at', 'submitted_at', 'confirmed_at')
+
+# rpc(method, params) -> result, raising on failure (EmercoinNVS.call)
+RPCCall = Callable[[str, List], object]
+
+
+class DuplicateJob(Exception):
+    """A registration for the same NVS key is already queued or pending"""
+
+    def __init__(self, job: Dict):
+        super().__init__(f"{job['nvs_key']} already has job {job['id']} ({job['state']})")
+        self.job = job
+
+
+class RegistrationQueue:
+    """Durable name_new queue with rate-limited submission and confirmation tracking"""
+
+    def __init__(self, path: str, rate: float = 1.0, confirmations: int = 1,
+                 poll_interval: float = 30.0, max_attempts: int = 5, retry_delay: float = 30.0):
+        self.path = path
+        # name_new submissions per second
+        self.rate = rate
+        self.confirmations = confirmations
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._last_check = 0.0
+
+        conn = self._conn()
+        conn.executescript(SCHEMA)
+        conn.commit()
+
+    def _conn(self) -> sqlite3.Connection:
+        """Per-thread connection; WAL lets status reads run alongside the worker"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _row(self, sql: str, params: tuple) -> Optional[Dict]:
+        row = self._conn().execute(f"SELECT {', '.join(COLUMNS)} FROM jobs {sql}", params).fetchone()
+        return dict(zip(COLUMNS, row)) if row else None
+
+    def _update(self, job_id: str, **fields):
+        fields['updated_at'] = time.time()
+        assignments = ', '.join(f"{name} = ?" for name in fields)
+        with self._write_lock:
+            conn = self._conn()
+            with conn:
+                conn.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+
+    def submit(self, nvs_key: str, value: str, days: int = 365, phone_number: str = '') -> Dict:
+        """Queue a name_new; raises DuplicateJob if the key already has an active job"""
+        now = time.time()
+        job_id = uuid.uuid4().hex
+        with self._write_lock:
+            conn = self._conn()
+            with conn:
+                # IMMEDIATE so another process cannot queue the same key in between
+                conn.execute("BEGIN IMMEDIATE")
+                active = self._row("WHERE nvs_key = ? AND state IN (?, ?)", (nvs_key,) + ACTIVE_STATES)
+                if active is not None:
+                    raise DuplicateJob(active)
+                conn.execute(
+                    "INSERT INTO jobs (id, nvs_key, value, days, phone_number, state, created_at, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (job_id, nvs_key, value, days, phone_number, QUEUED, now, now)
+                )
+        self._wake.set()
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        return self._row("WHERE id = ?", (job_id,))
+
+    def counts(self) -> Dict[str, int]:
+        rows = self._conn().execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall()
+        counts = {state: 0 for state in (QUEUED, SUBMITTED, CONFIRMED, FAILED)}
+        counts.update(dict(rows))
+        return counts
+
+    # Worker
+
+    def _claim(self) -> Optional[Dict]:
+        """
+        Take the oldest due queued job, leasing it so workers in other
+        processes skip it while it is being submitted
+        """
+        now = time.time()
+        with self._write_lock:
+            conn = self._conn()
+            with conn:
+                conn.execute("BEGIN IMMEDIATE")
+                job = self._row("WHERE state = ? AND next_try_at <= ? ORDER BY created_at LIMIT 1",
+                                (QUEUED, now))
+                if job is not None:
+                    conn.execute("UPDATE jobs SET next_try_at = ? WHERE id = ?",
+                                 (now + SUBMIT_LEASE, job['id']))
+        return job
+
+    def _retry_or_fail(self, job: Dict, error: str):
+        attempts = job['attempts'] + 1
+        if attempts >= self.max_attempts:
+            self._update(job['id'], state=FAILED, attempts=attempts, error=error)
+            logger.error(f"Registration {job['id']} for {job['nvs_key']} failed: {error}")
+        else:
+            self._update(job['id'], attempts=attempts, error=error,
+                         next_try_at=time.time() + self.retry_delay * attempts)
+
+    def _submit_one(self, rpc: RPCCall, job: Dict):
+        try:
+            result = rpc("name_new", [job['nvs_key'], job['value'], job['days']])
+        except RPCTransportError as e:
+            self._retry_or_fail(job, str(e))
+            return
+        except RPCError as e:
+            # A crash or a timed-out name_new can leave the job queued after
+            # the node took it; the resubmission is then rejected because
+            # the name exists or is pending, and that earlier name_new is
+            # this job's
+            try:
+                result = self._earlier_submission(rpc, job)
+            except RPCTransportError as check_error:
+                self._retry_or_fail(job, f"{e}; checking for an earlier submission: {check_error}")
+                return
+            if result is None:
+                self._update(job['id'], state=FAILED, attempts=job['attempts'] + 1, error=str(e))
+                logger.error(f"Registration {job['id']} for {job['nvs_key']} rejected: {e}")
+                return
+
+        # JSON-RPC returns the bare txid, older CLI output wraps it in an object
+        txid = result.get('txid', '') if isinstance(result, dict) else str(result or '')
+        now = time.time()
+        self._update(job['id'], state=SUBMITTED, txid=txid, attempts=job['attempts'] + 1,
+                     error=None, submitted_at=now, next_try_at=now)
+        logger.info(f"Registration {job['id']} submitted: {job['nvs_key']} txid {txid}")
+
+    def _earlier_submission(self, rpc: RPCCall, job: Dict) -> Optional[str]:
+        """
+        txid of a name_new with the job's name and value the node already
+        has, registered (name_show) or still in the mempool (name_pending);
+        None if there is none
+        """
+        try:
+            record = rpc("name_show", [job['nvs_key']])
+        except RPCError:
+            record = None
+        if record and record.get('value') == job['value'] and record.get('txid'):
+            return record['txid']
+
+        try:
+            pending = rpc("name_pending", []) or []
+        except RPCError:
+            pending = []
+        for entry in pending:
+            if entry.get('name') == job['nvs_key'] and entry.get('value') == job['value'] and entry.get('txid'):
+                return entry['txid']
+        return None
+
+    def _check_one(self, rpc: RPCCall, job: Dict) -> bool:
+        """Refresh a submitted job's confirmations; True once it is confirmed"""
+        try:
+            tx = rpc("gettransaction", [job['txid']]) or {}
+        except (RPCError, RPCTransportError) as e:
+            self._update(job['id'], error=str(e))
+            return False
+        confirmations = int(tx.get('confirmations', 0))
+        if confirmations < 0:
+            # Conflicted: the transaction lost to another spend and will not confirm
+            self._update(job['id'], state=FAILED, confirmations=confirmations,
+                         error="transaction conflicted")
+            return False
+        if confirmations >= self.confirmations:
+            self._update(job['id'], state=CONFIRMED, confirmations=confirmations,
+                         error=None, confirmed_at=time.time())
+            logger.info(f"Registration {job['id']} confirmed: {job['nvs_key']}")
+            return True
+        if confirmations != job['confirmations']:
+            self._update(job['id'], confirmations=confirmations)
+        return False
+
+    def run_once(self, rpc: RPCCall, on_confirm: Optional[Callable[[Dict], None]] = None,
+                 check: bool = True) -> int:
+        """
+        Submit the queued jobs that are due (paced to `rate` per second) and,
+        if `check`, poll submitted ones. Returns the number of jobs submitted.
+        """
+        interval = 1.0 / self.rate if self.rate > 0 else 0.0
+        submitted = 0
+        while not self._stop.is_set():
+            job = self._claim()
+            if job is None:
+                break
+            started = time.monotonic()
+            self._submit_one(rpc, job)
+            submitted += 1
+            if interval:
+                self._stop.wait(max(0.0, interval - (time.monotonic() - started)))
+
+        if check:
+            self._last_check = time.monotonic()
+            rows = self._conn().execute(
+                f"SELECT {', '.join(COLUMNS)} FROM jobs WHERE state = ? ORDER BY submitted_at", (SUBMITTED,)
+            ).fetchall()
+            for job in (dict(zip(COLUMNS, row)) for row in rows):
+                if self._check_one(rpc, job) and on_confirm is not None:
+                    try:
+                        on_confirm(job)
+                    except Exception as e:
+                        logger.error(f"Registration confirm callback failed: {e}")
+        return submitted
+
+    def start(self, rpc: RPCCall, on_confirm: Optional[Callable[[Dict], None]] = None):
+        """Process the queue from a background thread"""
+        def run():
+            while not self._stop.is_set():
+                due = time.monotonic() - self._last_check >= self.poll_interval
+                try:
+                    self.run_once(rpc, on_confirm, check=due)
+                except Exception as e:
+                    logger.error(f"Registration worker failed: {e}")
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+
+        self._thread = threading.Thread(target=run, name="registration-worker", daemon=True)
+        self._thread.start()
+
+    def request_check(self):
+        """Poll confirmations on the next worker pass, e.g. when a new block was seen"""
+        self._last_check = 0.0
+        self._wake.set()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Metrics for the ENUM backend in Prometheus text format
+Minimal counters and fixed-bucket histograms with labels. Recording is a
+dict lookup, a bisect and a few increments under one lock, cheap enough to
+leave on in production; REGISTRY.enabled = False turns recording off.
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Sequence, Tuple
+
+# Seconds; covers cache hits (sub-millisecond) up to the 10 s RPC timeout
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+                   0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    """Monotonic counter per label set"""
+
+    def __init__(self, registry: 'Registry', name: str, help: str, labels: Sequence[str] = ()):
+        self.registry = registry
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values: Dict[Tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values: str, amount: float = 1):
+        if not self.registry.enabled:
+            return
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for label_values, value in items:
+            lines.append(f"{self.name}{_labels(self.labels, label_values)} {value:g}")
+        return lines
+
+
+class Histogram:
+    """Cumulative-bucket histogram per label set"""
+
+    def __init__(self, registry: 'Registry', name: str, help: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.registry = registry
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        # label values -> [per-bucket counts..., +Inf count, sum]
+        self._series: Dict[Tuple, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values: str):
+        if not self.registry.enabled:
+            return
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 2)
+            series[i] += 1
+            series[-1] += value
+
+    @contextmanager
+    def time(self, *label_values: str):
+        """Observe the duration of the with-block"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *label_values)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._series.items())
+        for label_values, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), series):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float('inf') else f'le="{bound:g}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labels, label_values, le)} {cumulative:g}")
+            lines.append(f"{self.name}_sum{_labels(self.labels, label_values)} {series[-1]:.6f}")
+            lines.append(f"{self.name}_count{_labels(self.labels, label_values)} {cumulative:g}")
+        return lines
+
+
+class Gauge:
+    """Current values per label set, read from a callback when rendered"""
+
+    def __init__(self, registry: 'Registry', name: str, help: str, labels: Sequence[str],
+                 collect: Callable[[], Dict[Tuple, float]]):
+        self.registry = registry
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.collect = collect
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        for label_values, value in sorted(self.collect().items()):
+            lines.append(f"{self.name}{_labels(self.labels, label_values)} {value:g}")
+        return lines
+
+
+class Registry:
+    """Set of metrics rendered together on /metrics"""
+
+    def __init__(self):
+        self.enabled = True
+        self._metrics: List = []
+
+    def counter(self, name: str, help: str, labels: Sequence[str] = ()) -> Counter:
+        metric = Counter(self, name, help, labels)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help: str, labels: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        metric = Histogram(self, name, help, labels, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def gauge(self, name: str, help: str, labels: Sequence[str],
+              collect: Callable[[], Dict[Tuple, float]]) -> Gauge:
+        metric = Gauge(self, name, help, labels, collect)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+HTTP_REQUESTS = REGISTRY.counter(
+    "enum_http_requests_total", "HTTP requests by endpoint, method and status",
+    ("endpoint", "method", "status"))
+HTTP_LATENCY = REGISTRY.histogram(
+    "enum_http_request_duration_seconds", "Time to produce a response, by endpoint",
+    ("endpoint", "method"))
+RPC_LATENCY = REGISTRY.histogram(
+    "enum_rpc_duration_seconds", "emercoind RPC call latency, by method",
+    ("method",))
+RPC_ERRORS = REGISTRY.counter(
+    "enum_rpc_errors_total", "emercoind RPC failures by method and kind (not_found, rpc_error, transport, timeout)",
+    ("method", "kind"))
+NAPTR_PARSE = REGISTRY.histogram(
+    "enum_naptr_parse_duration_seconds", "Time to parse and apply NAPTR records for a resolution")
+SERIALIZE = REGISTRY.histogram(
+    "enum_response_serialize_duration_seconds", "Time to serialize JSON response bodies, by endpoint",
+    ("endpoint",))
+DNS_QUERIES = REGISTRY.counter(
+    "enum_dns_queries_total", "DNS queries answered, by transport (udp, tcp) and response code",
+    ("transport", "rcode"))
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+NAPTR engine for ENUM values stored in Emercoin NVS
+Understands both value syntaxes found on chain:
+
+    simplified:  "!^.*$!sip:user@domain.com!"|"!^.*$!sip:backup@domain.com!"
+    RFC 3403:    NAPTR 100 10 "u" "E2U+sip" "!^.*$!sip:gateway@example.com!" .
+
+Parsed rules (with their regexps compiled) are cached by raw NVS value, so
+hot records are parsed once. Resolution applies each rule's substitution
+expression to the AUS (the E.164 number) as RFC 3402/6116 specify.
+"""
+
+import re
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+# Distinct NVS values whose parsed rules are kept
+NAPTR_RULE_CACHE_SIZE = 4096
+
+# Service assumed for the simplified syntax, which has no service field
+DEFAULT_SERVICE = "E2U+sip"
+DEFAULT_PREFERENCE = 10
+
+# Quoted strings (with backslash escapes), entry separators and bare words
+_TOKEN = re.compile(r'"((?:[^"\\]|\\.)*)"|(\||\n)|([^\s"|]+)')
+
+
+class NAPTRError(ValueError):
+    """A NAPTR entry could not be parsed"""
+
+
+class NAPTRRule:
+    """One NAPTR entry with its substitution expression compiled"""
+
+    __slots__ = ('order', 'preference', 'flags', 'services', 'regexp', 'pattern',
+                 'template', 'substitution', 'replacement', 'regex')
+
+    def __init__(self, order: int, preference: int, flags: str, services: str,
+                 regexp: str, replacement: str = "."):
+        self.order = order
+        self.preference = preference
+        self.flags = flags.lower()
+        self.services = services
+        # As written, for DNS answers where the client applies it
+        self.regexp = regexp
+        self.replacement = replacement
+        self.pattern = None
+        self.template = None
+        self.substitution = None
+        self.regex = None
+        if regexp:
+            self.pattern, self.template, regex_flags = split_regexp(regexp)
+            try:
+                self.regex = re.compile(self.pattern, re.IGNORECASE if 'i' in regex_flags else 0)
+            except re.error as e:
+                raise NAPTRError(f"invalid regexp {self.pattern!r}: {e}") from e
+            # RFC 3402 backrefs are \1..\9; Python's expand() needs \g<n> to
+            # keep "\10" meaning group 1 followed by "0"
+            self.substitution = re.sub(r'\\([1-9])', r'\\g<\1>', self.template)
+
+    def matches_service(self, service: Optional[str]) -> bool:
+        """True for rules offering the service (e.g. "E2U+sip", "sip", "E2U+sms")"""
+        if not service:
+            return True
+        wanted = service.lower()
+        if not wanted.startswith('e2u+'):
+            wanted = 'e2u+' + wanted
+        offered = self.services.lower()
+        # "E2U+pstn:tel" offers "E2U+pstn"; "E2U+sip" does not offer "E2U+si"
+        return offered == wanted or offered.startswith(wanted + ':')
+
+    def apply(self, aus: Optional[str]) -> Optional[str]:
+        """
+        Result URI for the AUS, or None if the regexp does not match.
+        Without an AUS the substitution template is returned unexpanded.
+        """
+        if self.regex is None:
+            # Non-terminal rule pointing at another domain
+            return None if self.replacement in ('', '.') else self.replacement
+        if aus is None:
+            return self.template
+        match = self.regex.search(aus)
+        if match is None:
+            return None
+        try:
+            return match.expand(self.substitution)
+        except (re.error, IndexError):
+            return None
+
+
+def split_regexp(regexp: str) -> Tuple[str, str, str]:
+    """Split <delim>ere<delim>repl<delim>flags, honouring escaped delimiters"""
+    if len(regexp) < 3:
+        raise NAPTRError(f"regexp too short: {regexp!r}")
+    delim = regexp[0]
+    if delim.isalnum() or delim == '\\':
+        raise NAPTRError(f"invalid regexp delimiter {delim!r}")
+
+    fields = []
+    current = []
+    i = 1
+    while i < len(regexp):
+        c = regexp[i]
+        if c == '\\' and i + 1 < len(regexp) and regexp[i + 1] == delim:
+            current.append(delim)
+            i += 2
+            continue
+        if c == delim and len(fields) < 2:
+            fields.append(''.join(current))
+            current = []
+        else:
+            current.append(c)
+        i += 1
+    if len(fields) != 2:
+        raise NAPTRError(f"regexp needs three {delim!r}-delimited fields: {regexp!r}")
+    return fields[0], fields[1], ''.join(current)
+
+
+def _tokenize(value: str) -> List[List[str]]:
+    """Split a value into entries of tokens (quoted strings are unquoted)"""
+    entries = [[]]
+    for quoted, separator, word in _TOKEN.findall(value):
+        if separator:
+            if entries[-1]:
+                entries.append([])
+        elif word:
+            entries[-1].append(word)
+        else:
+            entries[-1].append(quoted.replace('\\"', '"'))
+    return [tokens for tokens in entries if tokens]
+
+
+def _parse_entry(tokens: List[str], position: int) -> NAPTRRule:
+    head = [t.upper() for t in tokens[:2]]
+    if 'NAPTR' in head:
+        # [IN] NAPTR order preference flags services regexp replacement
+        fields = tokens[head.index('NAPTR') + 1:]
+        if len(fields) < 5:
+            raise NAPTRError(f"NAPTR entry needs order, preference, flags, services, regexp: {tokens}")
+        try:
+            order, preference = int(fields[0]), int(fields[1])
+        except ValueError as e:
+            raise NAPTRError(f"invalid order/preference in {tokens}") from e
+        replacement = fields[5] if len(fields) > 5 else '.'
+        return NAPTRRule(order, preference, fields[2], fields[3], fields[4], replacement)
+
+    # Simplified form: "!pattern!uri!flags" where the trailing field holds the
+    # NAPTR flags (u, v, ...), not regexp flags; order follows position
+    regexp = tokens[0]
+    _, _, flags = split_regexp(regexp)
+    regexp = regexp[:len(regexp) - len(flags)]
+    return NAPTRRule(position, DEFAULT_PREFERENCE, flags or 'u', DEFAULT_SERVICE, regexp)
+
+
+@lru_cache(maxsize=NAPTR_RULE_CACHE_SIZE)
+def compile_naptr(value: str) -> Tuple[NAPTRRule, ...]:
+    """
+    Parse an NVS value into rules sorted by (order, preference). Entries that
+    cannot be parsed are skipped. Cached by the raw value.
+    """
+    rules = []
+    for tokens in _tokenize(value or ''):
+        try:
+            rules.append(_parse_entry(tokens, len(rules)))
+        except NAPTRError:
+            continue
+    rules.sort(key=lambda rule: (rule.order, rule.preference))
+    return tuple(rules)
+
+
+def resolve_naptr(value: str, aus: Optional[str] = None,
+                  service: Optional[str] = None) -> List[Dict]:
+    """
+    NAPTR records for an NVS value, in order/preference order, filtered by
+    service and with each substitution applied to the AUS. Rules whose
+    regexp does not match the AUS are dropped.
+    """
+    records = []
+    for rule in compile_naptr(value):
+        if not rule.matches_service(service):
+            continue
+        uri = rule.apply(aus)
+        if uri is None:
+            continue
+        records.append({
+            'pattern': rule.pattern or '',
+            'replacement': uri,
+            'flags': rule.flags,
+            'service': rule.services,
+            'order': rule.order,
+            'preference': rule.preference
+        })
+    return records
+
+
+def cache_stats() -> Dict:
+    info = compile_naptr.cache_info()
+    return {
+        'size': info.currsize,
+        'max_entries': info.maxsize,
+        'hits': info.hits,
+        'misses': info.misses,
+    }
@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""
+Shared lookup cache for multi-process deployments
+A fixed-slot hash table of NVS records in a memory-mapped file (by default
+under /dev/shm), used by every worker process on the host behind its local
+LookupCache. One worker's name_show reply is visible to the others, and the
+table outlives worker restarts, so a redeploy starts warm.
+
+Each slot is guarded by a sequence number (a seqlock): a writer makes it odd,
+writes the slot, then makes it even again. Readers take no lock; a slot that
+changed while it was being copied reads as a miss. Writers serialize per
+bucket with a byte-range lock on the file.
+Records that do not fit in a slot are simply not shared.
+"""
+
+import hashlib
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'ENUMSHM1'
+# magic, slot count, slot size
+FILE_HEADER = struct.Struct('<8sII')
+FILE_HEADER_SIZE = 64
+
+# seq, key hash, deadline (wall clock), expiry height (-1 if unknown),
+# flags, key length, data length
+SLOT_HEADER = struct.Struct('<IQdqBxHI')
+SEQ = struct.Struct('<I')
+
+USED = 1
+NEGATIVE = 2
+
+# Slots per bucket; a key may live in any slot of its bucket
+WAYS = 4
+
+# Only the fields lookups use are shared
+RECORD_FIELDS = ('name', 'value', 'txid', 'address', 'expires_in', 'expires_at')
+
+
+class SharedRecordTable:
+    """Memory-mapped NVS record table shared by the worker processes of one host"""
+
+    def __init__(self, path: str, slots: int = 32768, slot_size: int = 1024):
+        self.path = path
+        self.slots = max(WAYS, slots - slots % WAYS)
+        self.slot_size = slot_size
+
+        self._fd: Optional[int] = None
+        self._map: Optional[mmap.mmap] = None
+        self._open_lock = threading.Lock()
+        # lockf locks belong to the process, so threads of one worker also
+        # need an in-process lock
+        self._write_lock = threading.Lock()
+        self.disabled = fcntl is None
+
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.oversize = 0
+
+    def _open(self) -> Optional[mmap.mmap]:
+        """Map the table file, creating it on first use; None if unavailable"""
+        if self._map is not None or self.disabled:
+            return self._map
+        with self._open_lock:
+            if self._map is not None or self.disabled:
+                return self._map
+            try:
+                self._map = self._map_file()
+            except OSError as e:
+                logger.warning(f"Shared lookup cache {self.path} unavailable: {e}")
+                self.disabled = True
+        return self._map
+
+    def _map_file(self) -> mmap.mmap:
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.lockf(fd, fcntl.LOCK_EX, FILE_HEADER_SIZE, 0)
+            try:
+                header = os.pread(fd, FILE_HEADER.size, 0)
+                if len(header) == FILE_HEADER.size and header.startswith(MAGIC):
+                    # Keep the layout of a table other workers may have mapped
+                    _, self.slots, self.slot_size = FILE_HEADER.unpack(header)
+                else:
+                    os.ftruncate(fd, 0)
+                    os.ftruncate(fd, FILE_HEADER_SIZE + self.slots * self.slot_size)
+                    os.pwrite(fd, FILE_HEADER.pack(MAGIC, self.slots, self.slot_size), 0)
+            finally:
+                fcntl.lockf(fd, fcntl.LOCK_UN, FILE_HEADER_SIZE, 0)
+            table = mmap.mmap(fd, FILE_HEADER_SIZE + self.slots * self.slot_size)
+        except OSError:
+            os.close(fd)
+            raise
+        self._fd = fd
+        return table
+
+    def _bucket(self, key: str) -> Tuple[bytes, int, int]:
+        """(key bytes, key hash, first slot of the bucket)"""
+        key_bytes = key.encode('utf-8')
+        # 0 marks an empty slot
+        key_hash = int.from_bytes(hashlib.blake2b(key_bytes, digest_size=8).digest(), 'little') or 1
+        return key_bytes, key_hash, key_hash % (self.slots // WAYS) * WAYS
+
+    def _offset(self, slot: int) -> int:
+        return FILE_HEADER_SIZE + slot * self.slot_size
+
+    def get(self, key: str) -> Optional[tuple]:
+        """
+        (record or None for "not found", deadline (time.time()), expiry
+        height or None, stamp) if the key is shared and unexpired, else None
+        """
+        table = self._open()
+        if table is None:
+            return None
+        key_bytes, key_hash, first = self._bucket(key)
+        for slot in range(first, first + WAYS):
+            offset = self._offset(slot)
+            seq, slot_hash, deadline, expires_at, flags, key_len, data_len = \
+                SLOT_HEADER.unpack_from(table, offset)
+            if seq & 1 or slot_hash != key_hash or not flags & USED:
+                continue
+            start = offset + SLOT_HEADER.size
+            if SLOT_HEADER.size + key_len + data_len > self.slot_size:
+                continue
+            payload = table[start:start + key_len + data_len]
+            if SEQ.unpack_from(table, offset)[0] != seq or payload[:key_len] != key_bytes:
+                continue
+            if deadline <= time.time():
+                break
+            record = None
+            if not flags & NEGATIVE:
+                try:
+                    record = json.loads(payload[key_len:])
+                except ValueError:
+                    break
+            self.hits += 1
+            return record, deadline, expires_at if expires_at >= 0 else None, (slot, seq)
+        self.misses += 1
+        return None
+
+    def is_current(self, stamp: tuple) -> bool:
+        """True while the slot a record was read from or written to is unchanged"""
+        slot, seq = stamp
+        return SEQ.unpack_from(self._map, self._offset(slot))[0] == seq
+
+    def put(self, key: str, record: Optional[Dict], deadline: float,
+            expires_at: Optional[int]) -> Optional[tuple]:
+        """Share a record (None for "not found"); returns its stamp, or None if not shared"""
+        table = self._open()
+        if table is None:
+            return None
+        key_bytes, key_hash, first = self._bucket(key)
+        data = b''
+        flags = USED
+        if record is None:
+            flags |= NEGATIVE
+        else:
+            data = json.dumps({k: record[k] for k in RECORD_FIELDS if k in record},
+                              separators=(',', ':')).encode('utf-8')
+        if SLOT_HEADER.size + len(key_bytes) + len(data) > self.slot_size:
+            self.oversize += 1
+            return None
+
+        with self._locked(first):
+            now = time.time()
+            victim = victim_rank = None
+            for slot in range(first, first + WAYS):
+                _, slot_hash, slot_deadline, _, slot_flags, _, _ = \
+                    SLOT_HEADER.unpack_from(table, self._offset(slot))
+                if slot_hash == key_hash and slot_flags & USED:
+                    victim = slot
+                    break
+                # Prefer an empty or expired slot, else the one expiring first
+                rank = slot_deadline if slot_flags & USED and slot_deadline > now else 0.0
+                if victim_rank is None or rank < victim_rank:
+                    victim, victim_rank = slot, rank
+            seq = self._write(victim, key_hash, deadline,
+                              -1 if expires_at is None else expires_at, flags, key_bytes, data)
+        self.writes += 1
+        return victim, seq
+
+    def invalidate(self, key: str):
+        """Remove a key from the table"""
+        table = self._open()
+        if table is None:
+            return
+        key_bytes, key_hash, first = self._bucket(key)
+        with self._locked(first):
+            for slot in range(first, first + WAYS):
+                offset = self._offset(slot)
+                _, slot_hash, _, _, flags, key_len, _ = SLOT_HEADER.unpack_from(table, offset)
+                start = offset + SLOT_HEADER.size
+                if slot_hash == key_hash and flags & USED and table[start:start + key_len] == key_bytes:
+                    self._write(slot, 0, 0.0, -1, 0, b'', b'')
+
+    @contextmanager
+    def _locked(self, first: int):
+        """Exclusive lock on the bucket starting at slot `first`"""
+        offset, length = self._offset(first), WAYS * self.slot_size
+        with self._write_lock:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX, length, offset)
+            try:
+                yield
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN, length, offset)
+
+    def _write(self, slot: int, key_hash: int, deadline: float, expires_at: int, flags: int,
+               key_bytes: bytes, data: bytes) -> int:
+        """Seqlock-protected slot write; returns the new (even) sequence number"""
+        table = self._map
+        offset = self._offset(slot)
+        seq = (SEQ.unpack_from(table, offset)[0] | 1) & 0xFFFFFFFF
+        SEQ.pack_into(table, offset, seq)
+        SLOT_HEADER.pack_into(table, offset, seq, key_hash, deadline, expires_at, flags,
+                              len(key_bytes), len(data))
+        start = offset + SLOT_HEADER.size
+        table[start:start + len(key_bytes) + len(data)] = key_bytes + data
+        seq = (seq + 1) & 0xFFFFFFFF
+        SEQ.pack_into(table, offset, seq)
+        return seq
+
+    def stats(self) -> Dict:
+        """Counters of this worker process"""
+        lookups = self.hits + self.misses
+        return {
+            'path': self.path,
+            'enabled': self._map is not None,
+            'slots': self.slots,
+            'slot_size': self.slot_size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'writes': self.writes,
+            'oversize': self.oversize,
+            'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Digit trie of registered ENUM numbers
+Answers "which is the longest registered prefix of this number" in
+O(number of digits) without touching the node, so operators can delegate a
+whole number block (e.g. +1415555) to one gateway with a single enum: name.
+Nodes live in flat arrays: ten child slots per node plus a terminal flag.
+"""
+
+import threading
+from array import array
+from typing import Dict, Iterable, Optional
+
+E164_SUFFIX = ".e164.arpa"
+
+
+def name_to_digits(name: str, prefix: str = "enum:") -> Optional[str]:
+    """E.164 digits for an enum: NVS name, or None if it is not a number"""
+    if not name.startswith(prefix) or not name.endswith(E164_SUFFIX):
+        return None
+    labels = name[len(prefix):-len(E164_SUFFIX)].split('.')
+    if not all(len(label) == 1 and label.isdigit() for label in labels):
+        return None
+    return ''.join(reversed(labels))
+
+
+class DigitTrie:
+    """Array-backed trie over decimal digits; node 0 is the root"""
+
+    def __init__(self, prefix: str = "enum:"):
+        self.prefix = prefix
+        # children[node * 10 + digit] -> child node, 0 for none (root is never a child)
+        self._children = array('I', [0] * 10)
+        self._terminal = bytearray(1)
+        self._lock = threading.Lock()
+        self.count = 0
+
+    @classmethod
+    def build(cls, records: Iterable[Dict], prefix: str = "enum:") -> 'DigitTrie':
+        """Build a trie from name_filter / ENUMIndex records"""
+        trie = cls(prefix)
+        for record in records:
+            trie.add_name(record.get('name', ''))
+        return trie
+
+    def _walk(self, digits: str, create: bool) -> Optional[int]:
+        children = self._children
+        node = 0
+        for d in digits:
+            slot = node * 10 + ord(d) - 48
+            child = children[slot]
+            if not child:
+                if not create:
+                    return None
+                child = len(self._terminal)
+                children.extend([0] * 10)
+                self._terminal.append(0)
+                children[slot] = child
+            node = child
+        return node
+
+    def add(self, digits: str):
+        """Mark a digit string as registered"""
+        with self._lock:
+            node = self._walk(digits, create=True)
+            if not self._terminal[node]:
+                self._terminal[node] = 1
+                self.count += 1
+
+    def remove(self, digits: str):
+        """Unmark a digit string (nodes are kept; the next rebuild compacts)"""
+        with self._lock:
+            node = self._walk(digits, create=False)
+            if node is not None and self._terminal[node]:
+                self._terminal[node] = 0
+                self.count -= 1
+
+    def add_name(self, name: str) -> bool:
+        digits = name_to_digits(name, self.prefix)
+        if digits is None:
+            return False
+        self.add(digits)
+        return True
+
+    def remove_name(self, name: str):
+        digits = name_to_digits(name, self.prefix)
+        if digits is not None:
+            self.remove(digits)
+
+    def longest_prefix(self, digits: str) -> Optional[str]:
+        """Longest registered prefix of the digit string, or None"""
+        children = self._children
+        terminal = self._terminal
+        node = 0
+        best = 0 if terminal[0] else -1
+        for i, d in enumerate(digits):
+            if not '0' <= d <= '9':
+                return None
+            node = children[node * 10 + ord(d) - 48]
+            if not node:
+                break
+            if terminal[node]:
+                best = i + 1
+        return digits[:best] if best > 0 else None
+
+    def memory_bytes(self) -> int:
+        """Bytes held by the node arrays"""
+        return (self._children.buffer_info()[1] * self._children.itemsize
+                + len(self._terminal))
+
+    def stats(self) -> Dict:
+        return {
+            'numbers': self.count,
+            'nodes': len(self._terminal),
+            'memory_bytes': self.memory_bytes(),
+        }
@@ -53,11 +53,13 @@ apt install -y python3 python3-pip python3-venv nginx git
 echo -e "${YELLOW}[4/8] Creating installation directory...${NC}"
 mkdir -p $INSTALL_DIR
 mkdir -p $INSTALL_DIR/logs
+mkdir -p $INSTALL_DIR/data
 chown -R pi:pi $INSTALL_DIR
 
 # Copy files
 echo -e "${YELLOW}[5/8] Copying application files...${NC}"
-cp enum_backend.py $INSTALL_DIR/
+cp enum_backend.py emercoin_rpc.py enum_cache.py enum_index.py enum_feed.py enum_shm.py enum_trie.py enum_naptr.py enum_asgi.py enum_chain.py enum_metrics.py enum_jobs.py enum_import.py enum_dns.py $INSTALL_DIR/
+cp ../tools/ptool_conf.py $INSTALL_DIR/ 2>/dev/null || true
 cp requirements.txt $INSTALL_DIR/
 chown -R pi:pi $INSTALL_DIR
 
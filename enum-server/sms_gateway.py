@@ -6,10 +6,27 @@ Supports Telnyx, Bandwidth, and custom mobile gateways
 
 import requests
 import json
+import hmac
 import logging
+import argparse
+import atexit
+import signal
+import sys
+import time
 from typing import Optional, Dict, List
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from datetime import datetime
+from string import Template
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+from urllib3.util.retry import Retry
+from sms_queue import SMSQueue, GatewayLimit
+from sms_ingest import IngestLog, IngestFull
+from sms_inbox import InboxStore, check_token, number_token
+from sms_routing import (
+    GatewayHealth, rank, REGISTRY as ROUTING_METRICS, ROUTE_DECISIONS, GATEWAY_REQUESTS, GATEWAY_LATENCY
+)
+from enum_metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE
 
 logger = logging.getLogger(__name__)
 
@@ -20,9 +37,120 @@ BANDWIDTH_API_USER = "YOUR_BANDWIDTH_USER"
 BANDWIDTH_API_TOKEN = "YOUR_BANDWIDTH_TOKEN"
 BANDWIDTH_API_BASE = "https://messaging.bandwidth.com/api/v2"
 
+# Provider HTTP clients: keep-alive connections per gateway, timeouts
+# (seconds) and retries with exponential backoff
+SMS_HTTP_POOL_SIZE = 10
+SMS_CONNECT_TIMEOUT = 3.05
+SMS_READ_TIMEOUT = 10
+SMS_HTTP_RETRIES = 3
+SMS_RETRY_BACKOFF = 0.5
+
+# Per-gateway send limits applied by the outbound queue (messages per
+# second, bucket size, concurrent requests)
+SMS_GATEWAY_RATE = 10.0
+SMS_GATEWAY_BURST = 20
+SMS_GATEWAY_CONCURRENCY = 4
+
+# Outbound queue; /sms/send sends inline when it is not started
+SMS_QUEUE_PATH = "/home/pi/enum-server/data/sms_queue.sqlite"
+SMS_QUEUE_WORKERS = 8
+
+# Recipients per /sms/send/batch request
+SMS_BATCH_MAX = 10000
+
+# Inbound webhook log; /sms/webhook processes inline when it is not started
+SMS_INGEST_PATH = "/home/pi/enum-server/data/sms_ingest.sqlite"
+SMS_INGEST_WORKERS = 4
+SMS_WEBHOOK_MAX_BYTES = 64 * 1024
+
+# Received messages, kept for clients that were offline (seconds)
+SMS_INBOX_PATH = "/home/pi/enum-server/data/sms_inbox.sqlite"
+SMS_INBOX_RETENTION = 7 * 86400
+SMS_INBOX_WAIT_MAX = 60
+# Secret the per-number read tokens are derived from (see sms_inbox);
+# /sms/inbox reads are refused while it is empty
+SMS_INBOX_SECRET = ""
+
+# Provider answers meaning the message was not taken and may be sent again
+RETRYABLE_STATUS = (429, 503)
+
+
+def make_session(pool_size: int = SMS_HTTP_POOL_SIZE, retries: int = SMS_HTTP_RETRIES,
+                 backoff: float = SMS_RETRY_BACKOFF) -> requests.Session:
+    """
+    requests.Session with a keep-alive connection pool and retries. Sending
+    an SMS is not idempotent, so POSTs are only retried when the connection
+    failed before the request went out; GETs are also retried on read
+    errors and on 429 / 5xx answers (honouring Retry-After).
+    """
+    retry = Retry(
+        total=retries,
+        connect=retries,
+        read=retries,
+        status=retries,
+        backoff_factor=backoff,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=frozenset(["GET", "HEAD"]),
+        respect_retry_after_header=True,
+        raise_on_status=False
+    )
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def send_failure(error: requests.exceptions.RequestException) -> Dict:
+    """
+    Result of a failed send. "retryable" is only set when the provider
+    certainly did not take the message: it could not be reached, or it
+    answered 429 / 503. A read timeout may follow a delivered message.
+    """
+    result = {"success": False, "error": str(error), "retryable": False}
+    response = getattr(error, "response", None)
+    if isinstance(error, requests.exceptions.HTTPError) and response is not None:
+        result["status_code"] = response.status_code
+        result["retryable"] = response.status_code in RETRYABLE_STATUS
+        retry_after = response.headers.get("Retry-After", "")
+        if retry_after.isdigit():
+            result["retry_after"] = int(retry_after)
+    elif isinstance(error, requests.exceptions.ConnectTimeout):
+        result["retryable"] = True
+    elif isinstance(error, requests.exceptions.ConnectionError) and error.args:
+        result["retryable"] = isinstance(getattr(error.args[0], "reason", None), NewConnectionError)
+    return result
+
+
+def gateway_fault(result: Dict) -> bool:
+    """
+    True if a failed send counts against the gateway's health: no answer or
+    a 5xx. A 429 means we sent too fast (the queue's token bucket backs off)
+    and a 4xx that the request was rejected.
+    """
+    status = result.get("status_code")
+    return status is None or status >= 500
+
+
 class SMSGateway:
     """Base SMS gateway interface"""
     
+    # Default send limits when queued (see SMSManager.add_gateway)
+    rate_limit = SMS_GATEWAY_RATE
+    burst = SMS_GATEWAY_BURST
+    max_concurrency = SMS_GATEWAY_CONCURRENCY
+    
+    def __init__(self, pool_size: int = SMS_HTTP_POOL_SIZE, connect_timeout: float = SMS_CONNECT_TIMEOUT,
+                 read_timeout: float = SMS_READ_TIMEOUT, retries: int = SMS_HTTP_RETRIES,
+                 backoff: float = SMS_RETRY_BACKOFF):
+        # Reused for every call, so messages after the first skip the TCP/TLS handshake
+        self.session = make_session(pool_size, retries, backoff)
+        self.timeout = (connect_timeout, read_timeout)
+    
+    def close(self):
+        """Close the gateway's pooled connections"""
+        self.session.close()
+    
     def send_sms(self, from_number: str, to_number: str, message: str) -> Dict:
         raise NotImplementedError
     
@@ -33,12 +161,14 @@ class SMSGateway:
 class TelnyxGateway(SMSGateway):
     """Telnyx SMS gateway (real mobile numbers)"""
     
-    def __init__(self, api_key: str):
+    def __init__(self, api_key: str, **http_options):
+        super().__init__(**http_options)
         self.api_key = api_key
         self.headers = {
             "Authorization": f"Bearer {api_key}",
             "Content-Type": "application/json"
         }
+        self.session.headers.update(self.headers)
     
     def send_sms(self, from_number: str, to_number: str, message: str) -> Dict:
         """Send SMS via Telnyx"""
@@ -52,7 +182,7 @@ class TelnyxGateway(SMSGateway):
         }
         
         try:
-            response = requests.post(url, headers=self.headers, json=payload, timeout=10)
+            response = self.session.post(url, json=payload, timeout=self.timeout)
             response.raise_for_status()
             
             result = response.json()
@@ -64,17 +194,14 @@ class TelnyxGateway(SMSGateway):
             }
         except requests.exceptions.RequestException as e:
             logger.error(f"Telnyx SMS error: {e}")
-            return {
-                "success": False,
-                "error": str(e)
-            }
+            return send_failure(e)
     
     def get_sms_status(self, message_id: str) -> Dict:
         """Get SMS delivery status"""
         url = f"{TELNYX_API_BASE}/messages/{message_id}"
         
         try:
-            response = requests.get(url, headers=self.headers, timeout=10)
+            response = self.session.get(url, timeout=self.timeout)
             response.raise_for_status()
             
             result = response.json()
@@ -104,7 +231,7 @@ class TelnyxGateway(SMSGateway):
         
         try:
             # Search available numbers
-            response = requests.get(url, headers=self.headers, params=params, timeout=10)
+            response = self.session.get(url, params=params, timeout=self.timeout)
             response.raise_for_status()
             
             available = response.json()["data"]
@@ -119,11 +246,10 @@ class TelnyxGateway(SMSGateway):
                 "phone_number": phone_number
             }
             
-            purchase_response = requests.post(
+            purchase_response = self.session.post(
                 purchase_url,
-                headers=self.headers,
                 json=purchase_payload,
-                timeout=10
+                timeout=self.timeout
             )
             purchase_response.raise_for_status()
             
@@ -140,11 +266,13 @@ class TelnyxGateway(SMSGateway):
 class BandwidthGateway(SMSGateway):
     """Bandwidth.com SMS gateway (tier-1 carrier)"""
     
-    def __init__(self, user_id: str, api_token: str, account_id: str):
+    def __init__(self, user_id: str, api_token: str, account_id: str, **http_options):
+        super().__init__(**http_options)
         self.user_id = user_id
         self.api_token = api_token
         self.account_id = account_id
         self.auth = (user_id, api_token)
+        self.session.auth = self.auth
     
     def send_sms(self, from_number: str, to_number: str, message: str) -> Dict:
         """Send SMS via Bandwidth"""
@@ -158,7 +286,7 @@ class BandwidthGateway(SMSGateway):
         }
         
         try:
-            response = requests.post(url, auth=self.auth, json=payload, timeout=10)
+            response = self.session.post(url, json=payload, timeout=self.timeout)
             response.raise_for_status()
             
             result = response.json()
@@ -169,10 +297,7 @@ class BandwidthGateway(SMSGateway):
             }
         except requests.exceptions.RequestException as e:
             logger.error(f"Bandwidth SMS error: {e}")
-            return {
-                "success": False,
-                "error": str(e)
-            }
+            return send_failure(e)
     
     def get_sms_status(self, message_id: str) -> Dict:
         """Get SMS delivery status"""
@@ -187,9 +312,18 @@ class BandwidthGateway(SMSGateway):
 class AndroidSMSGateway(SMSGateway):
     """Forward SMS via Android device with real SIM"""
     
-    def __init__(self, gateway_url: str, api_key: str):
+    # A phone sends one message at a time
+    rate_limit = 1.0
+    burst = 5
+    max_concurrency = 1
+    
+    def __init__(self, gateway_url: str, api_key: str, phone_number: str = None, **http_options):
+        super().__init__(**http_options)
         self.gateway_url = gateway_url
         self.api_key = api_key
+        # The phone's own number; its webhooks do not carry it
+        self.phone_number = phone_number
+        self.session.headers["Authorization"] = f"Bearer {api_key}"
     
     def send_sms(self, from_number: str, to_number: str, message: str) -> Dict:
         """
@@ -203,13 +337,8 @@ class AndroidSMSGateway(SMSGateway):
             "phoneNumbers": [to_number]
         }
         
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json"
-        }
-        
         try:
-            response = requests.post(url, headers=headers, json=payload, timeout=10)
+            response = self.session.post(url, json=payload, timeout=self.timeout)
             response.raise_for_status()
             
             result = response.json()
@@ -220,21 +349,14 @@ class AndroidSMSGateway(SMSGateway):
             }
         except requests.exceptions.RequestException as e:
             logger.error(f"Android gateway SMS error: {e}")
-            return {
-                "success": False,
-                "error": str(e)
-            }
+            return send_failure(e)
     
     def get_sms_status(self, message_id: str) -> Dict:
         """Get SMS status from Android gateway"""
         url = f"{self.gateway_url}/message/{message_id}"
         
-        headers = {
-            "Authorization": f"Bearer {self.api_key}"
-        }
-        
         try:
-            response = requests.get(url, headers=headers, timeout=10)
+            response = self.session.get(url, timeout=self.timeout)
             response.raise_for_status()
             
             result = response.json()
@@ -253,28 +375,119 @@ class AndroidSMSGateway(SMSGateway):
 class SMSManager:
     """Manage SMS across multiple gateways"""
     
+    # Providers whose incoming SMS webhooks receive_sms_webhook parses
+    WEBHOOK_PROVIDERS = ("telnyx", "bandwidth", "android")
+    
     def __init__(self):
         self.gateways = {}
+        self.limits = {}
+        self.health = {}
     
-    def add_gateway(self, name: str, gateway: SMSGateway):
-        """Register SMS gateway"""
+    def add_gateway(self, name: str, gateway: SMSGateway, rate: float = None,
+                    burst: float = None, concurrency: int = None, weight: float = 1.0):
+        """
+        Register SMS gateway; rate / burst / concurrency override its default
+        send limits, weight > 1 favours it in routing
+        """
+        self.limits[name] = GatewayLimit(
+            gateway.rate_limit if rate is None else rate,
+            gateway.burst if burst is None else burst,
+            gateway.max_concurrency if concurrency is None else concurrency
+        )
+        self.health[name] = GatewayHealth(name, weight)
         self.gateways[name] = gateway
     
+    def candidates(self, preferred_gateway: str = None) -> List[str]:
+        """Gateways a send may go to, best first; those with an open circuit are left out"""
+        return rank(self.health, preferred_gateway)
+    
+    def route_reason(self, name: str, position: int, preferred_gateway: str = None,
+                     failover: bool = False) -> str:
+        """Why `name` was chosen, for the routing metrics; counts the decision"""
+        if failover:
+            reason = "failover"
+        elif self.health[name].probe_due():
+            reason = "probe"
+        elif name == preferred_gateway:
+            reason = "preferred"
+        else:
+            reason = "least_latency" if position == 0 else "capacity"
+        ROUTE_DECISIONS.inc(name, reason)
+        return reason
+    
+    def dispatch(self, name: str, from_number: str, to_number: str, message: str) -> Dict:
+        """Send through gateway `name`, recording latency and outcome in its health"""
+        health = self.health[name]
+        probe = health.begin()
+        if probe is None:
+            return {"success": False, "error": f"Gateway {name} circuit is open", "retryable": True}
+        
+        started = time.perf_counter()
+        try:
+            result = self.gateways[name].send_sms(from_number, to_number, message)
+        except Exception as e:
+            logger.error(f"SMS gateway {name} failed: {e}")
+            result = {"success": False, "error": str(e)}
+        seconds = time.perf_counter() - started
+        
+        fault = not result.get("success") and gateway_fault(result)
+        health.end(not fault, seconds if result.get("success") else None, probe)
+        GATEWAY_LATENCY.observe(seconds, name)
+        if result.get("success"):
+            outcome = "ok"
+        elif fault:
+            outcome = "gateway_error"
+        else:
+            outcome = "throttled" if result.get("status_code") == 429 else "rejected"
+        GATEWAY_REQUESTS.inc(name, outcome)
+        result["gateway"] = name
+        return result
+    
     def send_sms(self, from_number: str, to_number: str, message: str, 
                  preferred_gateway: str = None) -> Dict:
-        """Send SMS via specified or default gateway"""
+        """
+        Send SMS via the preferred gateway if healthy, else the healthy one
+        with the lowest expected latency. Fails over to the next gateway
+        while the message was certainly not taken.
+        """
         
-        if preferred_gateway and preferred_gateway in self.gateways:
-            gateway = self.gateways[preferred_gateway]
-        elif self.gateways:
-            gateway = list(self.gateways.values())[0]
-        else:
+        if not self.gateways:
             return {
                 "success": False,
                 "error": "No SMS gateway configured"
             }
         
-        return gateway.send_sms(from_number, to_number, message)
+        candidates = self.candidates(preferred_gateway)
+        if not candidates:
+            return {
+                "success": False,
+                "error": "No healthy SMS gateway (all circuits open)",
+                "retryable": True
+            }
+        
+        for position, name in enumerate(candidates):
+            self.route_reason(name, position, preferred_gateway, failover=position > 0)
+            result = self.dispatch(name, from_number, to_number, message)
+            if result["success"] or not result.get("retryable"):
+                break
+            logger.warning(f"SMS via {name} not accepted ({result.get('error')}), trying the next gateway")
+        return result
+    
+    def routing_stats(self) -> Dict:
+        return {name: dict(self.limits[name].stats(), **self.health[name].stats()) for name in self.gateways}
+    
+    def webhook_message_id(self, payload: Dict, provider: str) -> Optional[str]:
+        """Provider's id of an incoming message, to drop redelivered webhooks"""
+        try:
+            if provider == "telnyx":
+                return payload["data"]["payload"]["id"]
+            elif provider == "bandwidth":
+                return payload["message"]["id"]
+            elif provider == "android":
+                return payload.get("messageId") or payload["id"]
+        except (KeyError, TypeError):
+            pass
+        return None
     
     def receive_sms_webhook(self, payload: Dict, provider: str) -> Dict:
         """Process incoming SMS webhook"""
@@ -323,13 +536,22 @@ class SMSManager:
             logger.error(f"Bandwidth webhook parse error: {e}")
             return {"success": False, "error": "Invalid webhook format"}
     
+    def _android_number(self) -> str:
+        """
+        Recipient of an Android webhook, which does not say: the
+        phone_number of the Android gateway if exactly one is configured
+        """
+        numbers = {gw.phone_number for gw in self.gateways.values()
+                   if isinstance(gw, AndroidSMSGateway) and gw.phone_number}
+        return numbers.pop() if len(numbers) == 1 else "local_number"
+    
     def _process_android_webhook(self, payload: Dict) -> Dict:
         """Process Android SMS Gateway webhook"""
         try:
             return {
                 "success": True,
                 "from": payload["phoneNumber"],
-                "to": "local_number",  # Android gateway doesn't provide "to"
+                "to": self._android_number(),
                 "message": payload["message"],
                 "timestamp": payload["receivedAt"],
                 "provider": "android"
@@ -342,6 +564,51 @@ class SMSManager:
 # Flask routes for SMS integration
 app = Flask(__name__)
 sms_manager = SMSManager()
+sms_queue: Optional[SMSQueue] = None
+sms_ingest: Optional[IngestLog] = None
+sms_inbox: Optional[InboxStore] = None
+
+
+def start_queue(path: str = SMS_QUEUE_PATH, workers: int = SMS_QUEUE_WORKERS) -> SMSQueue:
+    """Open the outbound queue and send its messages from background workers"""
+    global sms_queue
+    sms_queue = SMSQueue(path, sms_manager, workers=workers)
+    sms_queue.start()
+    atexit.register(sms_queue.stop)
+    return sms_queue
+
+
+def handle_inbound_sms(provider: str, payload: Dict) -> Dict:
+    """Parse a received webhook and hand the message on"""
+    result = sms_manager.receive_sms_webhook(payload, provider)
+    
+    if result["success"]:
+        result["message_id"] = sms_manager.webhook_message_id(payload, provider)
+        if sms_inbox is not None:
+            # Clients read it from /sms/inbox, or are woken if long-polling
+            result["seq"] = sms_inbox.add(result)
+        logger.debug(f"SMS received from {result['from']} for {result['to']}")
+    
+    return result
+
+
+def start_inbox(path: str = SMS_INBOX_PATH, retention: float = SMS_INBOX_RETENTION) -> InboxStore:
+    """Open the inbound message store and prune it in the background"""
+    global sms_inbox
+    sms_inbox = InboxStore(path, retention=retention)
+    sms_inbox.start()
+    atexit.register(sms_inbox.stop)
+    return sms_inbox
+
+
+def start_ingest(path: str = SMS_INGEST_PATH, workers: int = SMS_INGEST_WORKERS) -> IngestLog:
+    """Open the inbound webhook log and process it from background workers"""
+    global sms_ingest
+    sms_ingest = IngestLog(path, handle_inbound_sms, workers=workers)
+    sms_ingest.start()
+    atexit.register(sms_ingest.stop)
+    return sms_ingest
+
 
 # Initialize gateways (configure with your credentials)
 # telnyx_gw = TelnyxGateway(TELNYX_API_KEY)
@@ -357,14 +624,34 @@ def send_sms():
         "message": "Your code is 123456",
         "gateway": "telnyx"  # optional
     }
+    With the queue running, answers 202 with the message id; an
+    Idempotency-Key header makes retried requests return the same message.
     """
-    data = request.get_json()
+    data = request.get_json(silent=True)
     
     if not data or not all(k in data for k in ["from", "to", "message"]):
         return jsonify({
             "error": "Missing required fields: from, to, message"
         }), 400
     
+    if sms_queue is not None:
+        message, created = sms_queue.submit(
+            data["from"],
+            data["to"],
+            data["message"],
+            data.get("gateway"),
+            request.headers.get("Idempotency-Key")
+        )
+        status_url = f"/sms/messages/{message['id']}"
+        response = jsonify({
+            "success": True,
+            "id": message["id"],
+            "state": message["state"],
+            "status_url": status_url
+        })
+        response.headers["Location"] = status_url
+        return response, 202 if created else 200
+    
     result = sms_manager.send_sms(
         data["from"],
         data["to"],
@@ -378,6 +665,24 @@ def send_sms():
         return jsonify(result), 500
 
 
+def read_webhook_body() -> Optional[bytes]:
+    """
+    The request body, or None if it is larger than SMS_WEBHOOK_MAX_BYTES.
+    Counts the bytes read, so chunked bodies without a Content-Length are
+    capped too.
+    """
+    if (request.content_length or 0) > SMS_WEBHOOK_MAX_BYTES:
+        return None
+    chunks, size = [], 0
+    while size <= SMS_WEBHOOK_MAX_BYTES:
+        chunk = request.stream.read(SMS_WEBHOOK_MAX_BYTES + 1 - size)
+        if not chunk:
+            return b''.join(chunks)
+        chunks.append(chunk)
+        size += len(chunk)
+    return None
+
+
 @app.route('/sms/webhook/<provider>', methods=['POST'])
 def receive_sms_webhook(provider: str):
     """
@@ -386,25 +691,303 @@ def receive_sms_webhook(provider: str):
     - Telnyx: https://your-domain.com/sms/webhook/telnyx
     - Bandwidth: https://your-domain.com/sms/webhook/bandwidth
     - Android: https://your-domain.com/sms/webhook/android
+    With the ingest log running, the raw body is stored and acknowledged
+    at once; workers parse it later. Redeliveries answer "duplicate".
     """
-    payload = request.get_json()
+    if provider not in SMSManager.WEBHOOK_PROVIDERS:
+        return jsonify({"success": False, "error": f"Unknown provider: {provider}"}), 400
     
-    result = sms_manager.receive_sms_webhook(payload, provider)
+    body = read_webhook_body()
+    if body is None:
+        return jsonify({"success": False, "error": "Webhook body too large"}), 413
     
-    if result["success"]:
-        # Forward to application logic (e.g., store in database, notify user)
-        logger.info(f"SMS received from {result['from']}: {result['message']}")
-        
-        # TODO: Integrate with your application
-        # - Store in database
-        # - Send to user's connected devices
-        # - Trigger notifications
+    try:
+        payload = json.loads(body) if request.is_json else None
+    except ValueError:
+        payload = None
+    if not isinstance(payload, dict):
+        return jsonify({"success": False, "error": "Invalid webhook format"}), 400
+    
+    if sms_ingest is not None:
+        try:
+            stored = sms_ingest.append(provider, body, sms_manager.webhook_message_id(payload, provider))
+        except IngestFull as e:
+            logger.warning(f"Refused {provider} webhook: {e}")
+            response = jsonify({"success": False, "error": "Too many webhooks waiting"})
+            response.headers["Retry-After"] = "30"
+            return response, 503
         
+        return jsonify({"status": "received" if stored else "duplicate"}), 200
+    
+    result = handle_inbound_sms(provider, payload)
+    
+    if result["success"]:
         return jsonify({"status": "received"}), 200
     else:
         return jsonify(result), 400
 
 
+def build_batch(data: Dict) -> tuple:
+    """
+    (to_number, text) per recipient of a /sms/send/batch body, and an
+    error message or None
+    """
+    shared = data.get("message")
+    template = Template(shared) if isinstance(shared, str) and "$" in shared else None
+    messages = []
+    for i, recipient in enumerate(data["recipients"]):
+        if isinstance(recipient, str):
+            recipient = {"to": recipient}
+        if not isinstance(recipient, dict) or not isinstance(recipient.get("to"), str):
+            return None, f"recipients[{i}]: expected a number or an object with \"to\""
+        text = recipient.get("message")
+        if text is None:
+            if not isinstance(shared, str):
+                return None, f"recipients[{i}]: no message and no shared message"
+            text = shared
+            if template is not None:
+                try:
+                    text = template.substitute(recipient.get("vars") or {})
+                except (KeyError, ValueError, TypeError) as e:
+                    return None, f"recipients[{i}]: cannot fill the message template ({e!r})"
+        messages.append((recipient["to"], str(text)))
+    return messages, None
+
+
+@app.route('/sms/send/batch', methods=['POST'])
+def send_sms_batch():
+    """
+    Send one message per recipient, spread over all gateways by capacity
+    Body: {
+        "from": "+1234567890",
+        "message": "Power is back at $site",  # shared text, $names filled from "vars"
+        "recipients": [
+            "+0987654321",
+            {"to": "+0987654322", "vars": {"site": "Block B"}},
+            {"to": "+0987654323", "message": "Own text"}
+        ],
+        "gateway": "telnyx"  # optional, otherwise any gateway
+    }
+    Answers 202 with a batch id; with ?stream=1 answers with one JSON line
+    per recipient as its message is sent or fails (application/x-ndjson).
+    """
+    if sms_queue is None:
+        return jsonify({
+            "error": "Batch sending needs the outbound queue (started with --sync-send)"
+        }), 503
+    
+    data = request.get_json(silent=True)
+    
+    if not data or "from" not in data or not isinstance(data.get("recipients"), list):
+        return jsonify({
+            "error": "Missing required fields: from, recipients"
+        }), 400
+    
+    if len(data["recipients"]) > SMS_BATCH_MAX:
+        return jsonify({
+            "error": f"At most {SMS_BATCH_MAX} recipients per batch"
+        }), 413
+    
+    messages, error = build_batch(data)
+    if error:
+        return jsonify({"error": error}), 400
+    
+    batch, created = sms_queue.submit_batch(
+        data["from"],
+        messages,
+        data.get("gateway"),
+        request.headers.get("Idempotency-Key")
+    )
+    status_url = f"/sms/send/batch/{batch['id']}"
+    
+    if request.args.get("stream") in ("1", "true"):
+        def stream():
+            yield json.dumps({"batch_id": batch["id"], "count": batch["count"]}) + "\n"
+            for result in sms_queue.follow_batch(batch["id"]):
+                yield json.dumps(result) + "\n"
+            yield json.dumps({"batch_id": batch["id"], "done": True,
+                              "states": sms_queue.batch(batch["id"])["states"]}) + "\n"
+        
+        return Response(stream(), mimetype="application/x-ndjson", headers={"Location": status_url})
+    
+    response = jsonify({
+        "success": True,
+        "batch_id": batch["id"],
+        "count": batch["count"],
+        "status_url": status_url
+    })
+    response.headers["Location"] = status_url
+    return response, 202 if created else 200
+
+
+@app.route('/sms/send/batch/<batch_id>', methods=['GET'])
+def get_sms_batch(batch_id: str):
+    """Progress of a batch and a page of its per-recipient results (?offset=&limit=)"""
+    if sms_queue is None:
+        return jsonify({"error": "Outbound queue not enabled"}), 404
+    
+    batch = sms_queue.batch(batch_id)
+    if batch is None:
+        return jsonify({"error": f"Batch {batch_id} not found"}), 404
+    
+    try:
+        offset = max(0, int(request.args.get("offset", 0)))
+        limit = min(1000, max(1, int(request.args.get("limit", 100))))
+    except ValueError:
+        return jsonify({"error": "offset and limit must be integers"}), 400
+    
+    batch["results"] = sms_queue.batch_results(batch_id, offset, limit)
+    return jsonify(batch), 200
+
+
+@app.route('/sms/messages/<message_id>', methods=['GET'])
+def get_queued_sms(message_id: str):
+    """State of a message accepted by /sms/send"""
+    if sms_queue is None:
+        return jsonify({"error": "Outbound queue not enabled"}), 404
+    
+    message = sms_queue.get(message_id)
+    if message is None:
+        return jsonify({"error": f"Message {message_id} not found"}), 404
+    
+    message.pop("client_key")
+    return jsonify(message), 200
+
+
+@app.route('/sms/queue', methods=['GET'])
+def queue_stats():
+    """Outbound queue depth, throughput and per-gateway limits"""
+    if sms_queue is None:
+        return jsonify({"enabled": False}), 200
+    
+    return jsonify(dict(sms_queue.stats(), enabled=True)), 200
+
+
+@app.route('/sms/ingest', methods=['GET'])
+def ingest_stats():
+    """Inbound webhook log: waiting entries, duplicates dropped, throughput"""
+    if sms_ingest is None:
+        return jsonify({"enabled": False}), 200
+    
+    return jsonify(dict(sms_ingest.stats(), enabled=True)), 200
+
+
+def inbox_denied(number: Optional[str]):
+    """
+    Error response unless the request carries the number's token (the
+    secret itself for number None); None if access is granted
+    """
+    if sms_inbox is None:
+        return jsonify({"error": "Inbound SMS store not enabled"}), 503
+    if not SMS_INBOX_SECRET:
+        return jsonify({"error": "Inbox access not configured (SMS_INBOX_SECRET)"}), 503
+    
+    token = request.headers.get("Authorization", "")
+    token = token[len("Bearer "):] if token.startswith("Bearer ") else ""
+    if number is None:
+        granted = hmac.compare_digest(token, SMS_INBOX_SECRET)
+    else:
+        granted = check_token(SMS_INBOX_SECRET, number, token)
+    if not granted:
+        return jsonify({"error": "Invalid or missing token for this number"}), 401
+    return None
+
+
+def inbox_page(number: str, messages: List[Dict], cursor: int, limit: int):
+    """Response of the inbox reads: a page of messages and the cursor after it"""
+    return jsonify({
+        "number": number,
+        "messages": [{
+            "id": m["seq"],
+            "from": m["from_number"],
+            "to": m["to_number"],
+            "message": m["body"],
+            "provider": m["provider"],
+            "provider_message_id": m["provider_message_id"],
+            "timestamp": m["sent_at"],
+            "received_at": m["received_at"],
+        } for m in messages],
+        "next_cursor": messages[-1]["seq"] if messages else cursor,
+        "more": len(messages) == limit
+    }), 200
+
+
+@app.route('/sms/inbox/<number>', methods=['GET'])
+def get_inbox(number: str):
+    """
+    Received messages to a number, oldest first
+    Query: cursor (next_cursor of the previous page, default 0),
+    since (unix time), limit (default 100, at most 1000)
+    Header: Authorization: Bearer <the number's token>
+    """
+    denied = inbox_denied(number)
+    if denied:
+        return denied
+    
+    try:
+        cursor = int(request.args.get("cursor", 0))
+        limit = max(1, min(int(request.args.get("limit", 100)), 1000))
+        since = float(request.args["since"]) if "since" in request.args else None
+    except ValueError:
+        return jsonify({"error": "cursor, limit and since must be numbers"}), 400
+    
+    return inbox_page(number, sms_inbox.messages(number, cursor, limit, since), cursor, limit)
+
+
+@app.route('/sms/inbox/<number>/wait', methods=['GET'])
+def wait_inbox(number: str):
+    """
+    Long-poll: messages to a number after `cursor`, waiting up to `timeout`
+    seconds (default 30, at most SMS_INBOX_WAIT_MAX) for the next one.
+    Answers an empty page on timeout. Needs the number's token.
+    """
+    denied = inbox_denied(number)
+    if denied:
+        return denied
+    
+    try:
+        cursor = int(request.args.get("cursor", 0))
+        limit = max(1, min(int(request.args.get("limit", 100)), 1000))
+        timeout = max(0.0, min(float(request.args.get("timeout", 30)), SMS_INBOX_WAIT_MAX))
+    except ValueError:
+        return jsonify({"error": "cursor, limit and timeout must be numbers"}), 400
+    
+    messages = sms_inbox.wait(number, cursor, timeout, limit)
+    if messages is None:
+        response = jsonify({"error": "Too many clients waiting"})
+        response.headers["Retry-After"] = "5"
+        return response, 503
+    
+    return inbox_page(number, messages, cursor, limit)
+
+
+@app.route('/sms/inbox', methods=['GET'])
+def inbox_stats():
+    """Inbound store size, writes per commit and waiting clients (needs SMS_INBOX_SECRET as token)"""
+    if sms_inbox is None:
+        return jsonify({"enabled": False}), 200
+    denied = inbox_denied(None)
+    if denied:
+        return denied
+    
+    return jsonify(dict(sms_inbox.stats(), enabled=True)), 200
+
+
+@app.route('/sms/gateways', methods=['GET'])
+def gateway_stats():
+    """Routing state per gateway: circuit, rolling latency, error rate, in flight, limits"""
+    return jsonify({
+        "order": sms_manager.candidates(),
+        "gateways": sms_manager.routing_stats()
+    }), 200
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus metrics of gateway routing"""
+    return Response(ROUTING_METRICS.render(), content_type=METRICS_CONTENT_TYPE)
+
+
 @app.route('/sms/status/<message_id>', methods=['GET'])
 def get_sms_status(message_id: str):
     """Get SMS delivery status"""
@@ -422,6 +1005,32 @@ def get_sms_status(message_id: str):
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='SMS Gateway for the ENUM backend')
+    parser.add_argument('--host', default='0.0.0.0', help='Host to bind to')
+    parser.add_argument('--port', default=8081, type=int, help='Port to bind to')
+    parser.add_argument('--queue', default=SMS_QUEUE_PATH, help='SQLite file for the outbound SMS queue')
+    parser.add_argument('--queue-workers', default=SMS_QUEUE_WORKERS, type=int,
+                        help='Threads sending queued messages')
+    parser.add_argument('--sync-send', action='store_true',
+                        help='Send from the /sms/send request instead of queueing')
+    parser.add_argument('--ingest', default=SMS_INGEST_PATH, help='SQLite file for the inbound webhook log')
+    parser.add_argument('--ingest-workers', default=SMS_INGEST_WORKERS, type=int,
+                        help='Threads processing received webhooks')
+    parser.add_argument('--sync-webhooks', action='store_true',
+                        help='Process webhooks in the request instead of logging them')
+    parser.add_argument('--inbox', default=SMS_INBOX_PATH, help='SQLite file for received messages')
+    parser.add_argument('--inbox-retention', default=SMS_INBOX_RETENTION, type=float,
+                        help='Seconds received messages are kept')
+    parser.add_argument('--issue-inbox-token', metavar='NUMBER',
+                        help='Print the /sms/inbox token of NUMBER (for its renter) and exit')
+    args = parser.parse_args()
+    
+    if args.issue_inbox_token:
+        if not SMS_INBOX_SECRET:
+            sys.exit("Set SMS_INBOX_SECRET first")
+        print(number_token(SMS_INBOX_SECRET, args.issue_inbox_token))
+        sys.exit(0)
+    
     # Example usage
     print("SMS Gateway Integration Example")
     print("=" * 50)
@@ -432,5 +1041,13 @@ if __name__ == "__main__":
         sms_manager.add_gateway("telnyx", telnyx)
         print("✓ Telnyx gateway configured")
     
-    # Start Flask server
-    app.run(host='0.0.0.0', port=8081, debug=True)
+    if not args.sync_send:
+        start_queue(args.queue, args.queue_workers)
+    start_inbox(args.inbox, args.inbox_retention)
+    if not args.sync_webhooks:
+        start_ingest(args.ingest, args.ingest_workers)
+    # Let queued sends and webhooks in flight finish on SIGTERM (see the stop methods)
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    
+    # Start Flask server (the reloader would start a second queue)
+    app.run(host=args.host, port=args.port, debug=True, use_reloader=False)
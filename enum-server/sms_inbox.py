@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+"""
+Inbound SMS store for the SMS gateway
+Received messages are kept in a SQLite table (WAL) so a client that was
+offline can still fetch its 2FA codes. Rows are append-only and numbered
+in the order they arrive (seq), which doubles as the pagination cursor:
+GET /sms/inbox/<number>?cursor=N returns the messages to that number after
+N, oldest first, over the (to_number, seq) index. /sms/inbox/<number>/wait
+long-polls for the next message to the number.
+
+Messages hold 2FA codes, so reads need the number's token: an HMAC of the
+number under the operator's secret, issued to the renter with the number
+(number_token) and sent as "Authorization: Bearer <token>". Tokens need no
+storage; changing the secret revokes all of them.
+
+Writes use group commit: concurrent add() calls (the webhook workers
+during a burst) are inserted by whichever of them gets the write lock
+first, in one transaction. The slower a commit is (synchronous=FULL, a
+slow SD card), the more messages share it. Messages older than `retention`
+are pruned by a background thread a chunk at a time, so a writer waits
+for one small delete at most.
+"""
+
+import hashlib
+import hmac
+import logging
+import re
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS inbound (
+    seq INTEGER PRIMARY KEY,
+    to_number TEXT NOT NULL,
+    from_number TEXT NOT NULL,
+    body TEXT NOT NULL,
+    provider TEXT NOT NULL,
+    provider_message_id TEXT,
+    sent_at TEXT,
+    received_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS inbound_number ON inbound (to_number, seq);
+CREATE INDEX IF NOT EXISTS inbound_received ON inbound (received_at);
+CREATE UNIQUE INDEX IF NOT EXISTS inbound_provider_id ON inbound (provider, provider_message_id)
+    WHERE provider_message_id IS NOT NULL;
+"""
+
+COLUMNS = ('seq', 'to_number', 'from_number', 'body', 'provider', 'provider_message_id', 'sent_at', 'received_at')
+
+
+def normalize_number(number: str) -> str:
+    """'+1 (415) 555-0100' -> '+14155550100'; names such as 'local_number' are kept"""
+    digits = re.sub(r'\D', '', number)
+    return f"+{digits}" if digits else number
+
+
+def number_token(secret: str, number: str) -> str:
+    """Token granting reads of `number`'s messages"""
+    return hmac.new(secret.encode(), normalize_number(number).encode(), hashlib.sha256).hexdigest()
+
+
+def check_token(secret: str, number: str, token: str) -> bool:
+    """True if `token` was issued for `number` under `secret`; False when no secret is set"""
+    return bool(secret) and hmac.compare_digest(number_token(secret, number), token or '')
+
+
+class _Pending:
+    """A message waiting for the next group commit"""
+
+    def __init__(self, row: tuple):
+        self.row = row
+        self.seq: Optional[int] = None
+        self.done = False
+        self.error: Optional[Exception] = None
+
+
+class InboxStore:
+    """Received SMS by destination number, with cursor reads and long-polling"""
+
+    def __init__(self, path: str, retention: float = 7 * 86400, max_waiters: int = 100,
+                 prune_interval: float = 60.0, synchronous: str = "NORMAL"):
+        self.path = path
+        self.retention = retention
+        self.max_waiters = max_waiters
+        self.prune_interval = prune_interval
+        # NORMAL: commits survive a process crash; FULL: also power loss,
+        # at an fsync per commit (which group commit then shares)
+        self.synchronous = synchronous
+
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        self._pending_lock = threading.Lock()
+        self._pending: List[_Pending] = []
+        # Waiters per number, and the newest seq stored for those numbers
+        self._cond = threading.Condition()
+        self._watched: Dict[str, int] = {}
+        self._latest: Dict[str, int] = {}
+        self._stop = threading.Event()
+        self._pruner: Optional[threading.Thread] = None
+
+        self.waiters = 0
+        self.stored = 0
+        self.duplicates = 0
+        self.commits = 0
+        self.pruned = 0
+
+        conn = self._conn()
+        conn.executescript(SCHEMA)
+        conn.commit()
+
+    def _conn(self) -> sqlite3.Connection:
+        """Per-thread connection; WAL lets reads run alongside the writer"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(f"PRAGMA synchronous={self.synchronous}")
+            self._local.conn = conn
+        return conn
+
+    def add(self, message: Dict) -> Optional[int]:
+        """
+        Store a parsed message (receive_sms_webhook's result); returns its
+        seq, or None if the provider's message id is already stored
+        """
+        pending = _Pending((
+            normalize_number(message['to']), message['from'], message['message'], message['provider'],
+            message.get('message_id'), message.get('timestamp'),
+        ))
+        with self._pending_lock:
+            self._pending.append(pending)
+        with self._write_lock:
+            # Whoever holds the lock commits every message queued so far
+            if not pending.done:
+                with self._pending_lock:
+                    batch, self._pending = self._pending, []
+                self._commit(batch)
+        if pending.error is not None:
+            raise pending.error
+        return pending.seq
+
+    def _commit(self, batch: List[_Pending]):
+        conn = self._conn()
+        now = time.time()
+        try:
+            with conn:
+                for pending in batch:
+                    cursor = conn.execute(
+                        "INSERT OR IGNORE INTO inbound (to_number, from_number, body, provider, "
+                        "provider_message_id, sent_at, received_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        (*pending.row, now)
+                    )
+                    pending.seq = cursor.lastrowid if cursor.rowcount else None
+        except Exception as e:
+            for pending in batch:
+                pending.seq, pending.error = None, e
+        self.commits += 1
+        for pending in batch:
+            pending.done = True
+            if pending.error is None:
+                if pending.seq is None:
+                    self.duplicates += 1
+                else:
+                    self.stored += 1
+        with self._cond:
+            woken = False
+            for pending in batch:
+                number = pending.row[0]
+                if pending.seq is not None and number in self._watched:
+                    self._latest[number] = pending.seq
+                    woken = True
+            if woken:
+                self._cond.notify_all()
+
+    def messages(self, number: str, cursor: int = 0, limit: int = 100,
+                 since: Optional[float] = None) -> List[Dict]:
+        """Messages to `number` after `cursor` (a seq), oldest first; `since` skips older ones"""
+        conn = self._conn()
+        if since is not None:
+            first = conn.execute("SELECT MIN(seq) FROM inbound WHERE received_at >= ?", (since,)).fetchone()[0]
+            if first is None:
+                return []
+            cursor = max(cursor, first - 1)
+        rows = conn.execute(
+            f"SELECT {', '.join(COLUMNS)} FROM inbound WHERE to_number = ? AND seq > ? ORDER BY seq LIMIT ?",
+            (normalize_number(number), cursor, limit)
+        ).fetchall()
+        return [dict(zip(COLUMNS, row)) for row in rows]
+
+    def wait(self, number: str, cursor: int = 0, timeout: float = 30.0,
+             limit: int = 100) -> Optional[List[Dict]]:
+        """
+        Messages to `number` after `cursor`, waiting up to `timeout` seconds
+        for one to arrive; [] on timeout, None if max_waiters are waiting
+        """
+        number = normalize_number(number)
+        with self._cond:
+            if self.waiters >= self.max_waiters:
+                return None
+            self.waiters += 1
+            self._watched[number] = self._watched.get(number, 0) + 1
+        try:
+            deadline = time.monotonic() + timeout
+            while True:
+                with self._cond:
+                    mark = self._latest.get(number, 0)
+                messages = self.messages(number, cursor, limit)
+                remaining = deadline - time.monotonic()
+                if messages or remaining <= 0 or self._stop.is_set():
+                    return messages
+                with self._cond:
+                    self._cond.wait_for(lambda: self._latest.get(number, 0) != mark or self._stop.is_set(),
+                                        remaining)
+        finally:
+            with self._cond:
+                self.waiters -= 1
+                self._watched[number] -= 1
+                if not self._watched[number]:
+                    del self._watched[number]
+                    self._latest.pop(number, None)
+
+    def prune(self, chunk: int = 500) -> int:
+        """Drop messages past the retention period, one small transaction per chunk"""
+        conn = self._conn()
+        cutoff = time.time() - self.retention
+        removed = 0
+        while not self._stop.is_set():
+            with conn:
+                count = conn.execute(
+                    "DELETE FROM inbound WHERE seq IN (SELECT seq FROM inbound WHERE received_at < ? LIMIT ?)",
+                    (cutoff, chunk)
+                ).rowcount
+            removed += count
+            if count < chunk:
+                break
+            # Let waiting writers in between chunks
+            time.sleep(0.01)
+        self.pruned += removed
+        return removed
+
+    def stats(self) -> Dict:
+        conn = self._conn()
+        count, oldest = conn.execute("SELECT COUNT(*), MIN(received_at) FROM inbound").fetchone()
+        return {
+            'messages': count,
+            'oldest_seconds': round(time.time() - oldest, 1) if oldest else 0.0,
+            'stored': self.stored,
+            'duplicates': self.duplicates,
+            'messages_per_commit': round(self.stored / self.commits, 2) if self.commits else 0.0,
+            'waiters': self.waiters,
+            'pruned': self.pruned,
+            'retention_seconds': self.retention,
+        }
+
+    def _prune_loop(self):
+        while not self._stop.is_set():
+            try:
+                removed = self.prune()
+                if removed:
+                    logger.info(f"Pruned {removed} inbound SMS past retention")
+            except Exception as e:
+                logger.error(f"Inbound SMS pruning failed: {e}")
+            self._stop.wait(self.prune_interval)
+
+    def start(self):
+        """Prune past-retention messages from a background thread"""
+        self._stop.clear()
+        self._pruner = threading.Thread(target=self._prune_loop, name="sms-inbox-prune", daemon=True)
+        self._pruner.start()
+
+    def stop(self):
+        """Stop pruning and release long-polls"""
+        self._stop.set()
+        with self._cond:
+            self._cond.notify_all()
+        if self._pruner is not None:
+            self._pruner.join(5)
+            self._pruner = None
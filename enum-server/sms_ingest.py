@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""
+Inbound webhook log for the SMS gateway
+/sms/webhook/<provider> only checks that the body is a JSON object from a
+known provider, appends the raw body to a SQLite table (WAL) and answers
+200. Worker threads then parse the stored payloads (SMSManager's
+receive_sms_webhook) and hand the messages on, so a slow downstream step
+no longer holds up the answer the provider waits for, and providers stop
+re-delivering webhooks that merely took long.
+
+Providers still deliver some webhooks twice. Each entry carries a dedupe
+key, the provider's message id or else a hash of the body; an entry whose
+key was seen within `dedupe_window` is acknowledged but not stored again.
+Processed entries are kept, without their body, for that window and then
+pruned a chunk at a time. At most `max_pending` entries wait for the
+workers; beyond that append raises IngestFull and the webhook answers 503,
+so the provider delivers it again later.
+
+Appends commit with synchronous=NORMAL: they survive a process crash, only
+power loss can drop the last ones. Entries not processed when the process
+stops are processed after the next start.
+"""
+
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from queue import Empty, Full, Queue
+from typing import Callable, Dict, List, Optional, Set
+
+from sms_queue import RateMeter
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS webhooks (
+    seq INTEGER PRIMARY KEY,
+    provider TEXT NOT NULL,
+    dedupe_key TEXT NOT NULL,
+    body BLOB,
+    received_at REAL NOT NULL,
+    processed_at REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_try_at REAL NOT NULL DEFAULT 0,
+    error TEXT
+);
+CREATE UNIQUE INDEX IF NOT EXISTS webhooks_dedupe ON webhooks (provider, dedupe_key);
+CREATE INDEX IF NOT EXISTS webhooks_pending ON webhooks (next_try_at) WHERE processed_at IS NULL;
+CREATE INDEX IF NOT EXISTS webhooks_processed ON webhooks (received_at) WHERE processed_at IS NOT NULL;
+"""
+
+
+class IngestFull(Exception):
+    """The log already holds max_pending unprocessed webhooks"""
+
+
+class IngestLog:
+    """Durable log of received webhooks, processed by worker threads"""
+
+    def __init__(self, path: str, handler: Callable[[str, Dict], Dict], workers: int = 4,
+                 max_pending: int = 100000, dedupe_window: float = 86400, max_attempts: int = 5,
+                 retry_delay: float = 5.0, prune_interval: float = 60.0):
+        self.path = path
+        # handler(provider, payload) -> result with "success"; a failed
+        # result is final, an exception is retried after retry_delay
+        self.handler = handler
+        self.workers = workers
+        self.max_pending = max_pending
+        self.dedupe_window = dedupe_window
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.prune_interval = prune_interval
+
+        # One connection for the request threads and the workers: the
+        # werkzeug server runs each request on a new thread, and an insert
+        # is quicker than opening a connection
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA)
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._work: Queue = Queue(maxsize=workers * 2)
+        self._claimed: Set[int] = set()
+        self._threads: List[threading.Thread] = []
+
+        self.pending = self._db.execute("SELECT COUNT(*) FROM webhooks WHERE processed_at IS NULL").fetchone()[0]
+        self.accepted = 0
+        self.duplicates = 0
+        self.rejected = 0
+        self.processed = 0
+        self.failed = 0
+        self.retried = 0
+        self.throughput = RateMeter()
+
+    def append(self, provider: str, body: bytes, message_id: Optional[str] = None) -> bool:
+        """
+        Store a received webhook; False if it repeats one seen within the
+        dedupe window. Raises IngestFull when max_pending are waiting.
+        """
+        key = message_id or f"sha256:{hashlib.sha256(body).hexdigest()}"
+        with self._lock:
+            if self.pending >= self.max_pending:
+                self.rejected += 1
+                raise IngestFull(f"{self.pending} webhooks waiting to be processed")
+            with self._db:
+                stored = self._db.execute(
+                    "INSERT OR IGNORE INTO webhooks (provider, dedupe_key, body, received_at) VALUES (?, ?, ?, ?)",
+                    (provider, key, body, time.time())
+                ).rowcount
+            if not stored:
+                self.duplicates += 1
+                return False
+            self.pending += 1
+            self.accepted += 1
+        self._wake.set()
+        return True
+
+    def stats(self) -> Dict:
+        with self._lock:
+            oldest = self._db.execute(
+                "SELECT MIN(received_at) FROM webhooks WHERE processed_at IS NULL"
+            ).fetchone()[0]
+        return {
+            'pending': self.pending,
+            'oldest_pending_seconds': round(max(0.0, time.time() - oldest), 3) if oldest else 0.0,
+            'throughput_per_second': round(self.throughput.rate(), 2),
+            'accepted': self.accepted,
+            'duplicates': self.duplicates,
+            'rejected': self.rejected,
+            'processed': self.processed,
+            'failed': self.failed,
+            'retried': self.retried,
+            'workers': self.workers,
+        }
+
+    def prune(self, chunk: int = 1000) -> int:
+        """
+        Drop processed entries received before the dedupe window, one small
+        transaction per chunk so appends are not held up
+        """
+        cutoff = time.time() - self.dedupe_window
+        removed = 0
+        while True:
+            with self._lock, self._db:
+                count = self._db.execute(
+                    "DELETE FROM webhooks WHERE seq IN (SELECT seq FROM webhooks "
+                    "WHERE processed_at IS NOT NULL AND received_at < ? LIMIT ?)", (cutoff, chunk)
+                ).rowcount
+            removed += count
+            if count < chunk or self._stop.is_set():
+                return removed
+
+    # Workers
+
+    def _finish(self, seq: int, attempts: int, error: Optional[str] = None):
+        """Mark an entry processed; failed ones keep their body for inspection"""
+        with self._lock:
+            with self._db:
+                self._db.execute(
+                    "UPDATE webhooks SET processed_at = ?, attempts = ?, error = ?, "
+                    "body = CASE WHEN ? IS NULL THEN NULL ELSE body END WHERE seq = ?",
+                    (time.time(), attempts, error, error, seq)
+                )
+            self.pending -= 1
+        if error is None:
+            self.processed += 1
+            self.throughput.mark()
+        else:
+            self.failed += 1
+
+    def _process(self, seq: int, provider: str, body: bytes, attempts: int):
+        attempts += 1
+        try:
+            payload = json.loads(body)
+        except ValueError as e:
+            self._finish(seq, attempts, f"Invalid JSON: {e}")
+            return
+        try:
+            result = self.handler(provider, payload)
+        except Exception as e:
+            if attempts < self.max_attempts:
+                with self._lock, self._db:
+                    self._db.execute("UPDATE webhooks SET attempts = ?, error = ?, next_try_at = ? WHERE seq = ?",
+                                     (attempts, str(e), time.time() + self.retry_delay * 2 ** (attempts - 1), seq))
+                self.retried += 1
+                logger.warning(f"{provider} webhook {seq} failed, retrying: {e}")
+            else:
+                self._finish(seq, attempts, str(e))
+                logger.error(f"{provider} webhook {seq} failed: {e}")
+            return
+        self._finish(seq, attempts, None if result.get("success") else result.get("error", "Rejected"))
+
+    def _feed(self):
+        """Hand due entries to the workers in arrival order; prunes now and then"""
+        last_prune = 0.0
+        while not self._stop.is_set():
+            if time.monotonic() - last_prune >= self.prune_interval:
+                try:
+                    self.prune()
+                except Exception as e:
+                    logger.error(f"Webhook log pruning failed: {e}")
+                last_prune = time.monotonic()
+            self._wake.clear()
+            now = time.time()
+            with self._lock:
+                rows = self._db.execute(
+                    "SELECT seq, provider, body, attempts FROM webhooks WHERE processed_at IS NULL "
+                    "AND next_try_at <= ? ORDER BY seq LIMIT ?", (now, self.workers * 4 + 100)
+                ).fetchall()
+                retry_at = self._db.execute(
+                    "SELECT MIN(next_try_at) FROM webhooks WHERE processed_at IS NULL AND next_try_at > ?", (now,)
+                ).fetchone()[0]
+            fresh = [row for row in rows if row[0] not in self._claimed]
+            for row in fresh:
+                self._claimed.add(row[0])
+                # Blocks while the workers are busy
+                while not self._stop.is_set():
+                    try:
+                        self._work.put(row, timeout=0.5)
+                        break
+                    except Full:
+                        continue
+            if not fresh:
+                self._wake.wait(min(1.0, retry_at - now) if retry_at else 1.0)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                seq, provider, body, attempts = self._work.get(timeout=0.5)
+            except Empty:
+                continue
+            try:
+                self._process(seq, provider, body, attempts)
+            except Exception as e:
+                logger.error(f"Webhook worker failed on {seq}: {e}")
+            finally:
+                self._claimed.discard(seq)
+                self._wake.set()
+
+    def start(self):
+        """Process the log from `workers` background threads"""
+        self._stop.clear()
+        threads = [threading.Thread(target=self._feed, name="webhook-feed", daemon=True)]
+        threads += [threading.Thread(target=self._run, name=f"webhook-worker-{i}", daemon=True)
+                    for i in range(self.workers)]
+        for thread in threads:
+            thread.start()
+        self._threads = threads
+
+    def stop(self, timeout: float = 10.0):
+        """Stop taking entries and wait for the ones being processed"""
+        self._stop.set()
+        self._wake.set()
+        deadline = time.monotonic() + timeout
+        for thread in self._threads:
+            thread.join(max(0.0, deadline - time.monotonic()))
+        self._threads = []
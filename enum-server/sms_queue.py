@@ -0,0 +1,534 @@
+#!/usr/bin/env python3
+"""
+Outbound SMS queue for the SMS gateway
+/sms/send stores the message in a SQLite table (WAL) and answers 202 with
+its id. A pool of worker threads drains the table through the gateways of
+an SMSManager, each paced by its own token bucket and capped in concurrent
+requests, so bursts wait in the queue instead of turning into provider 429s.
+
+/sms/send/batch queues many messages at once under a batch id, at a lower
+priority than single sends so a bulk notification does not delay 2FA codes.
+Messages not pinned to a gateway go to whichever gateway has room, so a
+batch drains at the combined rate of all gateways. Workers try gateways in
+the manager's routing order (see sms_routing); messages pinned to a gateway
+whose circuit is open are sent by the others, and a send the provider did
+not take is requeued at once for another gateway.
+
+Message states: queued -> sending -> sent, or failed.
+A message stays in "sending" for a lease while its request is out. After a
+crash the lease runs out and the message is sent again; a clean stop lets
+requests in flight finish first, so restarts neither lose nor repeat
+messages.
+"""
+
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+from collections import deque
+from typing import Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+QUEUED = 'queued'
+SENDING = 'sending'
+SENT = 'sent'
+FAILED = 'failed'
+STATES = (QUEUED, SENDING, SENT, FAILED)
+
+# Seconds a claimed message is hidden from other workers; longer than a
+# send can take with the gateway's timeouts and connect retries
+SEND_LEASE = 60
+
+# Seconds follow_batch looks back for results committed out of order
+FOLLOW_SLACK = 5.0
+
+# Claim order: single sends before batch messages
+INTERACTIVE = 0
+BULK = 1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    id TEXT PRIMARY KEY,
+    client_key TEXT UNIQUE,
+    from_number TEXT NOT NULL,
+    to_number TEXT NOT NULL,
+    body TEXT NOT NULL,
+    gateway TEXT,
+    state TEXT NOT NULL,
+    provider TEXT,
+    provider_message_id TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    sent_at REAL,
+    next_try_at REAL NOT NULL DEFAULT 0,
+    batch_id TEXT,
+    priority INTEGER NOT NULL DEFAULT 0,
+    failed_gateway TEXT
+);
+CREATE INDEX IF NOT EXISTS messages_due ON messages (state, next_try_at);
+CREATE TABLE IF NOT EXISTS batches (
+    id TEXT PRIMARY KEY,
+    client_key TEXT UNIQUE,
+    count INTEGER NOT NULL,
+    created_at REAL NOT NULL
+);
+"""
+
+# Columns added after the first release, and indexes over them
+MIGRATIONS = (
+    ('batch_id', "ALTER TABLE messages ADD COLUMN batch_id TEXT"),
+    ('priority', "ALTER TABLE messages ADD COLUMN priority INTEGER NOT NULL DEFAULT 0"),
+    ('failed_gateway', "ALTER TABLE messages ADD COLUMN failed_gateway TEXT"),
+)
+INDEXES = """
+CREATE INDEX IF NOT EXISTS messages_claim ON messages (state, priority, next_try_at);
+CREATE INDEX IF NOT EXISTS messages_batch ON messages (batch_id, updated_at);
+"""
+
+COLUMNS = ('id', 'client_key', 'from_number', 'to_number', 'body', 'gateway', 'state', 'provider',
+           'provider_message_id', 'attempts', 'error', 'created_at', 'updated_at', 'sent_at', 'batch_id',
+           'failed_gateway')
+# Per-recipient fields of a batch result
+RESULT_COLUMNS = ('id', 'to_number', 'state', 'provider', 'provider_message_id', 'attempts', 'error')
+
+
+class TokenBucket:
+    """`rate` tokens per second, holding at most `burst`"""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self.tokens = self.burst
+        self._stamp = time.monotonic()
+        self._held_until = 0.0
+        self._lock = threading.Lock()
+
+    def take(self) -> float:
+        """Take a token; returns 0 if one was taken, else seconds until one is due"""
+        with self._lock:
+            now = time.monotonic()
+            if now < self._held_until:
+                return self._held_until - now
+            if self.rate <= 0:
+                return 0.0
+            self.tokens = min(self.burst, self.tokens + (now - self._stamp) * self.rate)
+            self._stamp = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0.0
+            return (1 - self.tokens) / self.rate
+
+    def refund(self):
+        with self._lock:
+            self.tokens = min(self.burst, self.tokens + 1)
+
+    def hold(self, seconds: float):
+        """Hand out no tokens for `seconds`, e.g. after the provider answered 429"""
+        with self._lock:
+            self._held_until = max(self._held_until, time.monotonic() + seconds)
+            self.tokens = 0.0
+
+
+class GatewayLimit:
+    """Token bucket and concurrency cap of one gateway"""
+
+    def __init__(self, rate: float, burst: float, concurrency: int):
+        self.bucket = TokenBucket(rate, burst)
+        self.concurrency = max(1, concurrency)
+        self.in_flight = 0
+        self.throttled = 0
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """Take a send slot; returns 0 if taken, else seconds to wait (0.1 when all slots are busy)"""
+        with self._lock:
+            if self.in_flight >= self.concurrency:
+                return 0.1
+            wait = self.bucket.take()
+            if wait:
+                self.throttled += 1
+                return wait
+            self.in_flight += 1
+            return 0.0
+
+    def release(self, used: bool = True):
+        """Give the slot back; `used=False` also returns the unspent token"""
+        with self._lock:
+            self.in_flight -= 1
+        if not used:
+            self.bucket.refund()
+
+    def stats(self) -> Dict:
+        return {
+            'rate': self.bucket.rate,
+            'burst': self.bucket.burst,
+            'concurrency': self.concurrency,
+            'in_flight': self.in_flight,
+            'throttled': self.throttled,
+        }
+
+
+class RateMeter:
+    """Events per second over a sliding window"""
+
+    def __init__(self, window: float = 60.0):
+        self.window = window
+        self._seconds: deque = deque()
+        self._started = time.monotonic()
+        self._lock = threading.Lock()
+
+    def mark(self, count: int = 1):
+        second = int(time.monotonic())
+        with self._lock:
+            if self._seconds and self._seconds[-1][0] == second:
+                self._seconds[-1][1] += count
+            else:
+                self._seconds.append([second, count])
+
+    def rate(self) -> float:
+        now = time.monotonic()
+        with self._lock:
+            while self._seconds and self._seconds[0][0] <= now - self.window:
+                self._seconds.popleft()
+            total = sum(count for _, count in self._seconds)
+        return total / max(1.0, min(self.window, now - self._started))
+
+
+class SMSQueue:
+    """Durable outbound SMS queue drained by worker threads through an SMSManager"""
+
+    def __init__(self, path: str, manager, workers: int = 8, max_attempts: int = 5,
+                 retry_delay: float = 5.0, retention: float = 7 * 86400):
+        self.path = path
+        self.manager = manager
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        # Seconds sent / failed messages are kept for status queries
+        self.retention = retention
+
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._last_recover = 0.0
+
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+        self.throughput = RateMeter()
+
+        conn = self._conn()
+        conn.executescript(SCHEMA)
+        existing = {row[1] for row in conn.execute("PRAGMA table_info(messages)")}
+        for column, sql in MIGRATIONS:
+            if column not in existing:
+                conn.execute(sql)
+        conn.executescript(INDEXES)
+        conn.commit()
+
+    def _conn(self) -> sqlite3.Connection:
+        """Per-thread connection; WAL lets status reads run alongside the workers"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            # Commits survive a process crash; only power loss can drop the last ones
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _row(self, sql: str, params: tuple) -> Optional[Dict]:
+        row = self._conn().execute(f"SELECT {', '.join(COLUMNS)} FROM messages {sql}", params).fetchone()
+        return dict(zip(COLUMNS, row)) if row else None
+
+    def _update(self, message_id: str, **fields):
+        fields['updated_at'] = time.time()
+        assignments = ', '.join(f"{name} = ?" for name in fields)
+        with self._write_lock:
+            conn = self._conn()
+            with conn:
+                conn.execute(f"UPDATE messages SET {assignments} WHERE id = ?", (*fields.values(), message_id))
+
+    def submit(self, from_number: str, to_number: str, body: str, gateway: Optional[str] = None,
+               client_key: Optional[str] = None) -> Tuple[Dict, bool]:
+        """
+        Queue a message; returns (message, created). A repeated client_key
+        returns the message it queued before instead of a new one.
+        """
+        if gateway not in self.manager.gateways:
+            # Unknown or no gateway: any gateway may send it
+            gateway = None
+        now = time.time()
+        message_id = uuid.uuid4().hex
+        with self._write_lock:
+            conn = self._conn()
+            with conn:
+                try:
+                    conn.execute(
+                        "INSERT INTO messages (id, client_key, from_number, to_number, body, gateway, state, "
+                        "created_at, updated_at, next_try_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        (message_id, client_key, from_number, to_number, body, gateway, QUEUED, now, now, now)
+                    )
+                except sqlite3.IntegrityError:
+                    return self._row("WHERE client_key = ?", (client_key,)), False
+        with self._cond:
+            self._cond.notify()
+        return self.get(message_id), True
+
+    def submit_batch(self, from_number: str, messages: List[Tuple[str, str]], gateway: Optional[str] = None,
+                     client_key: Optional[str] = None) -> Tuple[Dict, bool]:
+        """
+        Queue (to_number, body) pairs in one transaction; returns (batch,
+        created). A repeated client_key returns the batch it queued before.
+        """
+        if gateway not in self.manager.gateways:
+            gateway = None
+        now = time.time()
+        batch_id = uuid.uuid4().hex
+        with self._write_lock:
+            conn = self._conn()
+            with conn:
+                try:
+                    conn.execute("INSERT INTO batches (id, client_key, count, created_at) VALUES (?, ?, ?, ?)",
+                                 (batch_id, client_key, len(messages), now))
+                except sqlite3.IntegrityError:
+                    row = conn.execute("SELECT id FROM batches WHERE client_key = ?", (client_key,)).fetchone()
+                    return self.batch(row[0]), False
+                conn.executemany(
+                    "INSERT INTO messages (id, from_number, to_number, body, gateway, state, created_at, "
+                    "updated_at, next_try_at, batch_id, priority) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    ((uuid.uuid4().hex, from_number, to_number, body, gateway, QUEUED, now, now, now,
+                      batch_id, BULK) for to_number, body in messages)
+                )
+        with self._cond:
+            self._cond.notify_all()
+        return self.batch(batch_id), True
+
+    def get(self, message_id: str) -> Optional[Dict]:
+        return self._row("WHERE id = ?", (message_id,))
+
+    def batch(self, batch_id: str) -> Optional[Dict]:
+        """Batch with its message count per state"""
+        conn = self._conn()
+        row = conn.execute("SELECT count, created_at FROM batches WHERE id = ?", (batch_id,)).fetchone()
+        if row is None:
+            return None
+        counts = {state: 0 for state in STATES}
+        counts.update(dict(conn.execute(
+            "SELECT state, COUNT(*) FROM messages WHERE batch_id = ? GROUP BY state", (batch_id,)
+        ).fetchall()))
+        return {
+            'id': batch_id,
+            'count': row[0],
+            'created_at': row[1],
+            'states': counts,
+            'done': counts[QUEUED] + counts[SENDING] == 0,
+        }
+
+    def batch_results(self, batch_id: str, offset: int = 0, limit: int = 100) -> List[Dict]:
+        """Per-recipient results of a batch, in recipient order"""
+        rows = self._conn().execute(
+            f"SELECT {', '.join(RESULT_COLUMNS)} FROM messages WHERE batch_id = ? ORDER BY rowid "
+            f"LIMIT ? OFFSET ?", (batch_id, limit, offset)
+        ).fetchall()
+        return [dict(zip(RESULT_COLUMNS, row)) for row in rows]
+
+    def follow_batch(self, batch_id: str, poll_interval: float = 0.2) -> Iterator[Dict]:
+        """Yield each message of a batch once it is sent or failed, until none are left"""
+        emitted = set()
+        since = 0.0
+        while True:
+            # updated_at is stamped before the write lock is taken, so a row
+            # may commit after a later-stamped one: look back a little
+            rows = self._conn().execute(
+                f"SELECT {', '.join(RESULT_COLUMNS)}, updated_at FROM messages "
+                f"WHERE batch_id = ? AND updated_at >= ? AND state IN (?, ?) ORDER BY updated_at",
+                (batch_id, since - FOLLOW_SLACK, SENT, FAILED)
+            ).fetchall()
+            for row in rows:
+                since = max(since, row[-1])
+                if row[0] not in emitted:
+                    emitted.add(row[0])
+                    yield dict(zip(RESULT_COLUMNS, row))
+            batch = self.batch(batch_id)
+            if batch is None or batch['done'] and len(emitted) >= batch['states'][SENT] + batch['states'][FAILED]:
+                return
+            time.sleep(poll_interval)
+
+    def counts(self) -> Dict[str, int]:
+        rows = self._conn().execute("SELECT state, COUNT(*) FROM messages GROUP BY state").fetchall()
+        counts = {state: 0 for state in STATES}
+        counts.update(dict(rows))
+        return counts
+
+    def stats(self) -> Dict:
+        counts = self.counts()
+        oldest = self._conn().execute(
+            "SELECT MIN(next_try_at) FROM messages WHERE state = ?", (QUEUED,)
+        ).fetchone()[0]
+        return {
+            'depth': counts[QUEUED] + counts[SENDING],
+            'states': counts,
+            'oldest_queued_seconds': round(max(0.0, time.time() - oldest), 3) if oldest else 0.0,
+            'throughput_per_second': round(self.throughput.rate(), 2),
+            'sent': self.sent,
+            'failed': self.failed,
+            'retried': self.retried,
+            'workers': self.workers,
+            'gateways': self.manager.routing_stats(),
+        }
+
+    # Worker
+
+    def _claim(self, gateway: str, unavailable: List[str] = (), alone: bool = False) -> Optional[Dict]:
+        """
+        Take the oldest due message `gateway` may send (its own, unpinned
+        ones and those pinned to `unavailable` gateways or to the gateway
+        that just failed them) and lease it, so workers in other processes
+        skip it while it is being sent. Messages `gateway` just failed are
+        left to the others unless it is the `alone` gateway available.
+        """
+        now = time.time()
+        pinned = (gateway, *unavailable)
+        retry = "" if alone else "AND (failed_gateway IS NULL OR failed_gateway != ?)"
+        with self._write_lock:
+            conn = self._conn()
+            with conn:
+                conn.execute("BEGIN IMMEDIATE")
+                message = self._row(
+                    f"WHERE state = ? AND next_try_at <= ? AND (gateway IS NULL OR gateway = failed_gateway "
+                    f"OR gateway IN ({', '.join('?' * len(pinned))})) {retry} "
+                    f"ORDER BY priority, next_try_at LIMIT 1",
+                    (QUEUED, now, *pinned) + (() if alone else (gateway,))
+                )
+                if message is not None:
+                    conn.execute("UPDATE messages SET state = ?, provider = ?, updated_at = ?, next_try_at = ? "
+                                 "WHERE id = ?", (SENDING, gateway, now, now + SEND_LEASE, message['id']))
+        return message
+
+    def _next(self) -> Tuple[Optional[str], Optional[Dict], float]:
+        """(gateway, message, 0) for the next send, or (None, None, seconds to wait)"""
+        wait = 1.0
+        candidates = self.manager.candidates()
+        unavailable = [name for name in self.manager.gateways if name not in candidates]
+        for position, name in enumerate(candidates):
+            limit = self.manager.limits[name]
+            delay = limit.acquire()
+            if delay:
+                wait = min(wait, delay)
+                continue
+            try:
+                message = self._claim(name, unavailable, alone=len(candidates) == 1)
+            except Exception:
+                limit.release(used=False)
+                raise
+            if message is not None:
+                failover = message['attempts'] > 0 and message['provider'] not in (None, name)
+                self.manager.route_reason(name, position, message['gateway'], failover)
+                return name, message, 0.0
+            limit.release(used=False)
+        return None, None, wait
+
+    def _send(self, name: str, message: Dict):
+        limit = self.manager.limits[name]
+        try:
+            result = self.manager.dispatch(name, message['from_number'], message['to_number'], message['body'])
+        except Exception as e:
+            result = {"success": False, "error": str(e)}
+        finally:
+            limit.release()
+
+        attempts = message['attempts'] + 1
+        if result.get("success"):
+            self._update(message['id'], state=SENT, provider=name, attempts=attempts, error=None,
+                         provider_message_id=result.get("message_id"), sent_at=time.time())
+            self.sent += 1
+            self.throughput.mark()
+        elif result.get("retryable") and attempts < self.max_attempts:
+            delay = result.get("retry_after") or self.retry_delay * 2 ** (attempts - 1)
+            if result.get("status_code") == 429:
+                limit.bucket.hold(delay)
+            failed_gateway = None
+            if any(other != name for other in self.manager.candidates()):
+                # Another gateway can take it now; this one may not (see _claim)
+                delay, failed_gateway = 0.0, name
+            self._update(message['id'], state=QUEUED, attempts=attempts, error=result.get("error"),
+                         next_try_at=time.time() + delay, failed_gateway=failed_gateway)
+            self.retried += 1
+        else:
+            self._update(message['id'], state=FAILED, provider=name, attempts=attempts,
+                         error=result.get("error"))
+            self.failed += 1
+            logger.error(f"SMS {message['id']} to {message['to_number']} via {name} failed: "
+                         f"{result.get('error')}")
+
+    def recover(self):
+        """
+        Requeue messages whose lease ran out (their worker died), release
+        messages pinned to gateways no longer configured, and drop finished
+        messages past the retention period
+        """
+        now = time.time()
+        gateways = list(self.manager.gateways)
+        with self._write_lock:
+            conn = self._conn()
+            with conn:
+                expired = conn.execute(
+                    "UPDATE messages SET state = ?, updated_at = ? WHERE state = ? AND next_try_at <= ?",
+                    (QUEUED, now, SENDING, now)
+                ).rowcount
+                conn.execute(
+                    f"UPDATE messages SET gateway = NULL WHERE state = ? AND gateway IS NOT NULL "
+                    f"AND gateway NOT IN ({', '.join('?' * len(gateways))})", (QUEUED, *gateways)
+                )
+                conn.execute("DELETE FROM messages WHERE state IN (?, ?) AND updated_at < ?",
+                             (SENT, FAILED, now - self.retention))
+        if expired:
+            logger.warning(f"Requeued {expired} SMS whose send was interrupted")
+        self._last_recover = time.monotonic()
+
+    def _run(self):
+        while not self._stop.is_set():
+            if time.monotonic() - self._last_recover >= SEND_LEASE:
+                try:
+                    self.recover()
+                except Exception as e:
+                    logger.error(f"SMS queue recovery failed: {e}")
+            try:
+                name, message, wait = self._next()
+            except Exception as e:
+                logger.error(f"SMS queue worker failed: {e}")
+                name, message, wait = None, None, 1.0
+            if message is None:
+                with self._cond:
+                    self._cond.wait(wait)
+                continue
+            self._send(name, message)
+            with self._cond:
+                # A slot is free again
+                self._cond.notify()
+
+    def start(self):
+        """Drain the queue from `workers` background threads"""
+        self.recover()
+        self._stop.clear()
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"sms-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout: float = SEND_LEASE):
+        """Stop claiming messages and wait for the sends in flight"""
+        self._stop.set()
+        with self._cond:
+            self._cond.notify_all()
+        deadline = time.monotonic() + timeout
+        for thread in self._threads:
+            thread.join(max(0.0, deadline - time.monotonic()))
+        self._threads = []
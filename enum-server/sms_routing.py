@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+Gateway health and routing for SMSManager
+Each gateway tracks a rolling latency (EWMA), its error rate over the last
+sends, the requests it has in flight and a circuit breaker. Sends go to the
+healthy gateway with the lowest expected wait, latency x (in flight + 1) /
+weight, and fail over to the next one when the provider certainly did not
+take the message. A failed send adds `failure_latency` to the gateway's
+expected wait, so a failing gateway drops behind working ones before its
+breaker opens; the penalty halves every `open_seconds` and a successful
+send clears it, so the gateway gets traffic again once it works.
+
+A breaker opens after `failure_threshold` failures in a row, or when the
+error rate over a full window passes `error_rate_threshold`. While open the
+gateway gets no traffic; after `open_seconds` one probe request is let
+through (half open). A successful probe closes the breaker, a failed one
+opens it again for twice as long, up to `max_open_seconds`.
+
+Routing decisions, send latency and breaker state are exported as
+Prometheus metrics on the SMS gateway's /metrics.
+"""
+
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional
+
+from enum_metrics import Registry
+
+CLOSED = 'closed'
+HALF_OPEN = 'half_open'
+OPEN = 'open'
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+# Gateway health of the process, by name, for the gauges below
+TRACKED: Dict[str, 'GatewayHealth'] = {}
+
+REGISTRY = Registry()
+
+ROUTE_DECISIONS = REGISTRY.counter(
+    "sms_route_decisions_total",
+    "Gateways chosen for a send, by reason (preferred, least_latency, capacity, failover, probe)",
+    ("gateway", "reason"))
+GATEWAY_REQUESTS = REGISTRY.counter(
+    "sms_gateway_requests_total",
+    "Provider send requests by outcome (ok, gateway_error, throttled, rejected)",
+    ("gateway", "outcome"))
+GATEWAY_LATENCY = REGISTRY.histogram(
+    "sms_gateway_send_duration_seconds", "Provider send request latency, by gateway",
+    ("gateway",))
+CIRCUIT_TRANSITIONS = REGISTRY.counter(
+    "sms_circuit_transitions_total", "Circuit breaker state changes, by new state",
+    ("gateway", "state"))
+REGISTRY.gauge(
+    "sms_gateway_circuit_state", "Circuit breaker state (0 closed, 1 half open, 2 open)",
+    ("gateway",), lambda: {(name, ): STATE_VALUES[h.state] for name, h in TRACKED.items()})
+REGISTRY.gauge(
+    "sms_gateway_in_flight", "Send requests in flight",
+    ("gateway",), lambda: {(name, ): h.in_flight for name, h in TRACKED.items()})
+REGISTRY.gauge(
+    "sms_gateway_latency_seconds", "Rolling (EWMA) send latency",
+    ("gateway",), lambda: {(name, ): h.latency for name, h in TRACKED.items() if h.latency is not None})
+REGISTRY.gauge(
+    "sms_gateway_error_ratio", "Share of failed sends over the rolling window",
+    ("gateway",), lambda: {(name, ): h.error_rate() for name, h in TRACKED.items()})
+
+
+class GatewayHealth:
+    """Rolling latency, error rate, in-flight count and circuit breaker of one gateway"""
+
+    def __init__(self, name: str, weight: float = 1.0, window: int = 20, failure_threshold: int = 5,
+                 error_rate_threshold: float = 0.5, open_seconds: float = 10.0,
+                 max_open_seconds: float = 300.0, latency_alpha: float = 0.2,
+                 failure_latency: float = 10.0):
+        self.name = name
+        self.weight = weight
+        self.failure_threshold = failure_threshold
+        self.error_rate_threshold = error_rate_threshold
+        self.base_open_seconds = open_seconds
+        self.max_open_seconds = max_open_seconds
+        self.latency_alpha = latency_alpha
+        # Added to the expected wait after a failed send (about the read
+        # timeout), so a failing gateway ranks behind working ones
+        self.failure_latency = failure_latency
+
+        self.latency: Optional[float] = None
+        self.in_flight = 0
+        self.state = CLOSED
+        self.open_seconds = open_seconds
+        self._outcomes: deque = deque(maxlen=window)
+        self._consecutive_failures = 0
+        self._opened_at = 0.0
+        self._failed_at: Optional[float] = None
+        self._probing = False
+        self._lock = threading.Lock()
+        TRACKED[name] = self
+
+    def _set_state(self, state: str):
+        if state != self.state:
+            self.state = state
+            CIRCUIT_TRANSITIONS.inc(self.name, state)
+
+    def available(self) -> bool:
+        """True if a send may go to this gateway now (closed, or due for a probe)"""
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            return not self._probing and time.monotonic() - self._opened_at >= self.open_seconds
+
+    def probe_due(self) -> bool:
+        with self._lock:
+            return self.state != CLOSED and not self._probing and \
+                time.monotonic() - self._opened_at >= self.open_seconds
+
+    def begin(self) -> Optional[bool]:
+        """
+        Start a send: True if it is the half-open probe, False for a normal
+        send, None if the breaker does not allow it
+        """
+        with self._lock:
+            probe = False
+            if self.state != CLOSED:
+                if self._probing or time.monotonic() - self._opened_at < self.open_seconds:
+                    return None
+                self._probing = probe = True
+                self._set_state(HALF_OPEN)
+            self.in_flight += 1
+            return probe
+
+    def end(self, ok: bool, seconds: Optional[float], probe: bool = False):
+        """
+        Record a send's outcome; `ok` is False only for failures of the
+        gateway itself, `seconds` is given for sends the provider accepted
+        """
+        with self._lock:
+            self.in_flight -= 1
+            self._outcomes.append(ok)
+            self._failed_at = None if ok else time.monotonic()
+            if seconds is not None:
+                self.latency = seconds if self.latency is None else \
+                    self.latency + self.latency_alpha * (seconds - self.latency)
+            if ok:
+                self._consecutive_failures = 0
+            else:
+                self._consecutive_failures += 1
+            if probe:
+                self._probing = False
+                if ok:
+                    self._outcomes.clear()
+                    self.open_seconds = self.base_open_seconds
+                    self._set_state(CLOSED)
+                else:
+                    self.open_seconds = min(self.max_open_seconds, self.open_seconds * 2)
+                    self._opened_at = time.monotonic()
+                    self._set_state(OPEN)
+            elif self.state == CLOSED and not ok and self._should_open():
+                self._opened_at = time.monotonic()
+                self._set_state(OPEN)
+
+    def _should_open(self) -> bool:
+        if self._consecutive_failures >= self.failure_threshold:
+            return True
+        window = self._outcomes
+        return len(window) == window.maxlen and \
+            window.count(False) / len(window) >= self.error_rate_threshold
+
+    def error_rate(self) -> float:
+        with self._lock:
+            return self._outcomes.count(False) / len(self._outcomes) if self._outcomes else 0.0
+
+    def score(self) -> float:
+        """
+        Expected wait for one more send; lower is better. Unmeasured
+        gateways score 0 so they get tried; the last send failing adds
+        failure_latency, halving every open_seconds.
+        """
+        latency = self.latency or 0.0
+        failed_at = self._failed_at
+        if failed_at is not None:
+            latency += self.failure_latency * 0.5 ** ((time.monotonic() - failed_at) / self.base_open_seconds)
+        return latency * (self.in_flight + 1) / (self.weight * (1.0 - min(0.9, self.error_rate())))
+
+    def stats(self) -> Dict:
+        return {
+            'state': self.state,
+            'latency_ms': round(self.latency * 1000, 2) if self.latency is not None else None,
+            'error_rate': round(self.error_rate(), 3),
+            'in_flight': self.in_flight,
+            'weight': self.weight,
+            'open_seconds': self.open_seconds if self.state != CLOSED else 0,
+        }
+
+
+def rank(health: Dict[str, GatewayHealth], preferred: Optional[str] = None) -> List[str]:
+    """
+    Gateways a send may go to, best first: a gateway due for its probe,
+    then the preferred one, then by score. Gateways with an open breaker
+    are left out.
+    """
+    names = [name for name, h in health.items() if h.available()]
+    names.sort(key=lambda name: (not health[name].probe_due(), name != preferred, health[name].score()))
+    return names
@@ -7,9 +7,14 @@ Run this after starting the backend to verify functionality
 import requests
 import json
 import sys
+import time
 
 BASE_URL = "http://localhost:8080"
 
+# Seconds to wait for a queued registration to be confirmed or fail
+# (confirmation takes a block)
+REGISTER_WAIT = 900
+
 def test_health():
     """Test health endpoint"""
     print("\n[TEST] Health Check")
@@ -94,11 +99,33 @@ def test_register_enum():
         )
         print(f"Status: {response.status_code}")
         print(f"Response: {json.dumps(response.json(), indent=2)}")
-        return response.status_code in [201, 500]  # 500 if wallet locked
+        if response.status_code in [202, 409]:
+            # Queued (409: a registration for the number is already queued)
+            return wait_for_registration(response.json()["status_url"])
+        return response.status_code in [201, 500]  # --sync-register; 500 if wallet locked
     except Exception as e:
         print(f"ERROR: {e}")
         return False
 
+def wait_for_registration(status_url):
+    """Poll a queued registration until it is confirmed or failed"""
+    deadline = time.time() + REGISTER_WAIT
+    while time.time() < deadline:
+        response = requests.get(f"{BASE_URL}{status_url}", timeout=5)
+        if response.status_code != 200:
+            print(f"Job status {response.status_code}: {response.text}")
+            return False
+        job = response.json()
+        print(f"Job {job['job_id']}: {job['status']}")
+        if job["status"] == "confirmed":
+            return True
+        if job["status"] == "failed":
+            print(f"Error: {job['error']}")
+            return True  # Failed on chain, e.g. wallet locked
+        time.sleep(5)
+    print(f"Registration not finished after {REGISTER_WAIT}s")
+    return False
+
 def main():
     """Run all tests"""
     print("=" * 60)
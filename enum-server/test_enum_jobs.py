@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Tests for the registration queue's handling of resubmitted name_new calls
+Run with: python3 -m pytest test_enum_jobs.py
+"""
+
+from emercoin_rpc import RPCError, RPCTransportError
+from enum_jobs import RegistrationQueue, FAILED, QUEUED, SUBMITTED
+
+NAME = "enum:0.0.1.0.5.5.5.5.1.4.1.e164.arpa"
+VALUE = '"!^.*$!sip:user@example.com!"'
+NOT_FOUND = -4
+
+
+class FakeNode:
+    """name_new rejects the name; name_show / name_pending answer from `registered` / `pending`"""
+
+    def __init__(self, registered=None, pending=(), pending_error=None):
+        self.registered = registered
+        self.pending = list(pending)
+        self.pending_error = pending_error
+
+    def __call__(self, method, params):
+        if method == "name_new":
+            raise RPCError(-25, "there are pending operations on that name")
+        if method == "name_show":
+            if self.registered is None:
+                raise RPCError(NOT_FOUND, "failed to read from name DB")
+            return self.registered
+        if method == "name_pending":
+            if self.pending_error is not None:
+                raise self.pending_error
+            return self.pending
+        if method == "gettransaction":
+            return {"confirmations": 0}
+        raise AssertionError(f"unexpected {method}")
+
+
+def submit(tmp_path, node):
+    queue = RegistrationQueue(str(tmp_path / "jobs.sqlite"), rate=0, retry_delay=60)
+    job = queue.submit(NAME, VALUE)
+    queue.run_once(node, check=False)
+    return queue.get(job['id'])
+
+
+def test_pending_earlier_submission_is_adopted(tmp_path):
+    node = FakeNode(pending=[{"name": NAME, "value": VALUE, "txid": "aa" * 32, "op": "name_new"}])
+    job = submit(tmp_path, node)
+
+    assert job['state'] == SUBMITTED
+    assert job['txid'] == "aa" * 32
+
+
+def test_registered_earlier_submission_is_adopted(tmp_path):
+    node = FakeNode(registered={"name": NAME, "value": VALUE, "txid": "bb" * 32})
+    job = submit(tmp_path, node)
+
+    assert job['state'] == SUBMITTED
+    assert job['txid'] == "bb" * 32
+
+
+def test_someone_elses_pending_name_fails(tmp_path):
+    node = FakeNode(pending=[{"name": NAME, "value": '"!^.*$!sip:other@example.com!"', "txid": "cc" * 32}])
+    job = submit(tmp_path, node)
+
+    assert job['state'] == FAILED
+
+
+def test_unreachable_node_during_check_retries(tmp_path):
+    node = FakeNode(pending_error=RPCTransportError("connection refused"))
+    job = submit(tmp_path, node)
+
+    assert job['state'] == QUEUED
+    assert job['attempts'] == 1
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Tests for the NAPTR engine (enum_naptr)
+Run with: python3 -m pytest test_enum_naptr.py
+"""
+
+import pytest
+
+from enum_naptr import NAPTRError, compile_naptr, resolve_naptr, split_regexp
+
+AUS = "+14155550100"
+
+
+def uris(records):
+    return [record['replacement'] for record in records]
+
+
+def test_simplified_syntax_is_sip_in_position_order():
+    records = resolve_naptr('"!^.*$!sip:user@domain.com!"|"!^.*$!sip:backup@domain.com!"', AUS)
+
+    assert uris(records) == ["sip:user@domain.com", "sip:backup@domain.com"]
+    assert [r['service'] for r in records] == ["E2U+sip", "E2U+sip"]
+    assert [(r['order'], r['preference']) for r in records] == [(0, 10), (1, 10)]
+    assert [r['flags'] for r in records] == ["u", "u"]
+
+
+def test_simplified_syntax_trailing_field_is_naptr_flags():
+    rule, = compile_naptr('"!^.*$!sip:user@domain.com!u"')
+
+    assert rule.flags == "u"
+    assert rule.pattern == "^.*$"
+    assert rule.template == "sip:user@domain.com"
+
+
+def test_rfc3403_syntax():
+    value = 'NAPTR 100 10 "u" "E2U+sip" "!^.*$!sip:gateway@example.com!" .'
+    record, = resolve_naptr(value, AUS)
+
+    assert record == {
+        'pattern': "^.*$",
+        'replacement': "sip:gateway@example.com",
+        'flags': "u",
+        'service': "E2U+sip",
+        'order': 100,
+        'preference': 10,
+    }
+
+
+def test_rfc3403_syntax_with_class_and_newlines():
+    value = ('IN NAPTR 10 10 "u" "E2U+sip" "!^.*$!sip:a@example.com!" .\n'
+             'IN NAPTR 20 10 "u" "E2U+sms" "!^.*$!sms:+14155550100!" .')
+
+    assert uris(resolve_naptr(value, AUS)) == ["sip:a@example.com", "sms:+14155550100"]
+
+
+def test_sorted_by_order_then_preference():
+    value = ('NAPTR 200 10 "u" "E2U+sip" "!^.*$!sip:third@example.com!" .|'
+             'NAPTR 100 50 "u" "E2U+sip" "!^.*$!sip:second@example.com!" .|'
+             'NAPTR 100 10 "u" "E2U+sip" "!^.*$!sip:first@example.com!" .')
+
+    assert uris(resolve_naptr(value, AUS)) == [
+        "sip:first@example.com", "sip:second@example.com", "sip:third@example.com",
+    ]
+
+
+def test_service_filter():
+    value = ('NAPTR 100 10 "u" "E2U+sip" "!^.*$!sip:user@example.com!" .|'
+             'NAPTR 100 20 "u" "E2U+sms" "!^.*$!sms:+14155550100!" .|'
+             'NAPTR 100 30 "u" "E2U+pstn:tel" "!^.*$!tel:+14155550100!" .')
+
+    assert uris(resolve_naptr(value, AUS, "E2U+sms")) == ["sms:+14155550100"]
+    # Without the E2U+ prefix, and case-insensitively
+    assert uris(resolve_naptr(value, AUS, "SIP")) == ["sip:user@example.com"]
+    # A subtype offers its type, but a prefix of a type is not a match
+    assert uris(resolve_naptr(value, AUS, "E2U+pstn")) == ["tel:+14155550100"]
+    assert resolve_naptr(value, AUS, "E2U+si") == []
+    assert len(resolve_naptr(value, AUS)) == 3
+
+
+def test_substitution_back_reference():
+    value = r'NAPTR 100 10 "u" "E2U+sip" "!^\+1415555(.*)$!sip:\1@gw.domain.com!" .'
+
+    assert uris(resolve_naptr(value, AUS)) == ["sip:0100@gw.domain.com"]
+
+
+def test_substitution_back_reference_followed_by_digit():
+    # \10 is group 1 followed by "0", not group 10
+    value = r'NAPTR 100 10 "u" "E2U+sip" "!^\+(1)(.*)$!sip:\10\2@example.com!" .'
+
+    assert uris(resolve_naptr(value, AUS)) == ["sip:104155550100@example.com"]
+
+
+def test_substitution_without_match_drops_rule():
+    value = (r'NAPTR 100 10 "u" "E2U+sip" "!^\+44(.*)$!sip:\1@uk.example.com!" .|'
+             r'NAPTR 200 10 "u" "E2U+sip" "!^.*$!sip:default@example.com!" .')
+
+    assert uris(resolve_naptr(value, AUS)) == ["sip:default@example.com"]
+
+
+def test_substitution_case_insensitive_flag():
+    value = r'NAPTR 100 10 "u" "E2U+sip" "!^(USER)$!sip:\1@example.com!i" .'
+
+    assert uris(resolve_naptr(value, "user")) == ["sip:user@example.com"]
+    assert uris(resolve_naptr(value.replace('!i"', '!"'), "user")) == []
+
+
+def test_substitution_without_aus_returns_template():
+    value = r'NAPTR 100 10 "u" "E2U+sip" "!^\+1415555(.*)$!sip:\1@gw.domain.com!" .'
+
+    assert uris(resolve_naptr(value)) == [r"sip:\1@gw.domain.com"]
+
+
+def test_escaped_delimiter():
+    assert split_regexp(r"!^(.*)$!sip:\1\!x@example.com!") == ("^(.*)$", r"sip:\1!x@example.com", "")
+    value = r'NAPTR 100 10 "u" "E2U+sip" "!^\+(.*)$!sip:\1\!x@example.com!" .'
+
+    assert uris(resolve_naptr(value, AUS)) == ["sip:14155550100!x@example.com"]
+
+
+def test_other_delimiter():
+    value = r'NAPTR 100 10 "u" "E2U+sip" "#^\+(.*)$#sip:\1@example.com#" .'
+
+    assert uris(resolve_naptr(value, AUS)) == ["sip:14155550100@example.com"]
+
+
+@pytest.mark.parametrize("regexp", [
+    "!^.*$!sip:user@example.com",  # missing closing delimiter
+    "!!",                           # too short
+    "a^.*$asip:user@example.comaa",  # alphanumeric delimiter
+    "\\^.*$\\sip:user@example.com\\",  # backslash delimiter
+])
+def test_malformed_delimiters_raise(regexp):
+    with pytest.raises(NAPTRError):
+        split_regexp(regexp)
+
+
+def test_malformed_entries_are_skipped():
+    value = ('NAPTR 100 10 "u" "E2U+sip" "!^.*$!sip:broken@example.com" .|'
+             'NAPTR 100 10 "u" "E2U+sip" "!^(.*$!sip:badregex@example.com!" .|'
+             'NAPTR x 10 "u" "E2U+sip" "!^.*$!sip:badorder@example.com!" .|'
+             'NAPTR 100 10 "u" "E2U+sip"|'
+             'NAPTR 200 10 "u" "E2U+sip" "!^.*$!sip:good@example.com!" .')
+
+    assert uris(resolve_naptr(value, AUS)) == ["sip:good@example.com"]
+
+
+def test_non_terminal_rule_returns_replacement_domain():
+    value = 'NAPTR 100 10 "" "E2U+sip" "" sip.example.com.'
+
+    assert uris(resolve_naptr(value, AUS)) == ["sip.example.com."]
+
+
+def test_compiled_rules_are_cached_by_value():
+    value = 'NAPTR 100 10 "u" "E2U+sip" "!^.*$!sip:cached@example.com!" .'
+
+    assert compile_naptr(value) is compile_naptr(value)
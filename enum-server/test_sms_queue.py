@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Tests for the outbound SMS queue's gateway failover
+Run with: python3 -m pytest test_sms_queue.py
+"""
+
+import time
+
+from sms_gateway import SMSGateway, SMSManager
+from sms_queue import SMSQueue, SENT
+
+
+class FakeGateway(SMSGateway):
+    """Answers every send with `result` after `latency` seconds"""
+
+    def __init__(self, result, latency=0.0):
+        super().__init__()
+        self.result = result
+        self.latency = latency
+        self.calls = 0
+
+    def send_sms(self, from_number, to_number, message):
+        self.calls += 1
+        time.sleep(self.latency)
+        return dict(self.result)
+
+
+def wait_for(queue, message_id, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        message = queue.get(message_id)
+        if message['state'] in ('sent', 'failed'):
+            return message
+        time.sleep(0.01)
+    return queue.get(message_id)
+
+
+def make_queue(tmp_path, gateways):
+    manager = SMSManager()
+    for name, gateway in gateways.items():
+        manager.add_gateway(name, gateway, rate=100, burst=100)
+    return SMSQueue(str(tmp_path / "queue.sqlite"), manager, workers=2, retry_delay=0.05)
+
+
+def test_retryable_failure_fails_over_to_healthy_gateway(tmp_path):
+    bad = FakeGateway({"success": False, "error": "503", "status_code": 503, "retryable": True})
+    good = FakeGateway({"success": True, "message_id": "ok-1"}, latency=0.05)
+    queue = make_queue(tmp_path, {"bad": bad, "good": good})
+    queue.start()
+    try:
+        message, _ = queue.submit("+15550000000", "+14155550100", "Your code is 123456")
+        message = wait_for(queue, message['id'])
+    finally:
+        queue.stop()
+
+    assert message['state'] == SENT
+    assert message['provider'] == "good"
+    assert bad.calls == 1
+    assert good.calls == 1
+
+
+def test_retryable_failure_pinned_message_fails_over(tmp_path):
+    bad = FakeGateway({"success": False, "error": "503", "status_code": 503, "retryable": True})
+    good = FakeGateway({"success": True, "message_id": "ok-1"})
+    queue = make_queue(tmp_path, {"bad": bad, "good": good})
+    queue.start()
+    try:
+        message, _ = queue.submit("+15550000000", "+14155550100", "Your code is 123456", gateway="bad")
+        message = wait_for(queue, message['id'])
+    finally:
+        queue.stop()
+
+    assert message['state'] == SENT
+    assert message['provider'] == "good"
+
+
+def test_single_gateway_retries_with_backoff(tmp_path):
+    bad = FakeGateway({"success": False, "error": "503", "status_code": 503, "retryable": True})
+    queue = make_queue(tmp_path, {"bad": bad})
+    queue.start()
+    try:
+        message, _ = queue.submit("+15550000000", "+14155550100", "Your code is 123456")
+        time.sleep(0.2)
+        message = queue.get(message['id'])
+    finally:
+        queue.stop()
+
+    # Backoff of 0.05, 0.1, 0.2...s: not all 5 attempts used up within 0.2s
+    assert message['state'] == 'queued'
+    assert 1 <= bad.calls < queue.max_attempts
+
+
+def test_failing_gateway_ranks_behind_unmeasured_one():
+    manager = SMSManager()
+    manager.add_gateway("bad", FakeGateway({}))
+    manager.add_gateway("good", FakeGateway({}))
+    health = manager.health["bad"]
+    health.begin()
+    health.end(False, None)
+
+    assert manager.candidates() == ["good", "bad"]